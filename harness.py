@@ -0,0 +1,828 @@
+# Offline harness for the orchestration in script.py
+# Nothing in here talks to AWS: the EC2 backend is replaced by in-memory fakes with injectable latency
+# so that the provisioning strategies can be compared reproducibly
+# the end to end run also replaces the instances by an in-process SSH server listening on 127.0.0.x
+# run with: python3 harness.py
+import argparse
+import http.server
+import io
+import itertools
+import math
+import os
+import socket
+import tarfile
+import tempfile
+import threading
+import time
+import types
+import urllib.request
+
+import paramiko
+from botocore.exceptions import ClientError
+
+import script
+
+
+class FakeEC2Backend:
+    """
+        In-memory stand-in for the EC2 API
+        Every API call sleeps apiLatency seconds, every instance takes bootTime seconds to reach running
+
+        Parameters
+        ----------
+        apiLatency : float
+            seconds spent in each API round trip
+        bootTime : float
+            seconds between the launch of an instance and it being running
+        shutdownTime : float
+            seconds between the termination of an instance and it being terminated, its network interface
+            keeps the security group in use for as long again
+        """
+    def __init__(self, apiLatency=0.05, bootTime=1.0, shutdownTime=1.0):
+        self.apiLatency = apiLatency
+        self.bootTime = bootTime
+        self.shutdownTime = shutdownTime
+        self.instances = {}
+        self.securityGroups = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.counter = itertools.count(1)
+        # called with each launched instance, the fake SSH server uses it to start listening on its ip
+        self.onLaunch = []
+
+    def roundTrip(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.apiLatency)
+
+    def launch(self, count, tags):
+        instances = []
+        with self.lock:
+            for _ in range(count):
+                number = next(self.counter)
+                instance = {
+                    "InstanceId": "i-%017x" % number,
+                    "PublicIpAddress": "127.0.0.%d" % (number % 250 + 2),
+                    "PrivateIpAddress": "10.0.0.%d" % (number % 250 + 2),
+                    "Tags": [{"Key": key, "Value": value} for key, value in tags.items()],
+                    "InstanceType": "t2.micro",
+                    "LaunchTime": time.time(),
+                    "runningAt": time.time() + self.bootTime,
+                    "State": {"Name": "pending"},
+                }
+                self.instances[instance["InstanceId"]] = instance
+                instances.append(instance)
+        for instance in instances:
+            for callback in self.onLaunch:
+                callback(instance)
+        return instances
+
+    def waitRunning(self, instance_ids):
+        # all instances boot in parallel, so waiting on several costs as much as waiting on the slowest one
+        deadline = max(self.instances[instance_id]["runningAt"] for instance_id in instance_ids)
+        time.sleep(max(0, deadline - time.time()))
+        for instance_id in instance_ids:
+            self.instances[instance_id]["State"] = {"Name": "running"}
+
+    def terminate(self, instance_ids):
+        with self.lock:
+            for instance_id in instance_ids:
+                instance = self.instances[instance_id]
+                if instance["State"]["Name"] != "terminated":
+                    instance["State"] = {"Name": "shutting-down"}
+                    instance["terminatedAt"] = time.time() + self.shutdownTime
+                    instance["releasedAt"] = instance["terminatedAt"] + self.shutdownTime
+
+    def waitTerminated(self, instance_ids):
+        deadline = max(self.instances[instance_id]["terminatedAt"] for instance_id in instance_ids)
+        time.sleep(max(0, deadline - time.time()))
+        for instance_id in instance_ids:
+            self.instances[instance_id]["State"] = {"Name": "terminated"}
+
+
+class FakeWaiter:
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.name = name
+
+    def wait(self, **kwargs):
+        self.backend.roundTrip()
+        if self.name == "instance_running":
+            self.backend.waitRunning(kwargs["InstanceIds"])
+        elif self.name == "instance_terminated":
+            self.backend.waitTerminated(kwargs["InstanceIds"])
+
+
+class FakePaginator:
+    """
+        Pages the results of a describe call pageSize items at a time, like the boto3 paginators
+        """
+    def __init__(self, backend, key, items, pageSize=2):
+        self.backend = backend
+        self.key = key
+        self.items = items
+        self.pageSize = pageSize
+
+    def paginate(self, Filters=()):
+        items = [item for item in self.items
+                 if all(item.get(FAKE_FILTER_FIELDS[flt["Name"]]) in flt["Values"] for flt in Filters)]
+        for offset in range(0, len(items), self.pageSize):
+            self.backend.roundTrip()
+            yield {self.key: items[offset:offset + self.pageSize]}
+
+
+# describe filter name to field of the fake items
+FAKE_FILTER_FIELDS = {"vpc-id": "VpcId", "group-name": "GroupName"}
+
+FAKE_SUBNETS = [
+    {"AvailabilityZone": "us-east-1a", "SubnetId": "subnet-1a", "VpcId": "vpc-0001", "DefaultForAz": True},
+    {"AvailabilityZone": "us-east-1b", "SubnetId": "subnet-1b", "VpcId": "vpc-0001", "DefaultForAz": True},
+    {"AvailabilityZone": "us-east-1a", "SubnetId": "subnet-1a-extra", "VpcId": "vpc-0001", "DefaultForAz": False},
+    {"AvailabilityZone": "us-east-1c", "SubnetId": "subnet-other", "VpcId": "vpc-0002", "DefaultForAz": True},
+]
+
+
+class FakeEC2Client:
+    """
+        Mimics the subset of the boto3 ec2 client used by script.py
+        """
+    def __init__(self, backend):
+        self.backend = backend
+        self.meta = types.SimpleNamespace(region_name="us-east-1")
+
+    def get_waiter(self, name):
+        return FakeWaiter(self.backend, name)
+
+    def get_paginator(self, name):
+        assert name == "describe_subnets"
+        return FakePaginator(self.backend, "Subnets", FAKE_SUBNETS)
+
+    def describe_vpcs(self, Filters=()):
+        self.backend.roundTrip()
+        return {"Vpcs": [{"VpcId": "vpc-0001", "IsDefault": True}]}
+
+    def describe_images(self, Owners, Filters=()):
+        self.backend.roundTrip()
+        return {"Images": [{"ImageId": "ami-focal-old", "CreationDate": "2023-01-01T00:00:00.000Z"},
+                           {"ImageId": "ami-focal-new", "CreationDate": "2024-06-01T00:00:00.000Z"}]}
+
+    def describe_security_groups(self, Filters=(), **kwargs):
+        self.backend.roundTrip()
+        groups = [group for group in self.backend.securityGroups.values()
+                  if all(group.get(FAKE_FILTER_FIELDS[flt["Name"]]) in flt["Values"] for flt in Filters)]
+        return {"SecurityGroups": groups}
+
+    def create_security_group(self, Description, GroupName, VpcId):
+        self.backend.roundTrip()
+        group_id = "sg-%08x" % next(self.backend.counter)
+        self.backend.securityGroups[group_id] = {"GroupId": group_id, "GroupName": GroupName, "VpcId": VpcId}
+        return {"GroupId": group_id}
+
+    def authorize_security_group_ingress(self, **kwargs):
+        self.backend.roundTrip()
+        return {}
+
+    def describe_subnets(self, **kwargs):
+        self.backend.roundTrip()
+        return {"Subnets": [{"AvailabilityZone": "us-east-1a", "SubnetId": "subnet-1a"},
+                            {"AvailabilityZone": "us-east-1b", "SubnetId": "subnet-1b"}]}
+
+    def run_instances(self, MinCount, MaxCount, TagSpecifications=(), **kwargs):
+        self.backend.roundTrip()
+        tags = {}
+        for specification in TagSpecifications:
+            tags.update({tag["Key"]: tag["Value"] for tag in specification["Tags"]})
+        instances = self.backend.launch(MaxCount, tags)
+        return {"Instances": [{"InstanceId": instance["InstanceId"]} for instance in instances]}
+
+    def describe_instances(self, InstanceIds=(), Filters=(), **kwargs):
+        self.backend.roundTrip()
+        instances = [dict(self.backend.instances[instance_id]) for instance_id in InstanceIds or self.backend.instances]
+        for flt in Filters:
+            if flt["Name"].startswith("tag:"):
+                key = flt["Name"][4:]
+                instances = [instance for instance in instances
+                             if any(tag["Key"] == key and tag["Value"] in flt["Values"] for tag in instance["Tags"])]
+            elif flt["Name"] == "instance-state-name":
+                instances = [instance for instance in instances if instance["State"]["Name"] in flt["Values"]]
+            elif flt["Name"] == "instance-id":
+                instances = [instance for instance in instances if instance["InstanceId"] in flt["Values"]]
+            elif flt["Name"] == "instance-type":
+                instances = [instance for instance in instances if instance["InstanceType"] in flt["Values"]]
+        return {"Reservations": [{"Instances": instances}]}
+
+    def terminate_instances(self, InstanceIds):
+        self.backend.roundTrip()
+        self.backend.terminate(InstanceIds)
+        return {}
+
+    def delete_security_group(self, GroupId):
+        self.backend.roundTrip()
+        if GroupId not in self.backend.securityGroups:
+            raise ClientError({"Error": {"Code": "InvalidGroup.NotFound"}}, "DeleteSecurityGroup")
+        if any(instance.get("releasedAt", float("inf")) > time.time() for instance in self.backend.instances.values()):
+            raise ClientError({"Error": {"Code": "DependencyViolation"}}, "DeleteSecurityGroup")
+        del self.backend.securityGroups[GroupId]
+        return {}
+
+    def create_tags(self, Resources, Tags):
+        self.backend.roundTrip()
+        with self.backend.lock:
+            for instance_id in Resources:
+                instance = self.backend.instances[instance_id]
+                keys = {tag["Key"] for tag in Tags}
+                instance["Tags"] = [tag for tag in instance["Tags"] if tag["Key"] not in keys] + list(Tags)
+
+
+class FakeSTSClient:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get_caller_identity(self):
+        self.backend.roundTrip()
+        return {"Account": "123456789012"}
+
+
+class FakeInstance:
+    def __init__(self, backend, data):
+        self.backend = backend
+        self.id = data["InstanceId"]
+        self.public_ip_address = None
+        self.private_ip_address = None
+
+    def wait_until_running(self):
+        self.backend.roundTrip()
+        self.backend.waitRunning([self.id])
+
+    def reload(self):
+        self.backend.roundTrip()
+        data = self.backend.instances[self.id]
+        self.public_ip_address = data["PublicIpAddress"]
+        self.private_ip_address = data["PrivateIpAddress"]
+
+
+class FakeEC2Resource:
+    """
+        Mimics the ec2 resource, only create_instances is used by script.py
+        """
+    def __init__(self, backend):
+        self.backend = backend
+
+    def create_instances(self, MinCount, MaxCount, **kwargs):
+        self.backend.roundTrip()
+        return [FakeInstance(self.backend, data) for data in self.backend.launch(MaxCount, {})]
+
+
+def benchmarkProvisioning(nbDataNodes=3, apiLatency=0.05, bootTime=1.0):
+    """
+        Measures the wall-clock time of the sequential createInstances loop against provisionCluster
+        on the mocked EC2 backend
+
+        Parameters
+        ----------
+        nbDataNodes : int
+            number of data nodes in the cluster
+        apiLatency : float
+            seconds spent in each API round trip
+        bootTime : float
+            seconds for an instance to become running
+
+        Returns
+        -------
+        dict{str, tuple(float, int)}
+            strategy as key and (seconds, api calls) as value
+        """
+    roles = script.getClusterRoles(nbDataNodes)
+    availabilityZones = {"us-east-1a": "subnet-1a"}
+    results = {}
+
+    backend = FakeEC2Backend(apiLatency, bootTime)
+    start = time.perf_counter()
+    for role, userdata in roles:
+        script.createInstances(FakeEC2Client(backend), FakeEC2Resource(backend), ["sg-bench"], availabilityZones, userdata)
+    results["sequential"] = (time.perf_counter() - start, backend.calls)
+
+    backend = FakeEC2Backend(apiLatency, bootTime)
+    start = time.perf_counter()
+    instances = script.provisionCluster(FakeEC2Client(backend), ["sg-bench"], availabilityZones, roles)
+    results["batched"] = (time.perf_counter() - start, backend.calls)
+    assert sorted(instances) == sorted(role for role, _ in roles)
+
+    return results
+
+
+def benchmarkTeardown(nbDataNodes=3, apiLatency=0.05, shutdownTime=1.0):
+    """
+        Measures the wall-clock time of terminating the instances one by one, waiting on each,
+        against destroyResources, on the mocked EC2 backend
+
+        Returns
+        -------
+        dict{str, tuple(float, int)}
+            strategy as key and (seconds, api calls) as value
+        """
+    results = {}
+    for strategy in ("sequential", "batched"):
+        backend = FakeEC2Backend(0.0, 0.0, shutdownTime)
+        client = FakeEC2Client(backend)
+        groupId = script.createSecurityGroup(client)[0][0]
+        script.provisionCluster(client, [groupId], {"us-east-1a": "subnet-1a"}, script.getClusterRoles(nbDataNodes))
+        backend.apiLatency = apiLatency
+        backend.calls = 0
+
+        start = time.perf_counter()
+        if strategy == "sequential":
+            for instance_id in list(backend.instances):
+                client.terminate_instances(InstanceIds=[instance_id])
+                client.get_waiter("instance_terminated").wait(InstanceIds=[instance_id])
+            script.destroyResources(client, groupId=groupId)
+        else:
+            script.destroyResources(client, groupId=groupId)
+        results[strategy] = (time.perf_counter() - start, backend.calls)
+        assert not backend.securityGroups and all(instance["State"]["Name"] == "terminated" for instance in backend.instances.values())
+        # running it again finds nothing left to delete
+        assert script.destroyResources(client) == ([], None)
+    return results
+
+
+class FakeSSHHost:
+    """
+        State of one fake instance: the files staged on it and the time its user data finishes
+        """
+    def __init__(self, ip, readyAt):
+        self.ip = ip
+        self.readyAt = readyAt
+        self.files = {}
+        self.executed = []
+        self.ndbStartedAt = None
+        self.lock = threading.Lock()
+
+
+class FakeSSHInterface(paramiko.ServerInterface):
+    """
+        Accepts any public key and runs exec requests through FakeSSHServer.execute
+        """
+    def __init__(self, server, host):
+        self.server = server
+        self.host = host
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.server.execute, args=(self.host, channel, command.decode("utf-8")), daemon=True).start()
+        return True
+
+
+class FakeSSHServer:
+    """
+        In-process SSH server standing in for the instances
+        It listens on the public ip of every launched instance (127.0.0.x, the whole 127/8 range is local on Linux)
+        and emulates the commands script.py sends: tar uploads are unpacked in memory, the readiness tests succeed
+        once the user data time has passed, /bin/bash <file> succeeds if the file was staged, ndb_mgm reports
+        a data node as started ndbStartTime seconds after its connection.sh ran
+
+        Parameters
+        ----------
+        backend : FakeEC2Backend
+            backend whose launched instances get a listener
+        port : int
+            SSH port, passed to SSHConnectionPool
+        latency : float
+            seconds of network round trip, spent on every request and three times on every handshake
+        installTime : float
+            seconds between an instance running and its user data being finished
+        scriptTime : float
+            seconds spent by every /bin/bash <file>
+        ndbStartTime : float
+            seconds between connection.sh and the data node being started
+        """
+    def __init__(self, backend, port=2222, latency=0.02, installTime=1.0, scriptTime=0.2, ndbStartTime=1.0):
+        self.port = port
+        self.latency = latency
+        self.installTime = installTime
+        self.scriptTime = scriptTime
+        self.ndbStartTime = ndbStartTime
+        self.hostKey = paramiko.RSAKey.generate(2048)
+        self.hosts = {}
+        self.sockets = []
+        self.transports = []
+        self.connections = 0
+        self.roundTrips = 0
+        self.lock = threading.Lock()
+        self.running = True
+        backend.onLaunch.append(self.addHost)
+
+    def addHost(self, instance):
+        ip = instance["PublicIpAddress"]
+        self.hosts[ip] = FakeSSHHost(ip, instance["runningAt"] + self.installTime)
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((ip, self.port))
+        listener.listen(16)
+        self.sockets.append(listener)
+        threading.Thread(target=self.accept, args=(listener, self.hosts[ip]), daemon=True).start()
+
+    def accept(self, listener, host):
+        while self.running:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handshake, args=(connection, host), daemon=True).start()
+
+    def handshake(self, connection, host):
+        # isPortOpen only opens and closes the TCP connection, the transport then fails and is dropped
+        transport = paramiko.Transport(connection)
+        transport.add_server_key(self.hostKey)
+        try:
+            time.sleep(3 * self.latency)
+            transport.start_server(server=FakeSSHInterface(self, host))
+        except (paramiko.SSHException, EOFError, OSError):
+            transport.close()
+            return
+        with self.lock:
+            self.connections += 1
+            self.transports.append(transport)
+
+    def execute(self, host, channel, command):
+        with self.lock:
+            self.roundTrips += 1
+        time.sleep(self.latency)
+        status = 0
+        if command.startswith("tar -x"):
+            data = io.BytesIO()
+            while True:
+                chunk = channel.recv(32768)
+                if not chunk:
+                    break
+                data.write(chunk)
+            data.seek(0)
+            with tarfile.open(fileobj=data) as tar, host.lock:
+                for member in tar.getmembers():
+                    host.files[member.name] = tar.extractfile(member).read().decode("utf-8")
+        elif command.startswith("test "):
+            status = 0 if time.time() >= host.readyAt else 1
+        elif command.startswith("/bin/bash "):
+            name = command.split()[1]
+            if name in host.files:
+                time.sleep(self.scriptTime)
+                host.executed.append(name)
+                if name == "connection.sh":
+                    host.ndbStartedAt = time.time() + self.ndbStartTime
+                channel.sendall(("ran " + name + "\n").encode("utf-8"))
+            else:
+                channel.sendall_stderr(("/bin/bash: " + name + ": No such file or directory\n").encode("utf-8"))
+                status = 127
+        elif "ndb_mgm" in command:
+            channel.sendall(self.ndbStatus().encode("utf-8"))
+        channel.send_exit_status(status)
+        channel.close()
+
+    def ndbStatus(self):
+        # the data nodes are the hosts connection.sh was staged on, numbered from 2 like in config.ini
+        dataNodes = sorted((host for host in self.hosts.values() if "connection.sh" in host.files), key=lambda host: host.ip)
+        lines = ["Connected to Management Server at: localhost:1186"]
+        for nodeId, host in enumerate(dataNodes, 2):
+            if host.ndbStartedAt is None:
+                lines.append("Node %d: not connected" % nodeId)
+            elif time.time() < host.ndbStartedAt:
+                lines.append("Node %d: starting (Last Completed Phase 4) (mysql-5.5.20 ndb-7.2.1)" % nodeId)
+            else:
+                lines.append("Node %d: started (mysql-5.5.20 ndb-7.2.1)" % nodeId)
+        return "\n".join(lines) + "\n"
+
+    def stop(self):
+        self.running = False
+        for listener in self.sockets:
+            listener.close()
+        for transport in self.transports:
+            transport.close()
+
+
+def benchmarkEndToEnd(nbDataNodes=3, apiLatency=0.05, bootTime=1.0, sshLatency=0.02, installTime=1.0, port=2222):
+    """
+        Runs the real provision command against the mocked EC2 backend and the fake SSH server,
+        then runs it a second time, which reuses the instances and resumes with every step done
+
+        Parameters
+        ----------
+        nbDataNodes : int
+            number of data nodes in the cluster
+        apiLatency : float
+            seconds spent in each EC2 API round trip
+        bootTime : float
+            seconds for an instance to become running
+        sshLatency : float
+            seconds of SSH network round trip
+        installTime : float
+            seconds of user data after an instance is running
+        port : int
+            port of the fake SSH server
+
+        Returns
+        -------
+        dict{str, dict}
+            run ("first", "resumed") as key and seconds, ec2 calls, ssh connections and ssh round trips as value
+        """
+    backend = FakeEC2Backend(apiLatency, bootTime)
+    server = FakeSSHServer(backend, port, sshLatency, installTime)
+    key = paramiko.RSAKey.generate(2048)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            args = argparse.Namespace(data_nodes=nbDataNodes, replicas=1, sql_nodes=0, clients=0, instance_type="t2.micro", role_types="",
+                                      multithreaded=False, artifact_mirror=None, artifact_bucket=None, fresh=False,
+                                      state=os.path.join(directory, "state.json"), refresh_metadata=False,
+                                      metadata_cache=os.path.join(directory, "metadata.json"),
+                                      results_db=os.path.join(directory, "results.db"))
+            for run in ("first", "resumed"):
+                calls, connections, roundTrips = backend.calls, server.connections, server.roundTrips
+                start = time.perf_counter()
+                script.provision(args, FakeEC2Client(backend), script.SSHConnectionPool(key, port=port), FakeSTSClient(backend))
+                results[run] = {"seconds": time.perf_counter() - start, "ec2 calls": backend.calls - calls,
+                                "ssh connections": server.connections - connections,
+                                "ssh round trips": server.roundTrips - roundTrips}
+    finally:
+        server.stop()
+
+    # the master got its setup files and ran them in order, every data node connected once
+    master = [host for host in server.hosts.values() if "write_config.sh" in host.files]
+    assert len(master) == 1 and master[0].executed == ["write_config.sh", "mysql_setup.sh", "mysql_execution.sh", "mysql_execution2.sh"]
+    nodes = [host for host in server.hosts.values() if "connection.sh" in host.files]
+    assert len(nodes) == nbDataNodes and all(host.executed == ["connection.sh"] for host in nodes)
+    return results
+
+
+class ThrottledUpstreamHandler(http.server.BaseHTTPRequestHandler):
+    """
+        Stands in for dev.mysql.com: serves server.payload for any path at server.bandwidth bytes per second
+        """
+    def do_GET(self):
+        payload = self.server.payload
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        chunk = 256 * 1024
+        for offset in range(0, len(payload), chunk):
+            self.wfile.write(payload[offset:offset + chunk])
+            time.sleep(chunk / self.server.bandwidth)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def benchmarkArtifactCache(nbInstances=5, size=8 * 1024 * 1024, bandwidth=16 * 1024 * 1024, port=18080):
+    """
+        Downloads an artifact nbInstances times directly from a throttled local upstream,
+        then through the artifact cache (one upstream fetch, then nbInstances downloads from the ArtifactServer)
+
+        Parameters
+        ----------
+        nbInstances : int
+            number of instances downloading the artifact
+        size : int
+            size of the artifact in bytes
+        bandwidth : int
+            upstream bandwidth in bytes per second
+        port : int
+            port of the artifact server, the upstream listens on port + 1
+
+        Returns
+        -------
+        dict{str, float}
+            strategy as key and seconds as value
+        """
+    upstream = http.server.ThreadingHTTPServer(("127.0.0.1", port + 1), ThrottledUpstreamHandler)
+    upstream.payload = os.urandom(size)
+    upstream.bandwidth = bandwidth
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%d/mysql-cluster.tar.gz" % (port + 1)
+    results = {}
+
+    def download(source):
+        with urllib.request.urlopen(source) as response:
+            return len(response.read())
+
+    start = time.perf_counter()
+    for _ in range(nbInstances):
+        download(url)
+    results["upstream"] = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = script.ArtifactCache(directory)
+        server = script.ArtifactServer(cache, port)
+        start = time.perf_counter()
+        mirrors = script.mirrorUrls({url: cache.fetch(url)}, "http://127.0.0.1:%d" % port)
+        for _ in range(nbInstances):
+            assert download(mirrors[url]) == size
+        results["cached"] = time.perf_counter() - start
+        server.stop()
+        savedBytes, savedSeconds = cache.report()
+        results["bytes saved"] = savedBytes
+        results["seconds saved"] = savedSeconds
+
+    upstream.shutdown()
+    upstream.server_close()
+    return results
+
+
+# header and summary of a sysbench 1.0 oltp_read_write run with --histogram, the histogram lines are generated below
+SYSBENCH_RUN_HEAD = """sysbench 1.0.20 (using bundled LuaJIT 2.1.0-beta2)
+
+Running the test with following options:
+Number of threads: 4
+Initializing random number generator from current time
+
+
+Initializing worker threads...
+
+Threads started!
+
+Latency histogram (values are in milliseconds)
+       value  ------------- distribution ------------- count
+"""
+SYSBENCH_RUN_TAIL = """
+SQL statistics:
+    queries performed:
+        read:                            42000
+        write:                           12000
+        other:                           6000
+        total:                           60000
+    transactions:                        3000   (49.98 per sec.)
+    queries:                             60000  (999.60 per sec.)
+    ignored errors:                      2      (0.03 per sec.)
+    reconnects:                          0      (0.00 per sec.)
+
+General statistics:
+    total time:                          60.0210s
+    total number of events:              3000
+
+Latency (ms):
+         min:                                    0.50
+         avg:                                    6.48
+         max:                                   49.80
+         95th percentile:                       41.10
+         sum:                               19440.00
+
+Threads fairness:
+    events (avg/stddev):           750.0000/3.00
+    execution time (avg/stddev):   4.8600/0.01
+
+"""
+
+# output of sakila.lua with 2 threads and the checkout and inventory types
+SAKILA_RUN = """Threads started!
+
+SAKILA checkout 120 1 480.500 3.956:60,4.028:59,12.752:1
+SAKILA inventory 300 0 150.000 0.499:300
+SAKILA checkout 100 0 400.000 3.956:100
+SAKILA inventory 280 0 140.000 0.499:279,0.508:1
+
+SQL statistics:
+    transactions:                        800    (13.33 per sec.)
+"""
+
+# ndb_mgm -e 'all status' on a MySQL Cluster 7.2 master while the data nodes start
+NDB_ALL_STATUS = """Connected to Management Server at: 10.0.0.1:1186
+Node 2: started (mysql-5.5.19 ndb-7.2.1)
+Node 3: starting (Last completed phase 4) (mysql-5.5.19 ndb-7.2.1)
+Node 4: not connected
+Node 5: not started (mysql-5.5.19 ndb-7.2.1)
+
+"""
+
+
+def checkParsers():
+    """
+        Checks the parsers of the remote outputs and the statistics against recorded outputs and known values
+
+        Errors
+        -------
+        AssertionError on the first mismatch
+        """
+    def close(value, expected, tolerance=1e-3):
+        return abs(value - expected) <= tolerance * max(1.0, abs(expected))
+
+    # statistics, against tables of the Student t distribution
+    assert close(script.regularizedBeta(0.3, 1.0, 1.0), 0.3)
+    assert close(script.regularizedBeta(0.5, 4.0, 4.0), 0.5)
+    assert close(script.regularizedBeta(0.2, 3.0, 1.0), 0.2 ** 3)
+    assert close(script.regularizedBeta(0.9, 2.0, 5.0) + script.regularizedBeta(0.1, 5.0, 2.0), 1.0)
+    assert script.regularizedBeta(0.0, 2.0, 3.0) == 0.0 and script.regularizedBeta(1.0, 2.0, 3.0) == 1.0
+    for df, quantile in [(1, 12.706), (2, 4.303), (5, 2.571), (10, 2.228), (30, 2.042)]:
+        assert close(script.studentTQuantile(0.95, df), quantile), df
+        assert close(script.studentTPValue(quantile, df), 0.05, 1e-2), df
+    assert close(script.studentTQuantile(0.99, 10), 3.169)
+    assert close(script.studentTPValue(0.0, 7), 1.0)
+
+    # Welch's example of two samples of 15 with unequal variances: t = 2.46, df = 24.9, p = 0.021
+    sampleA = [27.5, 21.0, 19.0, 23.6, 17.0, 17.9, 16.9, 20.1, 21.9, 22.6, 23.1, 19.6, 19.0, 21.7, 21.4]
+    sampleB = [27.1, 22.0, 20.8, 23.4, 23.4, 23.5, 25.8, 22.0, 24.8, 20.2, 21.9, 22.1, 22.9, 20.5, 24.4]
+    t, df, pValue = script.welchTest(script.summarize(sampleA), script.summarize(sampleB))
+    assert close(t, 2.46, 1e-2) and close(df, 24.9, 1e-2) and close(pValue, 0.021, 5e-2), (t, df, pValue)
+    assert script.welchTest(script.summarize([1.0]), script.summarize(sampleB)) is None
+    assert script.welchTest(script.summarize([2.0, 2.0]), script.summarize([2.0, 2.0]))[2] == 1.0
+
+    # sysbench output with a histogram of 300 buckets (0.5 to 100 ms) of 10 events each, longer than the
+    # 200 line tail of runCommand
+    mult = 1023 / (math.log(100000) - math.log(0.001))
+    first = math.floor((math.log(0.5) - math.log(0.001)) * mult)
+    values = [float("%.3f" % math.exp(i / mult + math.log(0.001))) for i in range(first, first + 300)]
+    histogramLines = ["%12.3f |%-40s %d" % (value, "*" * 4, 10) for value in values]
+    output = SYSBENCH_RUN_HEAD + "\n".join(histogramLines) + "\n" + SYSBENCH_RUN_TAIL
+    histogram = script.parseHistogram(output)
+    assert len(histogram) == 300 and sum(histogram.values()) == 3000
+    assert script.histogramPercentile(histogram, 50.0) == values[149]
+    assert script.histogramPercentile(histogram, 99.0) == values[296]
+    assert script.histogramPercentile(histogram, 99.9) == values[299]
+    assert script.histogramPercentile(histogram, 100.0) == values[-1]
+    assert script.histogramPercentile({}, 50.0) is None
+    metrics = script.parseSysbenchOutput(output)
+    assert metrics["threads"] == 4 and metrics["transactions"] == 3000 and metrics["events"] == 3000
+    assert metrics["tps"] == 49.98 and metrics["qps"] == 999.60 and metrics["errors"] == 2
+    assert (metrics["reads"], metrics["writes"], metrics["other"], metrics["queries_total"]) == (42000, 12000, 6000, 60000)
+    assert metrics["total_time"] == 60.021
+    assert (metrics["latency_min"], metrics["latency_avg"], metrics["latency_max"]) == (0.5, 6.48, 49.8)
+    assert metrics["latency_p95"] == 41.10
+    assert (metrics["latency_p50"], metrics["latency_p99"], metrics["latency_p999"]) == (values[149], values[296], values[299])
+    # without --histogram the percentiles are missing, not wrong
+    metrics = script.parseSysbenchOutput(SYSBENCH_RUN_HEAD.split("Latency histogram")[0] + SYSBENCH_RUN_TAIL)
+    assert metrics["tps"] == 49.98 and metrics["latency_p99"] is None
+    try:
+        script.parseSysbenchOutput("FATAL: unable to connect to MySQL server")
+        assert False, "parseSysbenchOutput accepted an output without a run"
+    except ValueError:
+        pass
+
+    stats = script.parseSakilaOutput(SAKILA_RUN)
+    assert sorted(stats) == ["checkout", "inventory"]
+    assert stats["checkout"]["threads"] == 2 and stats["checkout"]["transactions"] == 220
+    assert stats["checkout"]["errors"] == 1 and close(stats["checkout"]["latency_sum"], 880.5)
+    assert stats["checkout"]["histogram"] == {3.956: 160, 4.028: 59, 12.752: 1}
+    assert stats["inventory"]["histogram"] == {0.499: 579, 0.508: 1}
+    script.checkSakilaStats(stats, {"threads": 2, "mix": "checkout=50,inventory=50"})
+    for params in [{"threads": 3, "mix": "checkout=50,inventory=50"}, {"threads": 2, "mix": "checkout=50,return=50"}]:
+        try:
+            script.checkSakilaStats(stats, params)
+            assert False, "checkSakilaStats accepted an incomplete run"
+        except script.CommandError:
+            pass
+    assert script.parseSakilaOutput("Threads started!\n") == {}
+
+    assert script.parseNdbStatus(NDB_ALL_STATUS) == {2: "started", 3: "starting", 4: "not connected", 5: "not started"}
+
+    topology = {"dataNodes": 2, "replicas": 2, "sqlNodes": 1}
+    config = script.renderConfigIni("10.0.0.1", ["10.0.0.2", "10.0.0.3"], topology, ["10.0.0.4"])
+    sections = [block.splitlines() for block in config.strip().split("\n\n")]
+    assert [lines[0] for lines in sections] == ["[ndb_mgmd]", "[ndbd default]", "[ndbd]", "[ndbd]", "[mysqld]", "[mysqld]"]
+    assert "hostname=10.0.0.1" in sections[0] and "noofreplicas=2" in sections[1]
+    for name, value in script.dataNodeSizing("t2.micro").items():
+        assert name + "=" + value in sections[1], name
+    nodeIds = [line for lines in sections for line in lines if line.startswith("nodeid=")]
+    assert nodeIds == ["nodeid=1", "nodeid=2", "nodeid=3", "nodeid=50", "nodeid=51"]
+    assert sections[2][1:] == ["hostname=10.0.0.2", "nodeid=2"] and sections[5][1:] == ["hostname=10.0.0.4", "nodeid=51"]
+    # the mysqld slot of the master accepts any host
+    assert sections[4][1:] == ["nodeid=50"]
+    for ips, sqlIps in [(["10.0.0.2"], ["10.0.0.4"]), (["10.0.0.2", "10.0.0.3"], [])]:
+        try:
+            script.renderConfigIni("10.0.0.1", ips, topology, sqlIps)
+            assert False, "renderConfigIni accepted a topology that does not match the ips"
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    print("-------------------Parser and statistics checks (recorded outputs)-------------------")
+    checkParsers()
+    print("ok")
+
+    print("-------------------Provisioning benchmark (mocked EC2)-------------------")
+    results = benchmarkProvisioning()
+    for strategy, (seconds, calls) in results.items():
+        print("%-12s %7.2f s %4d api calls" % (strategy, seconds, calls))
+    print("speedup: %.1fx" % (results["sequential"][0] / results["batched"][0]))
+
+    print("-------------------End to end provisioning (mocked EC2, fake SSH server)-------------------")
+    results = benchmarkEndToEnd()
+    for run, counters in results.items():
+        print("%-8s %7.2f s %4d ec2 calls %4d ssh connections %4d ssh round trips"
+              % (run, counters["seconds"], counters["ec2 calls"], counters["ssh connections"], counters["ssh round trips"]))
+
+    print("-------------------Teardown benchmark (mocked EC2)-------------------")
+    results = benchmarkTeardown()
+    for strategy, (seconds, calls) in results.items():
+        print("%-12s %7.2f s %4d api calls" % (strategy, seconds, calls))
+
+    print("-------------------Artifact cache benchmark (local throttled upstream)-------------------")
+    results = benchmarkArtifactCache()
+    print("upstream x5 %6.2f s, cache %6.2f s, %d bytes and %.1f s of upstream downloads saved"
+          % (results["upstream"], results["cached"], results["bytes saved"], results["seconds saved"]))
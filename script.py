@@ -1,12 +1,39 @@
 # Keys are defined in configuration file
 # MAKE SURE YOU UPDATED YOUR .AWS/credentials file
 # MAKE SURE boto3 and paramiko are installed using pip
+import argparse
 import boto3
+import codecs
+import csv
+import hashlib
+import http.server
+import io
+import itertools
+import json
+import math
+import os
+import random
+import re
+import select
+import shlex
+import shutil
+import socket
+import sqlite3
+import sys
+import tarfile
+import textwrap
+import threading
 import time
+import urllib.parse
+import urllib.request
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from datetime import date
 from datetime import datetime, timedelta
 
 import paramiko
+from botocore.exceptions import ClientError
 
 # allows us to geth the path for the pem file
 from pathlib import Path
@@ -18,6 +45,163 @@ def get_project_root() -> Path:
     """
     return Path(__file__).parent
 
+# Don't change these
+KEY_NAME = "vockey"
+# fallback when no image lookup is done, the provision command looks up the latest IMAGE_NAME of IMAGE_OWNER
+INSTANCE_IMAGE = "ami-08d4ac5b634553e16"
+IMAGE_OWNER = "099720109477"  # Canonical
+IMAGE_NAME = "ubuntu/images/hvm-ssd/ubuntu-focal-20.04-amd64-server-*"
+
+# default VPC, its subnets and the image id, cached per region and account
+METADATA_FILE = get_project_root() / "cache" / "metadata.json"
+METADATA_TTL = 24 * 3600
+
+# tag put on every instance launched by this program, so that a run can be found again
+PROJECT_TAG = "cc-poly-aura"
+
+# credentials and database used by the benchmarks
+MYSQL_USER = "root"
+MYSQL_PASSWORD = "mypassword"
+MYSQL_DB = "sakila"
+# mysql client of MySQL Cluster, the profile.d PATH is not loaded by non interactive SSH sessions
+NDB_MGM = "/opt/mysqlcluster/home/mysqlc/bin/ndb_mgm"
+MYSQL_CLIENT = "/opt/mysqlcluster/home/mysqlc/bin/mysql"
+
+# output of every remote command is appended to LOG_DIR/<ip>.log
+LOG_DIR = get_project_root() / "logs"
+
+"""
+Tracing
+The phases of a command are recorded as spans and written to TRACE_DIR/<run id>-<command>.json
+at the end of the command, open the file in chrome://tracing or https://ui.perfetto.dev
+"""
+class Tracer:
+    """
+        Records timed, nested spans and writes them in the Chrome trace event format,
+        which chrome://tracing and https://ui.perfetto.dev can open
+        Spans nest per thread; a span started in a worker thread can name its parent explicitly
+        """
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+        self.threads = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def current(self):
+        """
+            Returns the name of the innermost open span of the calling thread, None if there is none
+            """
+        stack = getattr(self.local, "stack", None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, parent=None, **attributes):
+        """
+            Times the enclosed block
+
+            Parameters
+            ----------
+            name : str
+                name of the span, spans with the same name are aggregated in the summary
+            parent : str
+                name of the parent span, by default the innermost open span of the thread
+            attributes
+                attributes shown with the span, for example host and role
+            """
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        parent = parent or (stack[-1] if stack else None)
+        stack.append(name)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as exception:
+            error = repr(exception)
+            raise
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            args = {key: str(value) for key, value in attributes.items()}
+            if parent:
+                args["parent"] = parent
+            if error:
+                args["error"] = error
+            with self.lock:
+                tid = self.threads.setdefault(threading.current_thread().name, len(self.threads) + 1)
+                self.events.append({"name": name, "cat": name.split(":")[0], "ph": "X", "pid": 1, "tid": tid,
+                                    "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6, "args": args})
+
+    def write(self, path):
+        """
+            Writes the spans recorded so far as a Chrome trace file
+            """
+        with self.lock:
+            events = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                      for name, tid in self.threads.items()]
+            events += sorted(self.events, key=lambda event: event["ts"])
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as traceFile:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, traceFile)
+
+    def summary(self):
+        """
+            Prints the count, total, mean and max duration of the spans, grouped by name, slowest total first
+            """
+        totals = {}
+        with self.lock:
+            for event in self.events:
+                count, total, longest = totals.get(event["name"], (0, 0.0, 0.0))
+                seconds = event["dur"] / 1e6
+                totals[event["name"]] = (count + 1, total + seconds, max(longest, seconds))
+        print("%-32s %6s %10s %10s %10s" % ("span", "count", "total s", "mean s", "max s"))
+        for name, (count, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            print("%-32s %6d %10.2f %10.2f %10.2f" % (name[:32], count, total, total / count, longest))
+
+# spans of the current process, written to TRACE_DIR at the end of a command
+TRACER = Tracer()
+TRACE_DIR = get_project_root() / "traces"
+
+# tables of sakila loaded at the same time
+SAKILA_LOAD_THREADS = 4
+
+def renderSakilaLoad(mysql, threads=SAKILA_LOAD_THREADS):
+    """
+        Renders the shell lines loading sakila from tmp/sakila-db
+        The schema is created first, then sakila-data.sql is split at its "Dumping data for table" comments
+        and the tables are loaded in parallel, each part with the SET header of the file (foreign key checks off)
+        The last line printed is "sakila load: <rows> rows in <seconds> s"
+
+        Parameters
+        ----------
+        mysql : str
+            mysql client command, with its credentials
+        threads : int
+            number of tables loaded at the same time
+
+        Returns
+        -------
+        str
+            the shell lines
+        """
+    return textwrap.dedent("""\
+        # setting up sakila db, the tables are loaded in parallel
+        start=$(date +%s.%N)
+        MYSQL -e "SOURCE tmp/sakila-db/sakila-schema.sql"
+        cd tmp/sakila-db
+        rm -f part-*.sql
+        awk 'BEGIN {n = 0} /^-- Dumping data for table/ {n++} {print > ("part-" n ".sql")}' sakila-data.sql
+        ls part-*.sql | grep -v '^part-0.sql$' | xargs -P THREADS -I{} sh -c '(cat part-0.sql {}; echo "COMMIT;") | MYSQL sakila'
+        cd ../..
+        rows=$(MYSQL -N -e "SELECT SUM(TABLE_ROWS) FROM information_schema.tables WHERE table_schema = 'sakila'")
+        echo "sakila load: $rows rows in $(awk "BEGIN {print $(date +%s.%N) - $start}") s"
+        """).replace("MYSQL", mysql).replace("THREADS", str(threads))
+
+# "sakila load: <rows> rows in <seconds> s", printed by renderSakilaLoad
+SAKILA_LOAD_REPORT = re.compile(r"sakila load: (\d+) rows in ([\d.]+) s")
+
 """
 The user data constants are used to setup and download programs on the instances
 They are passed as arguments in the create instance step
@@ -33,11 +217,17 @@ yes | sudo apt install mysql-server
 yes | sudo apt-get install sysbench
 
 # running mysql_secure_installation commands
-sudo mysql -e "UPDATE mysql.user SET Password = PASSWORD('mypassword) WHERE User = 'root'"
-sudo mysql -e "DROP USER ''@'localhost'"
-sudo mysql -e "DROP USER ''@'$(hostname)'"
-sudo mysql -e "DROP DATABASE test"
-sudo mysql -e "FLUSH PRIVILEGES"
+# MySQL 8 authenticates root@localhost with auth_socket, which also matches the sysbench connections to 127.0.0.1,
+# root gets the password of the benchmark instead
+sudo mysql -e "DROP USER IF EXISTS ''@'localhost'"
+sudo mysql -e "DROP USER IF EXISTS ''@'$(hostname)'"
+sudo mysql -e "DROP DATABASE IF EXISTS test"
+sudo mysql -e "ALTER USER 'root'@'localhost' IDENTIFIED WITH mysql_native_password BY 'mypassword'; FLUSH PRIVILEGES"
+
+# let the benchmark client instances in
+sudo sed -i "s/^bind-address.*/bind-address = 0.0.0.0/" /etc/mysql/mysql.conf.d/mysqld.cnf
+sudo mysql -u root -p"mypassword" -e "CREATE USER IF NOT EXISTS 'root'@'%' IDENTIFIED WITH mysql_native_password BY 'mypassword'; GRANT ALL PRIVILEGES ON *.* TO 'root'@'%'; FLUSH PRIVILEGES"
+sudo service mysql restart
 
 # downloading sakila
 mkdir tmp
@@ -46,16 +236,9 @@ sudo wget http://downloads.mysql.com/docs/sakila-db.zip
 unzip sakila-db.zip
 cd ..
 
-# setting up sakila db
-sudo mysql -u root -p"mypassword" <<EOF
-SOURCE tmp/sakila-db/sakila-schema.sql;
-SOURCE tmp/sakila-db/sakila-data.sql;
-USE sakila;
-exit
-EOF
-
+""" + renderSakilaLoad('sudo mysql -u root -p"mypassword"') + """
 sudo sysbench oltp_read_write --table-size=1000000 --mysql-db=sakila --mysql-user=root --mysql-password=mypassword prepare
-sudo sysbench oltp_read_write --table-size=1000000 --mysql-db=sakila --mysql-user=root --mysql-password=mypassword run > results.txt
+sudo sysbench oltp_read_write --table-size=1000000 --mysql-db=sakila --mysql-user=root --mysql-password=mypassword --histogram run > results.txt
 
 """
 
@@ -80,6 +263,14 @@ sudo mkdir -p /opt/mysqlcluster/deploy/ndb_data
 
 """
 
+# my.cnf of the mysqld of the cluster, dedicated SQL nodes get it with the connection string of the master
+MY_CNF_TEMPLATE = """[mysqld]
+ndbcluster
+datadir=/opt/mysqlcluster/deploy/mysqld_data
+basedir=/opt/mysqlcluster/home/mysqlc
+port=3306
+"""
+
 userdata_masternode="""#!/bin/bash
 
 sudo apt update
@@ -109,12 +300,7 @@ cd conf
 echo -n > my.cnf
 sudo chmod 664 my.cnf
 sudo cat <<EOF >my.cnf
-[mysqld]
-ndbcluster
-datadir=/opt/mysqlcluster/deploy/mysqld_data
-basedir=/opt/mysqlcluster/home/mysqlc
-port=3306
-EOF
+""" + MY_CNF_TEMPLATE + """EOF
 
 cd /opt/mysqlcluster/deploy
 sudo chmod -R 777 mysqld_data
@@ -122,10 +308,115 @@ sudo chmod -R 777 ndb_data
 
 """
 
+# dedicated SQL nodes install MySQL Cluster like the master, their my.cnf is staged once the master ip is known
+userdata_sqlnode="""#!/bin/bash
+
+sudo apt update
+sudo apt install wget
+sudo service mysqld stop
+yes | sudo apt install yum
+sudo yum remove mysql-server mysql mysql-devel
+
+mkdir -p /opt/mysqlcluster/home
+cd /opt/mysqlcluster/home
+wget http://dev.mysql.com/get/Downloads/MySQL-Cluster-7.2/mysql-cluster-gpl-7.2.1-linux2.6-x86_64.tar.gz
+sudo tar -xf mysql-cluster-gpl-7.2.1-linux2.6-x86_64.tar.gz
+sudo ln -s mysql-cluster-gpl-7.2.1-linux2.6-x86_64 mysqlc
+sudo chmod -R 777 mysqlc
+
+echo 'export MYSQLC_HOME=/opt/mysqlcluster/home/mysqlc' > /etc/profile.d/mysqlc.sh
+echo 'export PATH=$MYSQLC_HOME/bin:$PATH' >> /etc/profile.d/mysqlc.sh
+
+sudo mkdir -p /opt/mysqlcluster/deploy
+cd /opt/mysqlcluster/deploy
+sudo mkdir conf
+sudo mkdir mysqld_data
+sudo chmod 777 conf
+sudo chmod -R 777 mysqld_data
+
+"""
+
+# benchmark client instances only run sysbench against the stand-alone instance or the cluster
+userdata_client="""#!/bin/bash
+sudo apt update
+yes | sudo apt-get install sysbench
+
+"""
+
+def getDefaultVpc(ec2_client):
+    """
+        Returns the id of the default VPC of the region
+
+        Errors
+        -------
+        ValueError if the region has no default VPC
+        """
+    vpcs = ec2_client.describe_vpcs(Filters=[{"Name": "isDefault", "Values": ["true"]}])["Vpcs"]
+    if not vpcs:
+        raise ValueError("the region has no default VPC")
+    return vpcs[0]["VpcId"]
+
+def getImageId(ec2_client, owner=IMAGE_OWNER, name=IMAGE_NAME):
+    """
+        Returns the id of the most recent available x86_64 image matching the name pattern of the owner
+
+        Errors
+        -------
+        ValueError if no image matches
+        """
+    images = ec2_client.describe_images(Owners=[owner], Filters=[
+        {"Name": "name", "Values": [name]},
+        {"Name": "state", "Values": ["available"]},
+        {"Name": "architecture", "Values": ["x86_64"]},
+    ])["Images"]
+    if not images:
+        raise ValueError("no image " + name + " of owner " + owner)
+    return max(images, key=lambda image: image["CreationDate"])["ImageId"]
+
+def getAwsMetadata(ec2_client, sts_client=None, path=METADATA_FILE, ttl=METADATA_TTL, refresh=False):
+    """
+        Returns the default VPC, its subnet per availability zone and the image id
+        The lookups are cached in a JSON file keyed by region and account, a cached entry is used for ttl seconds
+
+        Parameters
+        ----------
+        ec2_client : client
+            Boto3 client to access certain function to controll AWS CLI
+        sts_client : client
+            Boto3 sts client used to find the account, None to key the cache by region only
+        path : Path
+            cache file
+        ttl : float
+            seconds a cached entry stays valid
+        refresh : bool
+            ignore the cached entry
+
+        Returns
+        -------
+        dict
+            vpcId, availabilityZones (dict of availability zone name as key and subnet id as value) and imageId
+        """
+    account = sts_client.get_caller_identity()["Account"] if sts_client else "default"
+    key = ec2_client.meta.region_name + "/" + account
+    path = Path(path)
+    cache = json.loads(path.read_text()) if path.exists() else {}
+    entry = cache.get(key)
+    if entry and not refresh and time.time() - entry["fetchedAt"] < ttl:
+        return entry["metadata"]
+
+    with TRACER.span("awsMetadata", key=key):
+        vpcId = getDefaultVpc(ec2_client)
+        metadata = {"vpcId": vpcId, "availabilityZones": getAvailabilityZones(ec2_client, vpcId), "imageId": getImageId(ec2_client)}
+    cache[key] = {"fetchedAt": time.time(), "metadata": metadata}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(cache, indent=2, sort_keys=True))
+    os.replace(temporary, path)
+    return metadata
 
-def createSecurityGroup(ec2_client):
+def createSecurityGroup(ec2_client, vpc_id=None):
     """
-        The function creates a new security group in AWS
+        The function creates a new security group in AWS, or reuses it if it already exists
         The function retrievs the vsp_id from the AWS portal, as it is personal and needed for creating a new group
         It then creates the security group using boto3 package
         then it waits for the creation
@@ -135,6 +426,8 @@ def createSecurityGroup(ec2_client):
         ----------
         ec2_client
             client that allows for sertain functions using boto3
+        vpc_id : str
+            VPC of the group, None to look up the default VPC
 
         Returns
         -------
@@ -143,51 +436,59 @@ def createSecurityGroup(ec2_client):
         vpc_id : str
             the vpc_id as it is needed for other operations
 
-        Errors
-        -------
-        The function throws an error if a security group with the same name already exists in your AWS
-
     """
-    # Create security group, using SSH, HTTP, 1186 & MySQL access available from anywhere
-    groups = ec2_client.describe_security_groups()
-    vpc_id = groups["SecurityGroups"][0]["VpcId"]
+    with TRACER.span("createSecurityGroup"):
+        vpc_id = vpc_id or getDefaultVpc(ec2_client)
+
+        # a previous run already created the group, its rules are in place
+        existing = ec2_client.describe_security_groups(Filters=[
+            {"Name": "group-name", "Values": ["Cloud Computing Project"]},
+            {"Name": "vpc-id", "Values": [vpc_id]},
+        ])["SecurityGroups"]
+        if existing:
+            return [existing[0]["GroupId"]], vpc_id
+
+        # Create security group, using SSH, HTTP, 1186 & MySQL access available from anywhere
 
-    new_group = ec2_client.create_security_group(
-        Description="SSH and HTTP access",
-        GroupName="Cloud Computing Project",
-        VpcId=vpc_id
-    )
+        new_group = ec2_client.create_security_group(
+            Description="SSH and HTTP access",
+            GroupName="Cloud Computing Project",
+            VpcId=vpc_id
+        )
 
-    # Wait for the security group to exist!
-    new_group_waiter = ec2_client.get_waiter('security_group_exists')
-    new_group_waiter.wait(GroupNames=["Cloud Computing Project"])
+        # Wait for the security group to exist!
+        new_group_waiter = ec2_client.get_waiter('security_group_exists')
+        new_group_waiter.wait(GroupNames=["Cloud Computing Project"])
 
-    group_id = new_group["GroupId"]
+        group_id = new_group["GroupId"]
 
-    rule_creation = ec2_client.authorize_security_group_ingress(
-        GroupName="Cloud Computing Project",
-        GroupId=group_id,
-        IpPermissions=[
-        {
-            'FromPort': 0,
-            'ToPort': 65535,
-            'IpProtocol': '-1',
-            'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
-        }]
-    )
+        rule_creation = ec2_client.authorize_security_group_ingress(
+            GroupName="Cloud Computing Project",
+            GroupId=group_id,
+            IpPermissions=[
+            {
+                'FromPort': 0,
+                'ToPort': 65535,
+                'IpProtocol': '-1',
+                'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+            }]
+        )
 
-    SECURITY_GROUP = [group_id]
-    return SECURITY_GROUP, vpc_id
+        SECURITY_GROUP = [group_id]
+        return SECURITY_GROUP, vpc_id
 
-def getAvailabilityZones(ec2_client):
+def getAvailabilityZones(ec2_client, vpcId=None):
     """
         Retrieving the subnet ids for availability zones
         they are required to assign for example instances to a specific availabilityzone
+        Every page of describe_subnets is read, in a VPC the default subnet of each zone is preferred
 
         Parameters
         ----------
         ec2_client
             client of boto3 tho access certain methods related to AWS EC2
+        vpcId : str
+            only use the subnets of this VPC, None for every subnet
 
         Returns
         -------
@@ -195,15 +496,16 @@ def getAvailabilityZones(ec2_client):
             a dictonary, with availability zone name as key and subnet id as value
 
         """
-    # Availability zones
-    response = ec2_client.describe_subnets()
+    with TRACER.span("getAvailabilityZones"):
+        # Availability zones
+        filters = [{"Name": "vpc-id", "Values": [vpcId]}] if vpcId else []
+        availabilityzones = {}
+        for page in ec2_client.get_paginator("describe_subnets").paginate(Filters=filters):
+            for subnet in page["Subnets"]:
+                if subnet.get("DefaultForAz") or subnet["AvailabilityZone"] not in availabilityzones:
+                    availabilityzones[subnet["AvailabilityZone"]] = subnet["SubnetId"]
 
-    availabilityzones = {}
-    for subnet in response.get('Subnets'):
-        # print(subnet)
-        availabilityzones.update({subnet.get('AvailabilityZone'): subnet.get('SubnetId')})
-
-    return availabilityzones
+        return availabilityzones
 
 def createInstance(ec2, INSTANCE_TYPE, COUNT, SECURITY_GROUP, SUBNET_ID, userdata):
     """
@@ -230,22 +532,19 @@ def createInstance(ec2, INSTANCE_TYPE, COUNT, SECURITY_GROUP, SUBNET_ID, userdat
             list of all created instances, including their data
 
         """
-    # Don't change these
-    KEY_NAME = "vockey"
-    INSTANCE_IMAGE = "ami-08d4ac5b634553e16"
-
-    return ec2.create_instances(
-        ImageId=INSTANCE_IMAGE,
-        MinCount=COUNT,
-        MaxCount=COUNT,
-        InstanceType=INSTANCE_TYPE,
-        KeyName=KEY_NAME,
-        SecurityGroupIds=SECURITY_GROUP,
-        SubnetId=SUBNET_ID,
-        UserData=userdata
-    )
+    with TRACER.span("createInstance", type=INSTANCE_TYPE, count=COUNT):
+        return ec2.create_instances(
+            ImageId=INSTANCE_IMAGE,
+            MinCount=COUNT,
+            MaxCount=COUNT,
+            InstanceType=INSTANCE_TYPE,
+            KeyName=KEY_NAME,
+            SecurityGroupIds=SECURITY_GROUP,
+            SubnetId=SUBNET_ID,
+            UserData=userdata
+        )
 
-def createInstances(ec2_client, ec2, SECURITY_GROUP, availabilityZones, userdata):
+def createInstances(ec2_client, ec2, SECURITY_GROUP, availabilityZones, userdata, instanceType="t2.micro"):
     """
         function that retrievs and processes attributes as well as defining the amount and types of instances to be created
         getting the decired subnet id
@@ -265,6 +564,8 @@ def createInstances(ec2_client, ec2, SECURITY_GROUP, availabilityZones, userdata
             dict of availability zone names an key and subnet ids as value
         userdata : str
             script to setup instances
+        instanceType : str
+            type of the instance
 
         Returns
         -------
@@ -274,15 +575,16 @@ def createInstances(ec2_client, ec2, SECURITY_GROUP, availabilityZones, userdata
     # Get wanted availability zone
     availability_zone_1a = availabilityZones.get('us-east-1a')
 
-    # Use t2.micro for deployment/demo
-    instances_t2_a = createInstance(ec2, "t2.micro", 1, SECURITY_GROUP, availability_zone_1a, userdata)
+    # t2.micro by default for deployment/demo
+    instances_t2_a = createInstance(ec2, instanceType, 1, SECURITY_GROUP, availability_zone_1a, userdata)
 
     instance_ids = []
 
     instance_ids.append(instances_t2_a[0].id)
 
-    instances_t2_a[0].wait_until_running()
-    instances_t2_a[0].reload()
+    with TRACER.span("wait_until_running", instance=instances_t2_a[0].id):
+        instances_t2_a[0].wait_until_running()
+        instances_t2_a[0].reload()
 
     ip = instances_t2_a[0].public_ip_address
     privateip = instances_t2_a[0].private_ip_address
@@ -290,361 +592,4215 @@ def createInstances(ec2_client, ec2, SECURITY_GROUP, availabilityZones, userdata
     print(privateip)
 
     # Wait for all instances to be active!
-    instance_running_waiter = ec2_client.get_waiter('instance_running')
-    instance_running_waiter.wait(InstanceIds=(instance_ids))
+    with TRACER.span("waiter:instance_running", instances=len(instance_ids)):
+        instance_running_waiter = ec2_client.get_waiter('instance_running')
+        instance_running_waiter.wait(InstanceIds=(instance_ids))
 
     return [instance_ids, ip, privateip]
 
-def getParamikoClient():
+def getClusterRoles(nbDataNodes=3, nbSqlNodes=0, nbClients=0):
     """
-        Retrievs the users PEM file and creates a paramiko client required to ssh into the instances
+        Lists the roles to be provisioned for a run, in launch order, with their user data
+        The stand-alone instance and the management node come first, then the data nodes node1..nodeN,
+        then the dedicated SQL nodes sql1..sqlM, then the benchmark clients client1..clientK
+
+        Parameters
+        ----------
+        nbDataNodes : int
+            number of data nodes in the cluster
+        nbSqlNodes : int
+            number of dedicated SQL nodes, the master always runs a mysqld as well
+        nbClients : int
+            number of instances running sysbench, 0 to run sysbench on the benchmarked instances
+
         Returns
         -------
-        client
-            the paramiko client
-        str
-            the access key from the PEM file
+        list[tuple(str, str)]
+            list of (role, userdata) pairs
         """
-    path = str(get_project_root()).replace('\\', '/')
-    print("path", path)
-    accesKey = paramiko.RSAKey.from_private_key_file(path + "/labsuser.pem")
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    roles = [("standalone", userdata_standalone), ("master", userdata_masternode)]
+    for i in range(nbDataNodes):
+        roles.append(("node" + str(i + 1), userdata_nodes))
+    for i in range(nbSqlNodes):
+        roles.append(("sql" + str(i + 1), userdata_sqlnode))
+    for i in range(nbClients):
+        roles.append(("client" + str(i + 1), userdata_client))
+    return roles
 
-    return client, accesKey
+def roleKind(role):
+    """
+        Returns the kind of a role, i.e. the role without its number ("node2" -> "node")
+        """
+    return role.rstrip("0123456789")
 
-def send_command(client, command):
+def launchInstances(ec2_client, INSTANCE_TYPE, COUNT, SECURITY_GROUP, SUBNET_ID, userdata, tags=None, imageId=INSTANCE_IMAGE):
     """
-        function that sends command to an instance using paramiko
-        print possible errors and return values
+        Launches COUNT instances sharing the same user data in a single run_instances call
+        Uses the low level client instead of the ec2 resource, as the client can be shared between threads
+
         Parameters
         ----------
-        client : client
-            the paramiko client required to connect to the intance usin ssh
-        command : str
-            The desired commands are sent to the instance
+        ec2_client : client
+            Boto3 client to access certain function to controll AWS CLI
+        INSTANCE_TYPE : str
+            name of the desired instance type.size
+        COUNT : int
+            number of instances to be created
+        SECURITY_GROUP : array[str]
+            array of the security groups that should be assigned to the instance
+        SUBNET_ID : str
+            subnet id that assigns the instance to a certain availability zone
+        userdata : str
+            string that setups and downloads programs on the instance at creation
+        tags : dict{str, str}
+            tags put on the instances at launch
+        imageId : str
+            image of the instances
+
         Returns
         -------
-        str
-            returns the return value of commands
+        list[str]
+            ids of the launched instances, in launch order
         """
-    try:
-        stdin, stdout, stderr = client.exec_command(command)
-        # the read() function reads the output in bit form
-        print("stderr.read():", stderr.read())
-        # converts the bit string to str
-        output = stdout.read().decode('ascii').split("\n")
-        print("output", output)
-        return output
-    except:
-        print("error occured in sending command")
+    with TRACER.span("createInstance", type=INSTANCE_TYPE, count=COUNT, role=(tags or {}).get("Name")):
+        parameters = dict(
+            ImageId=imageId,
+            MinCount=COUNT,
+            MaxCount=COUNT,
+            InstanceType=INSTANCE_TYPE,
+            KeyName=KEY_NAME,
+            SecurityGroupIds=SECURITY_GROUP,
+            SubnetId=SUBNET_ID,
+            UserData=userdata
+        )
+        if tags:
+            parameters["TagSpecifications"] = [{
+                'ResourceType': 'instance',
+                'Tags': [{'Key': key, 'Value': value} for key, value in tags.items()]
+            }]
 
-def createMasterFiles(ip, client, accesKey, privateipMaster, privateip1, privateip2, privateip3):
-    """
+        response = ec2_client.run_instances(**parameters)
+        return [instance["InstanceId"] for instance in response["Instances"]]
 
-        Creating setup files on master so that the files can be executed. These files are:
-        1) installation of libncurses5 and creation of config.ini file
-        2) MySQL setup file
-        3) MySQL server setup after node connections
-        4) MySQL secure installation and sakila
-        5) Sysbench preparation and run
-        Also changing access rights of the newly created files to include rwx.
-        ----------
-        ip : str
-            ip adress of the instance we wish to connect to
-        client : client
-            paramiko client to ssh into instance
-        accesKey : str
-            private accesskey to gain access to instance
-        privateipMaster : str
-            private ip adress of the master instance needed for the config.ini
-        privateip1 : str
-            private ip adress of the first instance needed for the config.ini
-        privateip2 : str
-            private ip adress of the second instance needed for the config.ini
-        privateip3 : str
-            private ip adress of the third instance needed for the config.ini
+def describeInstances(ec2_client, filters):
     """
+        Returns every instance matching the filters, following the NextToken pages of describe_instances
+        """
+    instances = []
+    parameters = {"Filters": filters}
+    while True:
+        response = ec2_client.describe_instances(**parameters)
+        for reservation in response["Reservations"]:
+            instances.extend(reservation["Instances"])
+        if not response.get("NextToken"):
+            return instances
+        parameters["NextToken"] = response["NextToken"]
 
-    try:
-        client.connect(hostname=ip, username="ubuntu", pkey=accesKey)
-    except:
-        print("could not connect to client")
+def findTaggedInstances(ec2_client, instanceType=None, instanceTypes=None):
+    """
+        Finds the pending or running instances of the project, by their Role tag
 
-    # writing the config.ini file and installing libncurses5
-    file_path = "write_config.sh"
-    file_path2 = "mysql_setup.sh"
-    file_path3 = "mysql_execution.sh"
-    file_path4 = "mysql_execution2.sh"
-    file_path5 = "sysbench.sh"
+        Parameters
+        ----------
+        ec2_client : client
+            Boto3 client to access certain function to controll AWS CLI
+        instanceType : str
+            only return instances of this type, None for any type
+        instanceTypes : dict{str, str}
+            role as key and instance type as value, only return the instances of their role's type
 
-    file_content = """#!/bin/bash
-        source /etc/profile.d/mysqlc.sh
-        sudo apt -y install libncurses5
-        cd /opt/mysqlcluster/deploy/conf/
+        Returns
+        -------
+        dict{str, tuple(str, str, str)}
+            role as key and (instance id, public ip, private ip) as value, the oldest instance wins when a role is duplicated
+        """
+    filters = [{"Name": "tag:Project", "Values": [PROJECT_TAG]},
+               {"Name": "instance-state-name", "Values": ["pending", "running"]}]
+    if instanceType:
+        filters.append({"Name": "instance-type", "Values": [instanceType]})
 
-        sudo cat <<EOF >config.ini
-        [ndb_mgmd]
-        hostname=""" + privateipMaster + """
-        datadir=/opt/mysqlcluster/deploy/ndb_data
-        nodeid=1
+    found = []
+    for instance in describeInstances(ec2_client, filters):
+        tags = {tag["Key"]: tag["Value"] for tag in instance.get("Tags", [])}
+        if "Role" in tags and (not instanceTypes or instanceTypes.get(tags["Role"]) == instance.get("InstanceType")):
+            found.append((str(instance.get("LaunchTime", "")), tags["Role"], instance))
 
-        [ndbd default]
-        noofreplicas=1
-        datadir=/opt/mysqlcluster/deploy/ndb_data
+    instances = {}
+    for _, role, instance in sorted(found, key=lambda item: item[0]):
+        instances.setdefault(role, (instance["InstanceId"], instance.get("PublicIpAddress"), instance.get("PrivateIpAddress")))
+    return instances
 
-        [ndbd]
-        hostname=""" + privateip1 + """
-        nodeid=2
+def provisionCluster(ec2_client, SECURITY_GROUP, availabilityZones, roles, instanceType="t2.micro", existing=None,
+                     imageId=INSTANCE_IMAGE, instanceTypes=None):
+    """
+        Batched alternative to calling createInstances once per instance
+        Roles sharing the same user data and instance type are launched by one run_instances call (all data nodes together),
+        the calls for the different batches are sent concurrently,
+        then a single waiter waits on all instance ids and a single describe_instances call fetches the ips
 
-        [ndbd]
-        hostname=""" + privateip2 + """
-        nodeid=3
+        Parameters
+        ----------
+        ec2_client : client
+            Boto3 client to access certain function to controll AWS CLI
+        SECURITY_GROUP : array[str]
+            list of security groups to assign to instances
+        availabilityZones : dict{str, str}
+            dict of availability zone names an key and subnet ids as value
+        roles : list[tuple(str, str)]
+            list of (role, userdata) pairs, as returned by getClusterRoles
+        instanceType : str
+            instance type used for every role missing from instanceTypes
+        existing : dict{str, tuple(str, str, str)}
+            instances to reuse by role, as returned by findTaggedInstances, only the missing roles are launched
+        imageId : str
+            image of the instances
+        instanceTypes : dict{str, str}
+            role as key and instance type as value
 
-        [ndbd]
-        hostname=""" + privateip3 + """
-        nodeid=4
+        Returns
+        -------
+        dict{str, tuple(str, str, str)}
+            role as key and (instance id, public ip, private ip) as value
 
-        [mysqld]
-        nodeid=50
+        Errors
+        -------
+        ValueError if there is no subnet to launch the instances in
         """
+    instanceTypes = instanceTypes or {}
+    if not availabilityZones:
+        raise ValueError("no default subnet in region " + ec2_client.meta.region_name)
+    # Get wanted availability zone, us-east-1a or the alphabetically first zone when the region has none
+    availability_zone_1a = availabilityZones.get('us-east-1a') or availabilityZones[min(availabilityZones)]
+    existing = existing or {}
 
-    # writing the mysql setup file
-    file_content2 = """#!/bin/bash
-        cd /opt/mysqlcluster/deploy
-        sudo chmod -R 777 mysqld_data
-        sudo chmod -R 777 ndb_data
-        cd /opt/mysqlcluster/home
-        sudo chmod -R 777 mysqlc
-
-        cd /opt/mysqlcluster/home/mysqlc
-        sudo scripts/mysql_install_db --no-defaults --datadir=/opt/mysqlcluster/deploy/mysqld_data
-        sudo /opt/mysqlcluster/home/mysqlc/bin/ndb_mgmd -f /opt/mysqlcluster/deploy/conf/config.ini --initial --configdir=/opt/mysqlcluster/deploy/conf/
-        ndb_mgm -e show
-        ndb_mgm -e 'all status'
-    """
-
-    # writing the setup file for the mysql server start
-    file_content3 = """#!/bin/bash
-        # Check statuses
-        ndb_mgm -e show
-        ndb_mgm -e 'all status'
+    # one launch per distinct user data and instance type, keeping the role order inside each batch
+    batches = {}
+    for role, userdata in roles:
+        if role not in existing:
+            batches.setdefault((userdata, instanceTypes.get(role, instanceType)), []).append(role)
 
-        # After all nodes have started
-        cd /opt/mysqlcluster/deploy
-        sudo chmod -R 777 mysqld_data
-        sudo chmod -R 777 ndb_data
-        cd /opt/mysqlcluster/home
-        sudo chmod -R 777 mysqlc
+    parent = TRACER.current()
 
-        mysqld --defaults-file=/opt/mysqlcluster/deploy/conf/my.cnf --user=root &
-    """
-    # writing the setup file for the sakila and mysql_secure_installation
-    file_content4 = """
-        # running mysql_secure_installation commands
-        mysql -uroot -e "UPDATE mysql.user SET Password = PASSWORD('mypassword') WHERE User = 'root'"
-        mysql -uroot -e "DROP USER ''@'localhost'"
-        mysql -uroot -e "DROP USER ''@'$(hostname)'"
-        mysql -uroot -e "DROP DATABASE test"
-        mysql -uroot -e "FLUSH PRIVILEGES"
+    def launch(batch):
+        userdata, batchType = batch
+        batchRoles = batches[batch]
+        tags = {"Project": PROJECT_TAG, "Name": roleKind(batchRoles[0])}
+        with TRACER.span("launch:" + tags["Name"], parent):
+            ids = launchInstances(ec2_client, batchType, len(batchRoles), SECURITY_GROUP, availability_zone_1a, userdata, tags, imageId)
+            # the batch shares its tags, the role of each instance is tagged separately so a later run can find it
+            for role, instance_id in zip(batchRoles, ids):
+                ec2_client.create_tags(Resources=[instance_id], Tags=[{"Key": "Role", "Value": role}])
+            return ids
 
-        # downloading sakila
-        sudo apt install unzip
-        cd ~
-        mkdir tmp
-        cd tmp
-        sudo wget http://downloads.mysql.com/docs/sakila-db.zip
-        unzip sakila-db.zip
-        cd ..
+    roleIds = {role: instance[0] for role, instance in existing.items()}
+    if batches:
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            for batch, ids in zip(batches, executor.map(launch, batches)):
+                roleIds.update(zip(batches[batch], ids))
+    if existing:
+        print("reusing", len([role for role, _ in roles if role in existing]), "running instances")
 
-        # setting up sakila db
-        mysql -u root -p"mypassword" <<EOF
-        SOURCE tmp/sakila-db/sakila-schema.sql;
-        SOURCE tmp/sakila-db/sakila-data.sql;
-        USE sakila;
-        exit
-    """
-    # writing the sysbench file
-    file_content5 = """#!/bin/bash
-        # sysbench installation
-        yes | sudo apt-get install sysbench
-        # sysbench
-        sysbench oltp_read_write --table-size=1000000 --mysql-host=127.0.0.1 --mysql-db=sakila --mysql-user=root --mysql-password=mypassword prepare
-        sysbench oltp_read_write --table-size=1000000 --mysql-host=127.0.0.1 --mysql-db=sakila --mysql-user=root --mysql-password=mypassword run > results.txt
-    """
+    instance_ids = [roleIds[role] for role, _ in roles]
 
-    command = f"""
-        cat << EOF > {file_path}
-        {file_content}
-    """
-    command2 = f"""
-        cat << EOF > {file_path2}
-        {file_content2}
-    """
-    command3 = f"""
-        cat << EOF > {file_path3}
-        {file_content3}
-    """
-    command4 = f"""
-        cat << EOF > {file_path4}
-        {file_content4}
-    """
-    command5 = f"""
-        cat << EOF > {file_path5}
-        {file_content5}
-    """
+    # Wait for all instances to be active!
+    with TRACER.span("waiter:instance_running", instances=len(instance_ids)):
+        instance_running_waiter = ec2_client.get_waiter('instance_running')
+        instance_running_waiter.wait(InstanceIds=instance_ids)
 
-    accessRightChanges = """#!/bin/bash
-        sudo chmod 777 write_config.sh\n
-        sudo chmod 777 mysql_setup.sh\n
-        sudo chmod 777 mysql_execution.sh\n
-        sudo chmod 777 mysql_execution2.sh\n
-        sudo chmod 777 sysbench.sh
-    """
+    addresses = {}
+    with TRACER.span("describe_instances"):
+        response = ec2_client.describe_instances(InstanceIds=instance_ids)
+    for reservation in response["Reservations"]:
+        for instance in reservation["Instances"]:
+            addresses[instance["InstanceId"]] = (instance.get("PublicIpAddress"), instance.get("PrivateIpAddress"))
 
-    configFile = send_command(client, command)
-    mysqlFile = send_command(client, command2)
-    mysqlExecutionFile = send_command(client, command3)
-    sysbenchSetup = send_command(client, command4)
-    mysqlExecutionFile2 = send_command(client, command5)
-    accessRights = send_command(client, accessRightChanges)
+    instances = {}
+    for role, _ in roles:
+        instance_id = roleIds[role]
+        ip, privateip = addresses[instance_id]
+        instances[role] = (instance_id, ip, privateip)
+    return instances
 
-    client.close()
+# every state except terminated, stopped instances keep their volumes and still have to be cleaned up
+LIVE_INSTANCE_STATES = ["pending", "running", "shutting-down", "stopping", "stopped"]
 
-def createNodeFile(ip, client, accesKey, privateipMaster):
-    """
-        Creating a file on each data node that contains all the required commands to start the data nodes
-        Also changing access rights to rwx of the created file
-        ----------
-        ip : str
-            ip adress of the instance we wish to connect to
-        client : client
-            paramiko client to ssh into instance
-        accesKey : str
-            private accesskey to gain access to instance
-        privateipMaster : str
-            private ip adress of the master instance needed for the connection
+def destroyResources(ec2_client, instanceIds=(), groupId=None, dryRun=False, timeout=600):
     """
+        Terminates the instances of the project and deletes its security group
+        The instances are found by their Project tag, plus the ids given (from the state file) in case a tag is missing,
+        they are all terminated by a single call and waited on together; the security group can only be deleted
+        once no network interface uses it anymore, so its deletion is retried until the instances are gone
+        Resources that no longer exist are skipped, so the function can be called again after a partial teardown
 
-    try:
-        client.connect(hostname=ip, username="ubuntu", pkey=accesKey)
-    except:
-        print("could not connect to client")
+        Parameters
+        ----------
+        ec2_client : client
+            Boto3 client to access certain function to controll AWS CLI
+        instanceIds : list[str]
+            ids of instances to terminate in addition to the tagged ones
+        groupId : str
+            id of the security group, None to look it up by name
+        dryRun : bool
+            only print what would be deleted
+        timeout : float
+            seconds to wait for the security group to be released
 
-    file_path = "connection.sh"
+        Returns
+        -------
+        tuple(list[str], str)
+            terminated instance ids and deleted security group id (None if there was none)
+        """
+    with TRACER.span("findResources"):
+        live = {"Name": "instance-state-name", "Values": LIVE_INSTANCE_STATES}
+        ids = {instance["InstanceId"] for instance in describeInstances(ec2_client, [{"Name": "tag:Project", "Values": [PROJECT_TAG]}, live])}
+        if instanceIds:
+            ids.update(instance["InstanceId"] for instance in describeInstances(ec2_client, [{"Name": "instance-id", "Values": list(instanceIds)}, live]))
+        ids = sorted(ids)
+        if groupId is None:
+            groups = ec2_client.describe_security_groups(
+                Filters=[{"Name": "group-name", "Values": ["Cloud Computing Project"]}])["SecurityGroups"]
+            groupId = groups[0]["GroupId"] if groups else None
 
-    file_content = """#!/bin/bash
-    source /etc/profile.d/mysqlc.sh
-    sudo apt -y install libncurses5
-    cd /opt
-    sudo chmod -R 777 /opt
-    sudo /opt/mysqlcluster/home/mysqlc/bin/ndbd -c \"""" + str(privateipMaster) + """:1186\" """
+    print("instances:", ", ".join(ids) or "none")
+    print("security group:", groupId or "none")
+    if dryRun:
+        return ids, groupId
 
-    command = f"""
-        cat << EOF > {file_path}
-        {file_content}
-    """
+    if ids:
+        with TRACER.span("terminate_instances", instances=len(ids)):
+            ec2_client.terminate_instances(InstanceIds=ids)
+        with TRACER.span("waiter:instance_terminated", instances=len(ids)):
+            ec2_client.get_waiter("instance_terminated").wait(InstanceIds=ids)
 
-    accessRightChanges = """#!/bin/bash
-        sudo chmod 777 connection.sh\n
-    """
+    if groupId is None:
+        return ids, None
 
-    connectionSetup = send_command(client, command)
-    accessRights = send_command(client, accessRightChanges)
+    def deleteGroup():
+        try:
+            ec2_client.delete_security_group(GroupId=groupId)
+            return "deleted"
+        except ClientError as error:
+            code = error.response["Error"]["Code"]
+            if code == "DependencyViolation":
+                # the network interfaces of terminated instances are released a little after the waiter returns
+                return None
+            if code == "InvalidGroup.NotFound":
+                return "already deleted"
+            return error
 
-    client.close()
+    with TRACER.span("delete_security_group"):
+        result = pollUntil(deleteGroup, timeout, "release of security group " + groupId, initialDelay=1.0, maxDelay=15.0)
+    if isinstance(result, Exception):
+        raise result
+    print("security group", groupId, result)
+    return ids, groupId
 
-def executeFiles(ip, client, accesKey, filename):
+def createSSHClient():
     """
-        Function to execute files on the instances to setup the cluster
-        ----------
-        ip : str
-            ip adress of the instance we wish to connect to
+        Creates a new paramiko client, accepting unknown host keys
+        A paramiko client holds a single connection, so every host handled in parallel needs its own client
+        Returns
+        -------
+        client
+            the paramiko client
+        """
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    return client
+
+def getParamikoClient():
+    """
+        Retrievs the users PEM file and creates a paramiko client required to ssh into the instances
+        Returns
+        -------
+        client
+            the paramiko client
+        str
+            the access key from the PEM file
+        """
+    path = str(get_project_root()).replace('\\', '/')
+    print("path", path)
+    accesKey = paramiko.RSAKey.from_private_key_file(path + "/labsuser.pem")
+    client = createSSHClient()
+
+    return client, accesKey
+
+class CommandError(Exception):
+    """
+        Raised when a remote command fails
+        """
+
+class CommandTimeout(CommandError):
+    """
+        Raised when a remote command did not finish before its timeout, the channel is closed
+        """
+
+# result of runCommand, stdout and stderr only hold the last lines of the output
+CommandResult = namedtuple("CommandResult", ["exit_status", "stdout", "stderr", "seconds"])
+
+def runCommand(client, command, timeout=None, onOutput=None, logPath=None, tailLines=200):
+    """
+        Runs a command and reads stdout and stderr incrementally as they are produced
+        Reading both streams at the same time means the command can never block on a full pipe,
+        and only the last tailLines lines are kept in memory however large the output is
+
+        Parameters
+        ----------
         client : client
-            paramiko client to ssh into instance
+            connected paramiko client
+        command : str
+            command to run
+        timeout : float
+            seconds after which the command is abandoned, None to wait forever
+        onOutput : function
+            called as onOutput(stream, line) for each line, stream being "stdout" or "stderr"
+        logPath : Path
+            file the output lines are appended to
+        tailLines : int
+            number of lines of each stream kept in the result
+
+        Returns
+        -------
+        CommandResult
+            exit status, last lines of stdout and stderr, duration in seconds
+
+        Errors
+        -------
+        CommandTimeout if the command runs longer than timeout
+        """
+    start = time.perf_counter()
+    channel = client.get_transport().open_session()
+    channel.exec_command(command)
+
+    tails = {"stdout": deque(maxlen=tailLines), "stderr": deque(maxlen=tailLines)}
+    decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace") for name in tails}
+    partial = {name: "" for name in tails}
+    logFile = None
+    if logPath is not None:
+        Path(logPath).parent.mkdir(parents=True, exist_ok=True)
+        logFile = open(logPath, "a", encoding="utf-8")
+        logFile.write("$ " + command.strip() + "\n")
+
+    def emit(name, line):
+        tails[name].append(line)
+        if logFile:
+            logFile.write(("" if name == "stdout" else "! ") + line + "\n")
+        if onOutput:
+            onOutput(name, line)
+
+    def consume(name, data, final=False):
+        text = partial[name] + decoders[name].decode(data, final)
+        lines = text.split("\n")
+        partial[name] = lines.pop()
+        for line in lines:
+            emit(name, line.rstrip("\r"))
+        if final and partial[name]:
+            emit(name, partial[name])
+            partial[name] = ""
+
+    try:
+        while True:
+            if timeout is not None and time.perf_counter() - start > timeout:
+                raise CommandTimeout(command.strip() + " timed out after " + str(timeout) + "s")
+            if channel.recv_ready():
+                consume("stdout", channel.recv(32768))
+            elif channel.recv_stderr_ready():
+                consume("stderr", channel.recv_stderr(32768))
+            elif channel.exit_status_ready():
+                break
+            else:
+                select.select([channel], [], [], 0.5)
+
+        # the exit status can arrive before the last buffered bytes
+        while channel.recv_ready():
+            consume("stdout", channel.recv(32768))
+        while channel.recv_stderr_ready():
+            consume("stderr", channel.recv_stderr(32768))
+        consume("stdout", b"", True)
+        consume("stderr", b"", True)
+        status = channel.recv_exit_status()
+    finally:
+        channel.close()
+        if logFile:
+            logFile.close()
+
+    return CommandResult(status, list(tails["stdout"]), list(tails["stderr"]), time.perf_counter() - start)
+
+class SSHConnectionPool:
+    """
+        Keeps one authenticated SSH transport per host for the whole run
+        Every command opens a new channel on the existing transport, which costs a round trip instead of a full
+        TCP + key exchange + authentication handshake
+        Connections to different hosts can be opened and used from different threads
+
+        Parameters
+        ----------
         accesKey : str
-            private accesskey to gain access to instance
-        filename : str
-            name of the file which is executed on an instance
+            private accesskey to gain access to the instances
+        username : str
+            user to log in as
+        port : int
+            SSH port of the instances
+        connectTimeout : float
+            seconds before a connection attempt is abandoned
+        """
+    def __init__(self, accesKey, username="ubuntu", port=22, connectTimeout=10):
+        self.accesKey = accesKey
+        self.username = username
+        self.port = port
+        self.connectTimeout = connectTimeout
+        self.clients = {}
+        self.hostLocks = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def hostLock(self, ip):
+        with self.lock:
+            if ip not in self.hostLocks:
+                self.hostLocks[ip] = threading.Lock()
+                self.counters[ip] = {"handshakes": 0, "handshakeSeconds": 0.0, "commands": 0, "commandSeconds": 0.0}
+            return self.hostLocks[ip]
+
+    def count(self, ip, name, seconds):
+        with self.lock:
+            self.counters[ip][name + "s"] += 1
+            self.counters[ip][name + "Seconds"] += seconds
+
+    def connect(self, ip):
+        """
+            Returns the connected client of a host, opening the connection if there is none or if it was dropped
+            """
+        with self.hostLock(ip):
+            client = self.clients.get(ip)
+            transport = client.get_transport() if client else None
+            if transport is not None and transport.is_active():
+                return client
+
+            client = createSSHClient()
+            start = time.perf_counter()
+            try:
+                with TRACER.span("ssh.connect", host=ip):
+                    client.connect(hostname=ip, port=self.port, username=self.username, pkey=self.accesKey,
+                                   timeout=self.connectTimeout)
+            except Exception:
+                client.close()
+                raise
+            self.count(ip, "handshake", time.perf_counter() - start)
+            self.clients[ip] = client
+            return client
+
+    def run(self, ip, command, timeout=None, onOutput=None):
+        """
+            Runs a command on a host through runCommand, the output is logged to LOG_DIR/<ip>.log
+
+            Returns
+            -------
+            CommandResult
+                exit status, last lines of stdout and stderr, duration in seconds
+            """
+        client = self.connect(ip)
+        start = time.perf_counter()
+        try:
+            return runCommand(client, command, timeout, onOutput, LOG_DIR / (ip + ".log"))
+        finally:
+            self.count(ip, "command", time.perf_counter() - start)
+
+    def stream(self, ip, command, data, timeout=300):
+        """
+            Runs a command on a host with data written to its standard input
+            stdout is discarded and stderr read while waiting, so the command can not block on a full pipe
+
+            Errors
+            -------
+            CommandError if the command exits with a non zero status
+            CommandTimeout if the command runs longer than timeout seconds, the channel is closed
+            """
+        client = self.connect(ip)
+        start = time.perf_counter()
+        channel = client.get_transport().open_session()
+        stderr = bytearray()
+        try:
+            # bounds every blocking send and receive, the loop below bounds the whole command
+            channel.settimeout(timeout)
+            channel.exec_command(command)
+            channel.sendall(data)
+            channel.shutdown_write()
+            while not channel.exit_status_ready():
+                if time.perf_counter() - start > timeout:
+                    raise CommandTimeout(ip + ": " + command + " timed out after " + str(timeout) + "s")
+                if channel.recv_stderr_ready():
+                    stderr += channel.recv_stderr(32768)
+                elif channel.recv_ready():
+                    channel.recv(32768)
+                else:
+                    select.select([channel], [], [], 0.5)
+            while channel.recv_stderr_ready():
+                stderr += channel.recv_stderr(32768)
+            status = channel.recv_exit_status()
+            if status != 0:
+                raise CommandError(ip + ": " + command + " exited with " + str(status) + ": " + stderr.decode("utf-8", "replace"))
+        except socket.timeout:
+            raise CommandTimeout(ip + ": " + command + " timed out after " + str(timeout) + "s")
+        finally:
+            channel.close()
+            self.count(ip, "command", time.perf_counter() - start)
+
+    def check(self, ip, command, timeout=60):
+        """
+            Runs a command on a host and returns True if it exits with status 0
+            """
+        return self.run(ip, command, timeout).exit_status == 0
+
+    def read(self, ip, remotePath):
+        """
+            Reads a remote file over SFTP and returns its content decoded as UTF-8
+            Relative paths are relative to the home directory
+            """
+        client = self.connect(ip)
+        start = time.perf_counter()
+        try:
+            sftp = client.open_sftp()
+            try:
+                with sftp.open(remotePath, "rb") as remoteFile:
+                    return remoteFile.read().decode("utf-8", "replace")
+            finally:
+                sftp.close()
+        finally:
+            self.count(ip, "command", time.perf_counter() - start)
+
+    def close(self, ip):
+        with self.hostLock(ip):
+            client = self.clients.pop(ip, None)
+            if client:
+                client.close()
+
+    def closeAll(self):
+        for ip in list(self.clients):
+            self.close(ip)
+
+    def report(self):
+        """
+            Prints the handshake and command counters per host
+            """
+        print("%-16s %10s %12s %9s %11s" % ("host", "handshakes", "handshake s", "commands", "command s"))
+        with self.lock:
+            for ip, counter in sorted(self.counters.items()):
+                print("%-16s %10d %12.2f %9d %11.2f" % (ip, counter["handshakes"], counter["handshakeSeconds"],
+                                                       counter["commands"], counter["commandSeconds"]))
+
+"""
+Readiness checks, run over SSH once the host accepts connections
+A host is ready once every command of its role kind exits with status 0
+cloud-init writes boot-finished after the user data script has completed
+"""
+READINESS_CHECKS = {
+    "standalone": [
+        ("cloud-init finished", "test -f /var/lib/cloud/instance/boot-finished"),
+    ],
+    "master": [
+        ("cloud-init finished", "test -f /var/lib/cloud/instance/boot-finished"),
+        ("mysqlc installed", "test -d /opt/mysqlcluster/home/mysqlc"),
+    ],
+    "node": [
+        ("cloud-init finished", "test -f /var/lib/cloud/instance/boot-finished"),
+        ("mysqlc installed", "test -d /opt/mysqlcluster/home/mysqlc"),
+    ],
+    "sql": [
+        ("cloud-init finished", "test -f /var/lib/cloud/instance/boot-finished"),
+        ("mysqlc installed", "test -d /opt/mysqlcluster/home/mysqlc"),
+    ],
+    "client": [
+        ("cloud-init finished", "test -f /var/lib/cloud/instance/boot-finished"),
+        ("sysbench installed", "command -v sysbench"),
+    ],
+}
+
+class NodeNotReadyError(Exception):
+    """
+        Raised when a host did not pass its readiness checks before the deadline
+        """
+
+def pollUntil(check, timeout, description, initialDelay=2.0, maxDelay=30.0):
+    """
+        Calls check until it returns a value that is not None, sleeping with exponential backoff and jitter in between
+        Exceptions raised by check count as a failed attempt
+
+        Parameters
+        ----------
+        check : function
+            function without arguments, returns None while the condition is not met
+        timeout : float
+            seconds after which polling stops
+        description : str
+            what is waited for, used in the error message
+        initialDelay : float
+            seconds slept after the first failed attempt
+        maxDelay : float
+            upper bound of the sleep between two attempts
+
+        Returns
+        -------
+        object
+            the first value returned by check that is not None
+
+        Errors
+        -------
+        NodeNotReadyError if the deadline is reached, with the last error or state as message
+        """
+    deadline = time.time() + timeout
+    delay = initialDelay
+    lastState = "never checked"
+    while True:
+        try:
+            result = check()
+            if result is not None:
+                return result
+            lastState = "not ready"
+        except Exception as error:
+            lastState = repr(error)
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise NodeNotReadyError(description + " not ready after " + str(timeout) + "s: " + lastState)
+        time.sleep(min(remaining, delay * random.uniform(0.5, 1.0)))
+        delay = min(delay * 2, maxDelay)
+
+def isPortOpen(ip, port=22, timeout=5.0):
+    """
+        Checks if a TCP connection can be opened to the given port
+        """
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+def waitUntilReady(ip, pool, role, timeout=1200):
+    """
+        Polls a host until it is reachable with SSH and all the readiness checks of its role pass
+        The stages are checked in order: TCP port 22, SSH authentication, then the commands in READINESS_CHECKS
+
+        Parameters
+        ----------
+        ip : str
+            public ip adress of the instance
+        pool : SSHConnectionPool
+            pool holding the connections, the connection opened here is kept for the next steps
+        role : str
+            role of the instance, for example "master" or "node2"
+        timeout : float
+            seconds after which the host is declared not ready
+
+        Returns
+        -------
+        float
+            seconds it took for the host to become ready
+
+        Errors
+        -------
+        NodeNotReadyError if the host is not ready before the deadline
+        """
+    with TRACER.span("waitUntilReady:" + role, host=ip, role=role):
+        start = time.time()
+        checks = READINESS_CHECKS[roleKind(role)]
+
+        def check():
+            if not isPortOpen(ip, pool.port):
+                raise ConnectionError("port " + str(pool.port) + " closed")
+            for name, command in checks:
+                if not pool.check(ip, command):
+                    raise NodeNotReadyError(name + " failed")
+            return True
+
+        pollUntil(check, timeout, role + " (" + ip + ")")
+        elapsed = time.time() - start
+        print(role, "ready after", round(elapsed), "s")
+        return elapsed
+
+class TaskFailedError(Exception):
+    """
+        Raised by TaskGraph.run when at least one step failed, the steps depending on it are not run
+        """
+
+class TaskGraph:
+    """
+        Small scheduler for the setup steps
+        Each step declares the steps it depends on, and starts on a thread pool as soon as all of them have finished,
+        so independent steps (for example staging files on the different data nodes) overlap
+        """
+    def __init__(self):
+        self.tasks = {}
+        self.order = []
+        self.timings = {}
+        self.status = {}
+        self.errors = {}
+
+    def add(self, name, function, deps=()):
+        """
+            Adds a step to the graph
+
+            Parameters
+            ----------
+            name : str
+                unique name of the step
+            function : function
+                function without arguments performing the step
+            deps : list[str]
+                names of the steps that must have finished successfully before this one starts
+            """
+        if name in self.tasks:
+            raise ValueError("step " + name + " added twice")
+        self.tasks[name] = (function, list(deps))
+        self.order.append(name)
+
+    def validate(self):
+        for name, (function, deps) in self.tasks.items():
+            for dep in deps:
+                if dep not in self.tasks:
+                    raise ValueError("step " + name + " depends on unknown step " + dep)
+        # depth first search to find cycles
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError("dependency cycle through step " + name)
+            visiting.add(name)
+            for dep in self.tasks[name][1]:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.order:
+            visit(name)
+
+    def run(self, maxWorkers=8, completed=(), onDone=None):
+        """
+            Runs every step, each one as soon as its dependencies are done
+
+            Parameters
+            ----------
+            maxWorkers : int
+                maximum number of steps running at the same time
+            completed : set[str]
+                steps finished by a previous run, they are not run again and count as done for their dependents
+            onDone : function
+                called with the name of each step that finished successfully, from the scheduling thread
+
+            Errors
+            -------
+            TaskFailedError if a step raised, once every step that could still run has finished
+            """
+        self.validate()
+        start = time.perf_counter()
+        pending = [name for name in self.order if name not in completed]
+        running = {}
+        parent = TRACER.current()
+        for name in self.order:
+            if name in completed:
+                self.status[name] = "resumed"
+
+        def timed(name, function):
+            begin = time.perf_counter() - start
+            try:
+                with TRACER.span("step:" + name, parent):
+                    function()
+            finally:
+                self.timings[name] = (begin, time.perf_counter() - start)
+
+        with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    deps = self.tasks[name][1]
+                    if any(self.status.get(dep) in ("failed", "skipped") for dep in deps):
+                        self.status[name] = "skipped"
+                        pending.remove(name)
+                    elif all(self.status.get(dep) in ("done", "resumed") for dep in deps):
+                        running[executor.submit(timed, name, self.tasks[name][0])] = name
+                        self.status[name] = "running"
+                        pending.remove(name)
+                if not running:
+                    # only steps waiting on skipped steps are left, the loop above skips them
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        self.status[name] = "done"
+                        if onDone:
+                            onDone(name)
+                    else:
+                        self.status[name] = "failed"
+                        self.errors[name] = error
+                        print("step", name, "failed:", repr(error))
+
+        if self.errors:
+            raise TaskFailedError("failed steps: " + ", ".join(self.errors))
+
+    def criticalPath(self):
+        """
+            Returns the chain of steps that determined the total duration
+            Starting from the step that finished last, it follows the dependency that finished last
+
+            Returns
+            -------
+            list[str]
+                names of the steps on the critical path, in execution order
+            """
+        finished = [name for name in self.order if name in self.timings]
+        if not finished:
+            return []
+        path = [max(finished, key=lambda name: self.timings[name][1])]
+        while True:
+            deps = [dep for dep in self.tasks[path[-1]][1] if dep in self.timings]
+            if not deps:
+                break
+            path.append(max(deps, key=lambda dep: self.timings[dep][1]))
+        return list(reversed(path))
+
+    def report(self):
+        """
+            Prints the start, end and duration of every step, then the critical path
+            """
+        print("%-24s %8s %8s %8s  %s" % ("step", "start s", "end s", "time s", "status"))
+        for name in self.order:
+            begin, end = self.timings.get(name, (0.0, 0.0))
+            print("%-24s %8.1f %8.1f %8.1f  %s" % (name, begin, end, end - begin, self.status.get(name, "pending")))
+        path = self.criticalPath()
+        if path:
+            total = self.timings[path[-1]][1]
+            print("critical path (" + str(round(total, 1)) + " s): " + " -> ".join(path))
+
+"""
+Instance types the cluster can be sized for: (vCPUs, memory in MiB)
+"""
+INSTANCE_TYPES = {
+    "t2.micro": (1, 1024),
+    "t2.small": (1, 2048),
+    "t2.medium": (2, 4096),
+    "t2.large": (2, 8192),
+    "t2.xlarge": (4, 16384),
+    "t2.2xlarge": (8, 32768),
+    "t3.medium": (2, 4096),
+    "t3.large": (2, 8192),
+    "t3.xlarge": (4, 16384),
+    "m5.large": (2, 8192),
+    "m5.xlarge": (4, 16384),
+    "m5.2xlarge": (8, 32768),
+    "c5.large": (2, 4096),
+    "c5.xlarge": (4, 8192),
+    "c5.2xlarge": (8, 16384),
+    "r5.large": (2, 16384),
+    "r5.xlarge": (4, 32768),
+}
+
+# topology used when nothing else is given, the one of the original setup
+# sqlNodes counts the dedicated SQL node instances, the mysqld of the master comes on top of them
+# clients counts the instances running sysbench, with 0 sysbench runs on the benchmarked instance itself
+# roleTypes overrides instanceType per role kind ("standalone", "master", "node", "sql", "client")
+DEFAULT_TOPOLOGY = {"dataNodes": 3, "replicas": 1, "sqlNodes": 0, "instanceType": "t2.micro", "multithreaded": False,
+                    "clients": 0, "roleTypes": {}}
+
+def roleInstanceType(topology, role):
+    """
+        Returns the instance type of a role ("node2") or role kind ("node") in a topology
+        """
+    return (topology.get("roleTypes") or {}).get(roleKind(role), topology["instanceType"])
+
+def parseRoleTypes(text):
+    """
+        Parses KIND=TYPE,KIND=TYPE into a dict, for example "master=t2.micro,node=m5.large"
+        """
+    roleTypes = {}
+    for pair in filter(None, (text or "").split(",")):
+        kind, _, instanceType = pair.partition("=")
+        roleTypes[kind.strip()] = instanceType.strip()
+    return roleTypes
+
+def validateTopology(topology):
+    """
+        Checks that a cluster topology can be deployed
+
+        Parameters
+        ----------
+        topology : dict
+            dataNodes, replicas, sqlNodes, instanceType, multithreaded, clients and roleTypes, see DEFAULT_TOPOLOGY
+
+        Errors
+        -------
+        ValueError describing the first problem found
+        """
+    dataNodes, replicas, sqlNodes = topology["dataNodes"], topology["replicas"], topology["sqlNodes"]
+    if not 1 <= replicas <= 4:
+        raise ValueError("the replica count must be between 1 and 4, got " + str(replicas))
+    if dataNodes < 1 or dataNodes % replicas != 0:
+        raise ValueError(str(dataNodes) + " data nodes can not be split into node groups of " + str(replicas) + " replicas")
+    if dataNodes > 48:
+        raise ValueError("NDB supports at most 48 data nodes, got " + str(dataNodes))
+    if not 0 <= sqlNodes <= 200:
+        raise ValueError("the SQL node count must be between 0 and 200, got " + str(sqlNodes))
+    if not 0 <= topology.get("clients", 0) <= 32:
+        raise ValueError("the client count must be between 0 and 32, got " + str(topology["clients"]))
+    for kind, instanceType in [("every role", topology["instanceType"])] + sorted((topology.get("roleTypes") or {}).items()):
+        if kind not in ("every role", "standalone", "master", "node", "sql", "client"):
+            raise ValueError("unknown role kind " + kind + ", expected standalone, master, node, sql or client")
+        if instanceType not in INSTANCE_TYPES:
+            raise ValueError("unknown instance type " + instanceType + " for " + kind + ", add it to INSTANCE_TYPES")
+
+def dataNodeSizing(instanceType, multithreaded=False):
+    """
+        Computes the data node memory and thread parameters from the size of the instance
+        A quarter of the memory (at least 256 MiB, at most 2 GiB) is left to the operating system,
+        60% of the rest goes to DataMemory and a sixth of DataMemory to IndexMemory
+
+        Parameters
+        ----------
+        instanceType : str
+            instance type of the data nodes, must be in INSTANCE_TYPES
+        multithreaded : bool
+            size the execution threads for ndbmtd
+
+        Returns
+        -------
+        dict{str, str}
+            parameter name as key and value as value, in config.ini order
+        """
+    vcpus, memory = INSTANCE_TYPES[instanceType]
+    budget = memory - min(2048, max(256, memory // 4))
+    dataMemory = int(budget * 0.6)
+    scale = max(1, memory // 1024)
+
+    sizing = {
+        "DataMemory": str(dataMemory) + "M",
+        "IndexMemory": str(max(16, dataMemory // 6)) + "M",
+        "RedoBuffer": str(min(64, 8 * scale)) + "M",
+        "MaxNoOfConcurrentOperations": str(min(1000000, 32768 * scale)),
+        "MaxNoOfConcurrentTransactions": str(min(65536, 4096 * scale)),
+        "MaxNoOfOrderedIndexes": "512",
+        "MaxNoOfAttributes": "4096",
+    }
+    if multithreaded:
+        # ndbmtd of MySQL Cluster 7.2 accepts 2 to 8 execution threads
+        sizing["MaxNoOfExecutionThreads"] = str(2 if vcpus <= 2 else 4 if vcpus <= 4 else 8)
+    return sizing
+
+def renderConfigIni(privateipMaster, dataNodeIps, topology=None, sqlNodeIps=()):
+    """
+        Renders the config.ini of the management node
+
+        Parameters
+        ----------
+        privateipMaster : str
+            private ip adress of the master instance
+        dataNodeIps : list[str]
+            private ip adresses of the data nodes, there must be topology["dataNodes"] of them
+        topology : dict
+            cluster topology, see DEFAULT_TOPOLOGY
+        sqlNodeIps : list[str]
+            private ip adresses of the dedicated SQL nodes, there must be topology["sqlNodes"] of them
+
+        Returns
+        -------
+        str
+            content of config.ini
+
+        Errors
+        -------
+        ValueError if the topology is invalid or does not match the number of ips
+        """
+    topology = dict(DEFAULT_TOPOLOGY, **(topology or {}))
+    validateTopology(topology)
+    if len(dataNodeIps) != topology["dataNodes"]:
+        raise ValueError("expected " + str(topology["dataNodes"]) + " data node ips, got " + str(len(dataNodeIps)))
+    if len(sqlNodeIps) != topology["sqlNodes"]:
+        raise ValueError("expected " + str(topology["sqlNodes"]) + " SQL node ips, got " + str(len(sqlNodeIps)))
+
+    lines = ["[ndb_mgmd]", "hostname=" + privateipMaster, "datadir=/opt/mysqlcluster/deploy/ndb_data", "nodeid=1", "",
+             "[ndbd default]", "noofreplicas=" + str(topology["replicas"]), "datadir=/opt/mysqlcluster/deploy/ndb_data"]
+    for name, value in dataNodeSizing(roleInstanceType(topology, "node"), topology["multithreaded"]).items():
+        lines.append(name + "=" + value)
+    lines.append("")
+
+    for i, privateip in enumerate(dataNodeIps):
+        lines += ["[ndbd]", "hostname=" + privateip, "nodeid=" + str(i + 2), ""]
+
+    # the first slot is the mysqld of the master, it accepts any host as in the original setup
+    lines += ["[mysqld]", "nodeid=50", ""]
+    for i, privateip in enumerate(sqlNodeIps):
+        lines += ["[mysqld]", "hostname=" + privateip, "nodeid=" + str(51 + i), ""]
+
+    return "\n".join(lines)
+
+def renderMasterFiles(privateipMaster, dataNodeIps, topology=None, sqlNodeIps=()):
+    """
+        Renders the setup files of the master locally. These files are:
+        1) installation of libncurses5 and creation of config.ini file
+        2) MySQL setup file
+        3) MySQL server setup after node connections
+        4) MySQL secure installation and sakila
+        5) Sysbench preparation and run
+
+        Parameters
+        ----------
+        privateipMaster : str
+            private ip adress of the master instance needed for the config.ini
+        dataNodeIps : list[str]
+            private ip adresses of the data nodes needed for the config.ini
+        topology : dict
+            cluster topology used to generate config.ini, see DEFAULT_TOPOLOGY
+        sqlNodeIps : list[str]
+            private ip adresses of the dedicated SQL nodes
+
+        Returns
+        -------
+        dict{str, str}
+            file name as key and file content as value
+        """
+    # writing the config.ini file and installing libncurses5
+    file_content = textwrap.dedent("""\
+        #!/bin/bash
+        source /etc/profile.d/mysqlc.sh
+        sudo apt -y install libncurses5
+        cd /opt/mysqlcluster/deploy/conf/
+
+        cat <<'EOF' >config.ini
+        """) + renderConfigIni(privateipMaster, dataNodeIps, topology, sqlNodeIps) + "EOF\n"
+
+    # writing the mysql setup file
+    file_content2 = textwrap.dedent("""\
+        #!/bin/bash
+        # a management node that can not start (port 1186 taken, bad config.ini) fails the setup
+        set -e
+        source /etc/profile.d/mysqlc.sh
+        cd /opt/mysqlcluster/deploy
+        sudo chmod -R 777 mysqld_data
+        sudo chmod -R 777 ndb_data
+        cd /opt/mysqlcluster/home
+        sudo chmod -R 777 mysqlc
+
+        cd /opt/mysqlcluster/home/mysqlc
+        sudo scripts/mysql_install_db --no-defaults --datadir=/opt/mysqlcluster/deploy/mysqld_data
+        sudo /opt/mysqlcluster/home/mysqlc/bin/ndb_mgmd -f /opt/mysqlcluster/deploy/conf/config.ini --initial --configdir=/opt/mysqlcluster/deploy/conf/
+        ndb_mgm -e show
+        ndb_mgm -e 'all status'
+        """)
+
+    # writing the setup file for the mysql server start, the provision command runs it once every data node has started
+    file_content3 = textwrap.dedent("""\
+        #!/bin/bash
+        source /etc/profile.d/mysqlc.sh
+        # Check statuses
+        ndb_mgm -e show
+        ndb_mgm -e 'all status'
+
+        # After all nodes have started
+        cd /opt/mysqlcluster/deploy
+        sudo chmod -R 777 mysqld_data
+        sudo chmod -R 777 ndb_data
+        cd /opt/mysqlcluster/home
+        sudo chmod -R 777 mysqlc
+
+        nohup mysqld --defaults-file=/opt/mysqlcluster/deploy/conf/my.cnf --user=root > ~/mysqld.log 2>&1 &
+
+        # wait for the server to accept connections
+        for i in $(seq 60); do
+            mysql -uroot -h127.0.0.1 -e "SELECT 1" > /dev/null 2>&1 && exit 0
+            sleep 5
+        done
+        echo "mysqld did not start, see ~/mysqld.log" >&2
+        exit 1
+        """)
+
+    # writing the setup file for the sakila and mysql_secure_installation
+    file_content4 = textwrap.dedent("""\
+        #!/bin/bash
+        source /etc/profile.d/mysqlc.sh
+        # running mysql_secure_installation commands
+        mysql -uroot -e "UPDATE mysql.user SET Password = PASSWORD('mypassword') WHERE User = 'root'"
+        mysql -uroot -e "DROP USER ''@'localhost'"
+        mysql -uroot -e "DROP USER ''@'$(hostname)'"
+        mysql -uroot -e "DROP DATABASE test"
+        mysql -uroot -e "GRANT ALL PRIVILEGES ON *.* TO '""" + MYSQL_USER + """'@'%' IDENTIFIED BY '""" + MYSQL_PASSWORD + """'"
+        mysql -uroot -e "FLUSH PRIVILEGES"
+
+        # downloading sakila
+        sudo apt install unzip
+        cd ~
+        mkdir tmp
+        cd tmp
+        sudo wget http://downloads.mysql.com/docs/sakila-db.zip
+        unzip sakila-db.zip
+        cd ..
+
+        """) + renderSakilaLoad('mysql -u root -p"mypassword"')
+
+    # writing the sysbench file
+    file_content5 = textwrap.dedent("""\
+        #!/bin/bash
+        # sysbench installation
+        yes | sudo apt-get install sysbench
+        # sysbench
+        sysbench oltp_read_write --table-size=1000000 --mysql-host=127.0.0.1 --mysql-db=sakila --mysql-user=root --mysql-password=mypassword prepare
+        sysbench oltp_read_write --table-size=1000000 --mysql-host=127.0.0.1 --mysql-db=sakila --mysql-user=root --mysql-password=mypassword --histogram run > results.txt
+        """)
+
+    return {
+        "write_config.sh": file_content,
+        "mysql_setup.sh": file_content2,
+        "mysql_execution.sh": file_content3,
+        "mysql_execution2.sh": file_content4,
+        "sysbench.sh": file_content5,
+    }
+
+def renderNodeFile(privateipMaster, multithreaded=False):
+    """
+        Renders the file that starts a data node and connects it to the management node
+
+        Parameters
+        ----------
+        privateipMaster : str
+            private ip adress of the master instance needed for the connection
+        multithreaded : bool
+            start the multi-threaded ndbmtd instead of ndbd
+
+        Returns
+        -------
+        dict{str, str}
+            file name as key and file content as value
+        """
+    file_content = textwrap.dedent("""\
+        #!/bin/bash
+        source /etc/profile.d/mysqlc.sh
+        sudo apt -y install libncurses5
+        cd /opt
+        sudo chmod -R 777 /opt
+        sudo /opt/mysqlcluster/home/mysqlc/bin/""" + ("ndbmtd" if multithreaded else "ndbd") + """ -c \"""" + str(privateipMaster) + """:1186\"
+        """)
+
+    return {"connection.sh": file_content}
+
+def renderSqlNodeFiles(privateipMaster):
+    """
+        Renders the files of a dedicated SQL node: its my.cnf, pointing to the management node,
+        and sql_setup.sh which initialises the data directory, starts mysqld and allows remote clients
+
+        Parameters
+        ----------
+        privateipMaster : str
+            private ip adress of the master instance needed for the connection
+
+        Returns
+        -------
+        dict{str, str}
+            file name as key and file content as value
+        """
+    file_content = MY_CNF_TEMPLATE + "ndb-connectstring=" + str(privateipMaster) + ":1186\n"
+
+    file_content2 = textwrap.dedent("""\
+        #!/bin/bash
+        cp ~/my.cnf /opt/mysqlcluster/deploy/conf/my.cnf
+        cd /opt/mysqlcluster/home/mysqlc
+        sudo scripts/mysql_install_db --no-defaults --datadir=/opt/mysqlcluster/deploy/mysqld_data
+        sudo chmod -R 777 /opt/mysqlcluster/deploy/mysqld_data
+
+        nohup bin/mysqld --defaults-file=/opt/mysqlcluster/deploy/conf/my.cnf --user=root > ~/mysqld.log 2>&1 &
+
+        # wait for the server to accept connections, then let the benchmark clients in
+        for i in $(seq 60); do
+            bin/mysql -uroot -h127.0.0.1 -e "SELECT 1" > /dev/null 2>&1 && break
+            sleep 5
+        done
+        bin/mysql -uroot -h127.0.0.1 -e "GRANT ALL PRIVILEGES ON *.* TO '""" + MYSQL_USER + """'@'%' IDENTIFIED BY '""" + MYSQL_PASSWORD + """'; FLUSH PRIVILEGES"
+        # the ndbcluster tables of the benchmark are only visible on a SQL node that has their database, the
+        # CREATE DATABASE of the master does not reach a SQL node connecting after it
+        bin/mysql -uroot -h127.0.0.1 -e "CREATE DATABASE IF NOT EXISTS """ + MYSQL_DB + """"
+        """)
+
+    return {"my.cnf": file_content, "sql_setup.sh": file_content2}
+
+def stageFiles(ip, pool, files, mode=0o777):
+    """
+        Pushes files to the home directory of an instance in a single round trip
+        The files are packed locally into a tar archive, with their permissions, and streamed into a remote tar
+
+        Parameters
+        ----------
+        ip : str
+            ip adress of the instance we wish to connect to
+        pool : SSHConnectionPool
+            pool holding the connection to the instance
+        files : dict{str, str}
+            file name as key and file content as value
+        mode : int
+            permissions given to every file
+
+        Errors
+        -------
+        CommandError if the remote tar fails
+        """
+    with TRACER.span("stageFiles", host=ip, files=len(files)):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar:
+            for name, content in files.items():
+                data = content.encode("utf-8")
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mode = mode
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(data))
+
+        pool.stream(ip, "tar -xpf - --no-same-owner", archive.getvalue())
+
+def createMasterFiles(ip, pool, privateipMaster, dataNodeIps, topology=None, sqlNodeIps=(), mirrors=None):
+    """
+        Creating setup files on master so that the files can be executed, see renderMasterFiles
+        The files are rendered locally and staged with rwx access rights in one transfer
+        ----------
+        ip : str
+            ip adress of the instance we wish to connect to
+        pool : SSHConnectionPool
+            pool holding the connection to the instance
+        privateipMaster : str
+            private ip adress of the master instance needed for the config.ini
+        dataNodeIps : list[str]
+            private ip adresses of the data nodes needed for the config.ini
+        topology : dict
+            cluster topology, see DEFAULT_TOPOLOGY
+        sqlNodeIps : list[str]
+            private ip adresses of the dedicated SQL nodes
+        mirrors : dict{str, str}
+            upstream url as key and artifact cache url as value, see applyMirrors
+    """
+    files = renderMasterFiles(privateipMaster, dataNodeIps, topology, sqlNodeIps)
+    stageFiles(ip, pool, {name: applyMirrors(content, mirrors) for name, content in files.items()})
+
+def createNodeFile(ip, pool, privateipMaster, multithreaded=False):
+    """
+        Creating a file on each data node that contains all the required commands to start the data nodes
+        The file is staged with rwx access rights in one transfer
+        ----------
+        ip : str
+            ip adress of the instance we wish to connect to
+        pool : SSHConnectionPool
+            pool holding the connection to the instance
+        privateipMaster : str
+            private ip adress of the master instance needed for the connection
+        multithreaded : bool
+            start the multi-threaded ndbmtd instead of ndbd
+    """
+    stageFiles(ip, pool, renderNodeFile(privateipMaster, multithreaded))
+
+def executeFiles(ip, pool, filename):
+    """
+        Function to execute files on the instances to setup the cluster
+        ----------
+        ip : str
+            ip adress of the instance we wish to connect to
+        pool : SSHConnectionPool
+            pool holding the connection to the instance
+        filename : str
+            name of the file which is executed on an instance
+
+        Errors
+        -------
+        CommandError if the file exits with a non zero status, the full output is in LOG_DIR/<ip>.log
+
+        Returns
+        -------
+        CommandResult
+            exit status, last lines of stdout and stderr, duration in seconds
+    """
+    with TRACER.span("executeFiles:" + filename, host=ip):
+        try:
+            pool.connect(ip)
+        except Exception:
+            print("could not connect to client")
+            raise
+
+        command = """/bin/bash """ + filename
+
+        configSetup = pool.run(ip, command)
+        print(ip, filename, "exited with", configSetup.exit_status, "after", round(configSetup.seconds), "s")
+        if configSetup.exit_status != 0:
+            raise CommandError(ip + ": " + filename + " exited with " + str(configSetup.exit_status) + ": " + "\n".join(configSetup.stderr[-10:]))
+        return configSetup
+
+"""
+NDB cluster status
+ndb_mgm -e 'all status' prints one line per data node, for example
+Node 2: started (mysql-5.5.20 ndb-7.2.1)
+Node 3: starting (Last Completed Phase 4) (mysql-5.5.20 ndb-7.2.1)
+Node 4: not connected
+"""
+NDB_NODE_STATUS = re.compile(r"^Node (\d+): ([a-z ]+?)\s*(?:\(|$)", re.M)
+
+def parseNdbStatus(text):
+    """
+        Parses the output of ndb_mgm -e 'all status'
+
+        Returns
+        -------
+        dict{int, str}
+            data node id as key and state ("started", "starting", "not connected", "not started"...) as value
+        """
+    return {int(nodeId): state for nodeId, state in NDB_NODE_STATUS.findall(text)}
+
+def ndbStatus(pool, ip):
+    """
+        Returns the state of every data node, as seen by the management node of the master
+        """
+    result = pool.run(ip, NDB_MGM + " -e 'all status'", timeout=30)
+    return parseNdbStatus("\n".join(result.stdout))
+
+def waitForDataNodes(pool, ip, nbDataNodes, timeout=900):
+    """
+        Polls the management node until nbDataNodes data nodes are started, printing every change of state
+
+        Parameters
+        ----------
+        pool : SSHConnectionPool
+            pool holding the connection to the master
+        ip : str
+            public ip of the master
+        nbDataNodes : int
+            number of data nodes of the cluster
+        timeout : float
+            seconds after which waiting stops
+
+        Returns
+        -------
+        float
+            seconds until every data node was started
+
+        Errors
+        -------
+        NodeNotReadyError if the data nodes are not all started before the deadline
+        """
+    start = time.time()
+    last = {}
+
+    def check():
+        states = ndbStatus(pool, ip)
+        if states != last:
+            print("data nodes:", ", ".join(str(nodeId) + " " + state for nodeId, state in sorted(states.items())))
+            last.clear()
+            last.update(states)
+        started = [nodeId for nodeId, state in states.items() if state == "started"]
+        if len(started) < nbDataNodes:
+            raise NodeNotReadyError(str(len(started)) + "/" + str(nbDataNodes) + " data nodes started")
+        return True
+
+    with TRACER.span("waitForDataNodes", host=ip, nodes=nbDataNodes):
+        pollUntil(check, timeout, "data nodes", initialDelay=1.0, maxDelay=10.0)
+    elapsed = time.time() - start
+    print("all", nbDataNodes, "data nodes started after", round(elapsed), "s")
+    return elapsed
+
+"""
+Sysbench results are parsed into flat records and stored in a local SQLite file
+Each row is keyed by the run id, the target ("standalone" or "cluster") and the benchmark parameters
+"""
+RESULTS_DB = get_project_root() / "results.db"
+# the connection is shared by the threads benchmarking the different targets
+RESULTS_LOCK = threading.Lock()
+
+# metric name, regular expression on the sysbench output, type
+SYSBENCH_METRICS = [
+    ("threads", r"Number of threads:\s*(\d+)", int),
+    ("reads", r"read:\s*(\d+)", int),
+    ("writes", r"write:\s*(\d+)", int),
+    ("other", r"other:\s*(\d+)", int),
+    ("queries_total", r"total:\s*(\d+)", int),
+    ("transactions", r"transactions:\s*(\d+)", int),
+    ("tps", r"transactions:\s*\d+\s*\(([\d.]+) per sec", float),
+    ("queries", r"queries:\s*(\d+)", int),
+    ("qps", r"queries:\s*\d+\s*\(([\d.]+) per sec", float),
+    ("errors", r"ignored errors:\s*(\d+)", int),
+    ("reconnects", r"reconnects:\s*(\d+)", int),
+    ("total_time", r"total time:\s*([\d.]+)s", float),
+    ("events", r"total number of events:\s*(\d+)", int),
+    ("latency_min", r"min:\s*([\d.]+)", float),
+    ("latency_avg", r"avg:\s*([\d.]+)", float),
+    ("latency_max", r"max:\s*([\d.]+)", float),
+    ("latency_p95", r"95th percentile:\s*([\d.]+)", float),
+]
+
+# percentiles computed from the latency histogram printed with --histogram, None without it
+HISTOGRAM_PERCENTILES = [("latency_p50", 50.0), ("latency_p99", 99.0), ("latency_p999", 99.9)]
+
+# columns of sysbench_results
+RESULT_METRICS = [name for name, _, _ in SYSBENCH_METRICS] + [name for name, _ in HISTOGRAM_PERCENTILES]
+
+"""
+Latency histograms
+sysbench counts the latencies in fixed logarithmic buckets and --histogram prints the non empty ones, so two
+histograms of the same sysbench version share their bucket values: a histogram is kept as a sparse
+{bucket value in ms: count} dict and histograms of several clients, repetitions or runs merge by adding the counts
+"""
+# "       0.219 |**********                               4", under "Latency histogram (values are in milliseconds)"
+HISTOGRAM_LINE = re.compile(r"^\s*([\d.]+)\s+\|\**\s*(\d+)\s*$")
+
+def parseHistogram(text):
+    """
+        Parses the latency histogram of a sysbench output
+
+        Returns
+        -------
+        dict{float, int}
+            bucket value in milliseconds as key and count as value, empty if the output has no histogram
+        """
+    histogram = {}
+    start = text.find("Latency histogram")
+    if start < 0:
+        return histogram
+    for line in text[start:].splitlines()[1:]:
+        match = HISTOGRAM_LINE.match(line)
+        if match:
+            value = float(match.group(1))
+            histogram[value] = histogram.get(value, 0) + int(match.group(2))
+        elif histogram and not line.strip():
+            break
+    return histogram
+
+def mergeHistograms(histograms):
+    """
+        Adds up histograms, see parseHistogram
+        """
+    merged = {}
+    for histogram in histograms:
+        for value, count in histogram.items():
+            merged[value] = merged.get(value, 0) + count
+    return merged
+
+def histogramPercentile(histogram, percentile):
+    """
+        Returns the bucket value holding the given percentile of the events, as sysbench computes its 95th percentile,
+        None for an empty histogram
+        """
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = math.ceil(percentile / 100.0 * total)
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value
+    return max(histogram)
+
+def encodeHistogram(histogram):
+    """
+        Encodes a histogram into its compact stored form, a JSON list of [value, count] pairs sorted by value
+        """
+    return json.dumps([[value, histogram[value]] for value in sorted(histogram)], separators=(",", ":"))
+
+def decodeHistogram(text):
+    return {value: count for value, count in json.loads(text)}
+
+def parseSysbenchOutput(text):
+    """
+        Parses the summary printed by a sysbench OLTP run
+        The percentiles of HISTOGRAM_PERCENTILES are computed from the latency histogram when the run printed it
+
+        Parameters
+        ----------
+        text : str
+            output of sysbench ... run
+
+        Returns
+        -------
+        dict{str, number}
+            metric name as key, None for the metrics missing from the output
+
+        Errors
+        -------
+        ValueError if the text is not the output of a sysbench run
+        """
+    if "transactions:" not in text:
+        raise ValueError("not a sysbench run output")
+    metrics = {}
+    for name, pattern, kind in SYSBENCH_METRICS:
+        # the latency figures are taken from the "Latency (ms):" block, not from the threads fairness block
+        section = text[text.find("Latency (ms):"):] if name.startswith("latency_") else text
+        match = re.search(pattern, section)
+        metrics[name] = kind(match.group(1)) if match else None
+    histogram = parseHistogram(text)
+    for name, percentile in HISTOGRAM_PERCENTILES:
+        metrics[name] = histogramPercentile(histogram, percentile)
+    return metrics
+
+def openResultsStore(path=RESULTS_DB):
+    """
+        Opens the results file, creating the tables if needed
+
+        Returns
+        -------
+        sqlite3.Connection
+            connection to the results file
+        """
+    db = sqlite3.connect(str(path), check_same_thread=False)
+    columns = ", ".join(name + " REAL" for name in RESULT_METRICS)
+    db.execute("CREATE TABLE IF NOT EXISTS sysbench_results (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+               "run_id TEXT, target TEXT, params TEXT, collected_at TEXT, " + columns + ")")
+    # files created before a metric was added get its column
+    existing = {row[1] for row in db.execute("PRAGMA table_info(sysbench_results)")}
+    for name in RESULT_METRICS:
+        if name not in existing:
+            db.execute("ALTER TABLE sysbench_results ADD COLUMN " + name + " REAL")
+    db.execute("CREATE TABLE IF NOT EXISTS latency_histograms (run_id TEXT, target TEXT, params TEXT, histogram TEXT)")
+    db.execute("CREATE TABLE IF NOT EXISTS sql_node_results (run_id TEXT, target TEXT, params TEXT, node TEXT, "
+               "qps REAL, tps REAL, share REAL)")
+    db.execute("CREATE TABLE IF NOT EXISTS server_snapshots (run_id TEXT, target TEXT, params TEXT, source TEXT, name TEXT, "
+               "before REAL, after REAL, delta REAL)")
+    db.execute("CREATE TABLE IF NOT EXISTS client_results (run_id TEXT, target TEXT, params TEXT, client TEXT, "
+               "threads INTEGER, tps REAL, latency_p95 REAL, cpu_percent REAL)")
+    db.execute("CREATE TABLE IF NOT EXISTS sakila_results (run_id TEXT, target TEXT, params TEXT, type TEXT, "
+               "transactions INTEGER, errors INTEGER, tps REAL, latency_avg REAL, latency_p95 REAL, latency_p99 REAL, "
+               "histogram TEXT)")
+    db.execute("CREATE TABLE IF NOT EXISTS provision_metrics (run_id TEXT, topology TEXT, metric TEXT, value REAL)")
+    db.execute("CREATE TABLE IF NOT EXISTS run_topologies (run_id TEXT PRIMARY KEY, topology TEXT)")
+    db.execute("CREATE TABLE IF NOT EXISTS load_results (run_id TEXT, target TEXT, params TEXT, rows INTEGER, "
+               "seconds REAL, rows_per_s REAL)")
+    db.commit()
+    return db
+
+def storeResult(db, runId, target, params, metrics):
+    """
+        Stores the metrics of one sysbench run
+
+        Parameters
+        ----------
+        db : sqlite3.Connection
+            connection returned by openResultsStore
+        runId : str
+            id of the run the result belongs to
+        target : str
+            benchmarked target, "standalone" or "cluster"
+        params : dict
+            benchmark parameters (workload, threads, table size...)
+        metrics : dict
+            metrics returned by parseSysbenchOutput
+        """
+    names = RESULT_METRICS
+    with RESULTS_LOCK:
+        db.execute("INSERT INTO sysbench_results (run_id, target, params, collected_at, " + ", ".join(names) + ") "
+                   "VALUES (?, ?, ?, ?, " + ", ".join("?" for _ in names) + ")",
+                   [runId, target, json.dumps(params, sort_keys=True), datetime.now().isoformat(timespec="seconds")]
+                   + [metrics.get(name) for name in names])
+        db.commit()
+
+def storeHistogram(db, runId, target, params, histogram):
+    """
+        Stores the latency histogram of one sysbench run, nothing is stored for an empty histogram
+        """
+    if not histogram:
+        return
+    with RESULTS_LOCK:
+        db.execute("INSERT INTO latency_histograms VALUES (?, ?, ?, ?)",
+                   [runId, target, json.dumps(params, sort_keys=True), encodeHistogram(histogram)])
+        db.commit()
+
+def loadHistograms(db, runId=None, target=None):
+    """
+        Loads stored histograms, optionally filtered by run id and target
+
+        Returns
+        -------
+        list[dict]
+            one dict per histogram with run_id, target, params (decoded) and histogram (decoded)
+        """
+    query = "SELECT run_id, target, params, histogram FROM latency_histograms WHERE 1=1"
+    values = []
+    if runId is not None:
+        query += " AND run_id = ?"
+        values.append(runId)
+    if target is not None:
+        query += " AND target = ?"
+        values.append(target)
+    return [{"run_id": row[0], "target": row[1], "params": json.loads(row[2]), "histogram": decodeHistogram(row[3])}
+            for row in db.execute(query + " ORDER BY rowid", values)]
+
+def storeSqlNodeResults(db, runId, target, params, throughput):
+    """
+        Stores the per SQL node throughput of one run, as returned by sqlNodeThroughput
+        """
+    with RESULTS_LOCK:
+        for node, values in throughput.items():
+            db.execute("INSERT INTO sql_node_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       [runId, target, json.dumps(params, sort_keys=True), node, values["qps"], values["tps"], values["share"]])
+        db.commit()
+
+def storeSnapshots(db, runId, target, params, rows):
+    """
+        Stores the server side snapshots of one run, as returned by snapshotDeltas
+        """
+    with RESULTS_LOCK:
+        db.executemany("INSERT INTO server_snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       [[runId, target, json.dumps(params, sort_keys=True)] + list(row) for row in rows])
+        db.commit()
+
+def storeClientResults(db, runId, target, params, clients):
+    """
+        Stores the share of each client instance in one run, as returned by runClients
+        """
+    with RESULTS_LOCK:
+        for client, values in clients.items():
+            db.execute("INSERT INTO client_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       [runId, target, json.dumps(params, sort_keys=True), client, values["threads"], values["tps"],
+                        values["latency_p95"], values["cpu_percent"]])
+        db.commit()
+
+def storeSakilaResults(db, runId, target, params, metrics):
+    """
+        Stores the metrics of every transaction type of one Sakila run, as returned by sakilaMetrics
+        """
+    with RESULTS_LOCK:
+        for name, values in metrics.items():
+            db.execute("INSERT INTO sakila_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       [runId, target, json.dumps(params, sort_keys=True), name, values["transactions"], values["errors"],
+                        values["tps"], values["latency_avg"], values["latency_p95"], values["latency_p99"],
+                        encodeHistogram(values["histogram"])])
+        db.commit()
+
+def storeLoadResult(db, runId, target, params, rows, seconds):
+    """
+        Stores the duration of one data load, see loadDataset
+        """
+    with RESULTS_LOCK:
+        db.execute("INSERT INTO load_results VALUES (?, ?, ?, ?, ?, ?)",
+                   [runId, target, json.dumps(params, sort_keys=True), rows, seconds, rows / seconds])
+        db.commit()
+
+def storeRunTopology(db, runId, topology):
+    """
+        Records the topology (instance types included) the results of a run were measured on
+        """
+    with RESULTS_LOCK:
+        db.execute("INSERT OR REPLACE INTO run_topologies VALUES (?, ?)", [runId, json.dumps(topology, sort_keys=True)])
+        db.commit()
+
+def loadRunTopologies(db, runIds=None):
+    """
+        Returns the recorded topologies, run id as key, optionally only the ones of the given runs
+        """
+    topologies = {runId: json.loads(topology) for runId, topology in db.execute("SELECT run_id, topology FROM run_topologies")}
+    return {runId: topology for runId, topology in topologies.items() if runIds is None or runId in runIds}
+
+def storeProvisionMetrics(db, runId, topology, metrics):
+    """
+        Stores the durations measured while provisioning, metric name as key and seconds as value
+        """
+    with RESULTS_LOCK:
+        for metric, value in metrics.items():
+            db.execute("INSERT INTO provision_metrics VALUES (?, ?, ?, ?)", [runId, json.dumps(topology, sort_keys=True), metric, value])
+        db.commit()
+
+def loadResults(db, runId=None, target=None):
+    """
+        Loads stored results, optionally filtered by run id and target
+
+        Returns
+        -------
+        list[dict]
+            one dict per result with run_id, target, params (decoded) and the metrics
+        """
+    query = "SELECT * FROM sysbench_results WHERE 1=1"
+    values = []
+    if runId is not None:
+        query += " AND run_id = ?"
+        values.append(runId)
+    if target is not None:
+        query += " AND target = ?"
+        values.append(target)
+    cursor = db.execute(query + " ORDER BY id", values)
+    names = [column[0] for column in cursor.description]
+    records = []
+    for row in cursor.fetchall():
+        record = dict(zip(names, row))
+        record["params"] = json.loads(record["params"])
+        records.append(record)
+    return records
+
+def newRunId():
+    return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+def collectResults(pool, db, runId, sources, params):
+    """
+        Fetches the sysbench results files from the instances, parses and stores them
+
+        Parameters
+        ----------
+        pool : SSHConnectionPool
+            pool holding the connections to the instances
+        db : sqlite3.Connection
+            connection returned by openResultsStore
+        runId : str
+            id of the run the results belong to
+        sources : dict{str, tuple(str, str)}
+            target as key and (ip, remote path of the results file) as value
+        params : dict
+            benchmark parameters stored with the results
+
+        Returns
+        -------
+        dict{str, dict}
+            target as key and parsed metrics as value
+        """
+    collected = {}
+    for target, (ip, remotePath) in sources.items():
+        try:
+            text = pool.read(ip, remotePath)
+            metrics = parseSysbenchOutput(text)
+        except Exception as error:
+            print("could not collect", target, "results from", ip + ":", repr(error))
+            continue
+        storeResult(db, runId, target, params, metrics)
+        storeHistogram(db, runId, target, params, parseHistogram(text))
+        collected[target] = metrics
+    return collected
+
+def printComparison(collected):
+    """
+        Prints the metrics of several targets side by side
+
+        Parameters
+        ----------
+        collected : dict{str, dict}
+            target as key and metrics as value
+        """
+    targets = list(collected)
+    print("%-16s" % "metric" + "".join("%16s" % target for target in targets))
+    for name in RESULT_METRICS:
+        values = [collected[target].get(name) for target in targets]
+        print("%-16s" % name + "".join("%16s" % ("-" if value is None else value) for value in values))
+
+"""
+Statistics over the stored repetitions
+The repetitions of a combination are summarised by their mean, sample standard deviation and Student t
+confidence interval; two sets of results are compared combination by combination with Welch's t-test
+"""
+# metrics compared by default, with True when a higher value is better
+COMPARED_METRICS = {"tps": True, "qps": True, "latency_avg": False, "latency_p50": False, "latency_p95": False,
+                    "latency_p99": False, "latency_p999": False, "latency_max": False}
+
+# parameters that tell the repetitions of a combination apart, ignored when grouping
+REPETITION_PARAMS = ("repetition", "timeseries")
+
+def continuedFraction(a, b, x):
+    """
+        Continued fraction of the incomplete beta function, evaluated with the modified Lentz method
+        """
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+    return result
+
+def regularizedBeta(x, a, b):
+    """
+        Regularized incomplete beta function I_x(a, b)
+        """
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x))
+    # the continued fraction converges quickly on this side of the mean, the symmetry relation covers the other
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * continuedFraction(a, b, x) / a
+    return 1.0 - front * continuedFraction(b, a, 1.0 - x) / b
+
+def studentTPValue(t, df):
+    """
+        Two sided p value of a Student t statistic with df degrees of freedom
+        """
+    return regularizedBeta(df / (df + t * t), df / 2.0, 0.5)
+
+def studentTQuantile(confidence, df):
+    """
+        Returns t such that a Student t variable with df degrees of freedom lies in [-t, t] with the given probability
+        """
+    low, high = 0.0, 1e6
+    for _ in range(200):
+        middle = (low + high) / 2.0
+        if studentTPValue(middle, df) > 1.0 - confidence:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2.0
+
+def summarize(values, confidence=0.95):
+    """
+        Summarises the repetitions of one metric
+
+        Parameters
+        ----------
+        values : list[float]
+            measured values, None values are ignored
+        confidence : float
+            level of the confidence interval of the mean
+
+        Returns
+        -------
+        dict
+            n, mean, stddev, ci (half width of the confidence interval, None with a single value),
+            None if there are no values
+        """
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return {"n": n, "mean": mean, "stddev": None, "ci": None}
+    stddev = math.sqrt(sum((value - mean) ** 2 for value in values) / (n - 1))
+    return {"n": n, "mean": mean, "stddev": stddev, "ci": studentTQuantile(confidence, n - 1) * stddev / math.sqrt(n)}
+
+def welchTest(baseline, candidate):
+    """
+        Welch's t-test of the difference of the means of two samples with possibly different variances
+
+        Parameters
+        ----------
+        baseline, candidate : dict
+            summaries returned by summarize
+
+        Returns
+        -------
+        tuple(float, float, float)
+            t statistic, degrees of freedom and two sided p value, None when a sample has less than two values
+        """
+    if not baseline or not candidate or baseline["n"] < 2 or candidate["n"] < 2:
+        return None
+    varianceA = baseline["stddev"] ** 2 / baseline["n"]
+    varianceB = candidate["stddev"] ** 2 / candidate["n"]
+    difference = candidate["mean"] - baseline["mean"]
+    if varianceA + varianceB == 0:
+        return (0.0, float("inf"), 1.0) if difference == 0 else (math.copysign(float("inf"), difference), float("inf"), 0.0)
+    t = difference / math.sqrt(varianceA + varianceB)
+    df = (varianceA + varianceB) ** 2 / (varianceA ** 2 / (baseline["n"] - 1) + varianceB ** 2 / (candidate["n"] - 1))
+    return t, df, studentTPValue(t, df)
+
+def combinationKey(params):
+    """
+        Returns the parameters of a result without the ones telling its repetitions apart, as a sortable string
+        """
+    return json.dumps({key: value for key, value in params.items() if key not in REPETITION_PARAMS}, sort_keys=True)
+
+def groupRepetitions(records):
+    """
+        Groups results by combination
+
+        Parameters
+        ----------
+        records : list[dict]
+            results as returned by loadResults
+
+        Returns
+        -------
+        dict{str, list[dict]}
+            combination key (see combinationKey) as key and its results as value
+        """
+    groups = {}
+    for record in records:
+        groups.setdefault(combinationKey(record["params"]), []).append(record)
+    return groups
+
+def compareResults(baseline, candidate, metrics=COMPARED_METRICS, confidence=0.95, alpha=0.05):
+    """
+        Compares two sets of results combination by combination
+
+        Parameters
+        ----------
+        baseline, candidate : list[dict]
+            results as returned by loadResults, for example the stand-alone and the cluster of a run,
+            or the cluster of two runs with a different topology
+        metrics : dict{str, bool}
+            metrics to compare, with True when a higher value is better
+        confidence : float
+            level of the confidence intervals
+        alpha : float
+            significance level of the Welch t-test
+
+        Returns
+        -------
+        list[dict]
+            one row per combination present in both sets and metric: params, metric, baseline and candidate summaries,
+            change (relative difference of the means), p value and verdict ("regression", "improvement" or "same")
+        """
+    baselineGroups = groupRepetitions(baseline)
+    candidateGroups = groupRepetitions(candidate)
+    rows = []
+    for key in sorted(set(baselineGroups) & set(candidateGroups)):
+        for metric, higherIsBetter in metrics.items():
+            before = summarize([record.get(metric) for record in baselineGroups[key]], confidence)
+            after = summarize([record.get(metric) for record in candidateGroups[key]], confidence)
+            if before is None or after is None:
+                continue
+            test = welchTest(before, after)
+            change = (after["mean"] - before["mean"]) / before["mean"] if before["mean"] else None
+            verdict = "same"
+            if test is not None and test[2] < alpha:
+                verdict = "improvement" if (after["mean"] > before["mean"]) == higherIsBetter else "regression"
+            rows.append({"params": json.loads(key), "metric": metric, "baseline": before, "candidate": after,
+                         "change": change, "p": test[2] if test else None, "verdict": verdict})
+    return rows
+
+def printStatistics(rows):
+    """
+        Prints the rows returned by compareResults, one line per combination and metric
+        """
+    def interval(summary):
+        if summary["ci"] is None:
+            return "%.2f" % summary["mean"]
+        return "%.2f ± %.2f" % (summary["mean"], summary["ci"])
+
+    print("%-34s %-12s %20s %20s %8s %8s  %s" % ("combination", "metric", "baseline", "candidate", "change", "p", "verdict"))
+    for row in rows:
+        params = row["params"]
+        combination = "%s %dthr %dx%d" % (params.get("workload", "?"), params.get("threads", 0), params.get("tables", 0), params.get("table_size", 0))
+        print("%-34s %-12s %20s %20s %8s %8s  %s" % (
+            combination[:34], row["metric"], interval(row["baseline"]), interval(row["candidate"]),
+            "-" if row["change"] is None else "%+.1f%%" % (100 * row["change"]),
+            "-" if row["p"] is None else "%.3f" % row["p"],
+            row["verdict"].upper() if row["verdict"] == "regression" else row["verdict"]))
+
+"""
+Price/performance of the benchmarked configurations
+The hourly cost of a target is the sum of the on-demand prices of its instances, read from a local pricing table
+(the client instances are left out, they are not part of the database); the report works on the stored results only
+"""
+PRICING_FILE = get_project_root() / "pricing.json"
+
+def loadPricing(path=PRICING_FILE):
+    """
+        Reads the pricing table, a JSON file with the hourly price of each instance type under "hourly"
+
+        Returns
+        -------
+        dict{str, float}
+            instance type as key and price per hour as value
+        """
+    return json.loads(Path(path).read_text())["hourly"]
+
+def targetInstances(topology, target):
+    """
+        Lists the instance types making up a target of a topology
+
+        Returns
+        -------
+        dict{str, tuple(int, str)}
+            role kind as key and (count, instance type) as value
+        """
+    topology = dict(DEFAULT_TOPOLOGY, **topology)
+    if target == "standalone":
+        kinds = {"standalone": 1}
+    else:
+        kinds = {"master": 1, "node": topology["dataNodes"], "sql": topology["sqlNodes"]}
+    return {kind: (count, roleInstanceType(topology, kind)) for kind, count in kinds.items() if count}
+
+def hourlyCost(topology, target, pricing):
+    """
+        Returns the price per hour of the instances of a target
+
+        Errors
+        -------
+        ValueError if an instance type is missing from the pricing table
+        """
+    cost = 0.0
+    for kind, (count, instanceType) in targetInstances(topology, target).items():
+        if instanceType not in pricing:
+            raise ValueError("no price for " + instanceType + " in the pricing table")
+        cost += count * pricing[instanceType]
+    return cost
+
+def shapeLabel(topology, target):
+    """
+        Describes the instances of a target, for example "master t2.micro + 4 node m5.large"
+        """
+    return " + ".join((str(count) + " " if count > 1 else "") + kind + " " + instanceType
+                      for kind, (count, instanceType) in targetInstances(topology, target).items())
+
+def priceReport(db, pricing, runIds=None):
+    """
+        Computes the price/performance of every stored configuration and combination
+        The repetitions are averaged, the configurations are the targets of the runs with a recorded topology
+
+        Parameters
+        ----------
+        db : sqlite3.Connection
+            connection returned by openResultsStore
+        pricing : dict{str, float}
+            pricing table, see loadPricing
+        runIds : list[str]
+            runs to report on, None for every run with a recorded topology
+
+        Returns
+        -------
+        list[dict]
+            one row per run, target and combination: run_id, target, shape, params, tps, latency_p95, cost_per_hour,
+            tps_per_dollar_hour, and beats_standalone (cluster rows only: above the best stand-alone tps of the combination)
+        """
+    rows = []
+    for runId, topology in sorted(loadRunTopologies(db, runIds).items()):
+        records = loadResults(db, runId)
+        for target in sorted({record["target"] for record in records}):
+            cost = hourlyCost(topology, target, pricing)
+            for key, group in sorted(groupRepetitions([record for record in records if record["target"] == target]).items()):
+                tps = summarize([record["tps"] for record in group])
+                p95 = summarize([record["latency_p95"] for record in group])
+                rows.append({"run_id": runId, "target": target, "shape": shapeLabel(topology, target), "params": json.loads(key),
+                             "tps": tps and tps["mean"], "latency_p95": p95 and p95["mean"], "cost_per_hour": cost,
+                             "tps_per_dollar_hour": tps["mean"] / cost if tps and cost else None})
+
+    best = {}
+    for row in rows:
+        if row["target"] == "standalone" and row["tps"] is not None:
+            key = combinationKey(row["params"])
+            best[key] = max(best.get(key, 0.0), row["tps"])
+    for row in rows:
+        if row["target"] != "standalone":
+            reference = best.get(combinationKey(row["params"]))
+            row["beats_standalone"] = None if reference is None or row["tps"] is None else row["tps"] > reference
+    return rows
+
+def printPriceReport(rows):
+    """
+        Prints the rows returned by priceReport, then the cheapest cluster beating the stand-alone for each combination
+        """
+    print("%-16s %-10s %-44s %-26s %10s %9s %8s %10s" % ("run", "target", "shape", "combination", "tps", "p95 ms", "$/h", "tps/($/h)"))
+    cheapest = {}
+    for row in rows:
+        params = row["params"]
+        combination = "%s %dthr %dx%d" % (params.get("workload", "?"), params.get("threads", 0), params.get("tables", 0), params.get("table_size", 0))
+        print("%-16s %-10s %-44s %-26s %10s %9s %8.4f %10s" % (
+            row["run_id"][:16], row["target"][:10], row["shape"][:44], combination[:26],
+            "-" if row["tps"] is None else "%.1f" % row["tps"], "-" if row["latency_p95"] is None else "%.2f" % row["latency_p95"],
+            row["cost_per_hour"], "-" if row["tps_per_dollar_hour"] is None else "%.0f" % row["tps_per_dollar_hour"]))
+        if row.get("beats_standalone") and (combination not in cheapest or row["cost_per_hour"] < cheapest[combination]["cost_per_hour"]):
+            cheapest[combination] = row
+    print("-------------------Cheapest cluster beating the stand-alone-------------------")
+    for combination, row in sorted(cheapest.items()):
+        print("%-26s %s ($%.4f/h, %.1f tps, run %s)" % (combination, row["shape"], row["cost_per_hour"], row["tps"], row["run_id"]))
+    if not cheapest:
+        print("no cluster configuration beats the stand-alone")
+
+"""
+Benchmark sweeps
+Every combination of the matrix is run against each target, the targets being benchmarked concurrently
+"""
+SWEEP_WORKLOADS = ["oltp_read_only", "oltp_write_only", "oltp_point_select", "oltp_read_write"]
+
+def getTargets(standaloneIp, masterIp, dataNodeIps=(), sqlNodes=None, clients=None, privateIps=None):
+    """
+        Describes the benchmark targets
+        sysbench runs on the target instance itself, the cluster tables are created with the ndbcluster engine,
+        otherwise they would be InnoDB tables local to the SQL node
+        With dedicated SQL nodes, sysbench on the master spreads its connections over all of them
+        (sysbench opens the connections round-robin over a comma separated --mysql-host list)
+        With client instances, the measured runs are started on all of them instead, connecting to the private ip
+        of the target, the tables are still prepared on the target itself
+
+        Parameters
+        ----------
+        standaloneIp : str
+            public ip of the stand-alone instance
+        masterIp : str
+            public ip of the master instance
+        dataNodeIps : list[str]
+            public ips of the data nodes, sampled with the master when capturing time series
+        sqlNodes : dict{str, tuple(str, str)}
+            role of the dedicated SQL nodes as key and (public ip, private ip) as value
+        clients : dict{str, str}
+            role of the client instances as key and public ip as value
+        privateIps : dict{str, str}
+            private ip of "standalone" and "master", used by the clients, the public ip when missing
+
+        Returns
+        -------
+        dict{str, dict}
+            target as key, and as value the ip sysbench runs on, the mysql host(s) it connects to, the storage engine,
+            the nodes (role to ip) making up the target, the SQL nodes (role to ip) to report on,
+            the clients (role to ip) and the mysql host(s) they connect to,
+            the mysql client of the instance and the sources of its snapshots (see SNAPSHOT_QUERIES)
+        """
+    privateIps = privateIps or {}
+    clusterNodes = {"master": masterIp}
+    for i, ip in enumerate(dataNodeIps):
+        clusterNodes["node" + str(i + 1)] = ip
+    cluster = {"ip": masterIp, "mysqlHost": "127.0.0.1", "engine": "ndbcluster", "nodes": clusterNodes, "sqlNodes": {},
+               "clients": dict(clients or {}), "remoteHost": privateIps.get("master") or masterIp,
+               "mysqlClient": MYSQL_CLIENT, "snapshots": ["status", "ndb.counters", "ndb.memoryusage", "ndb.transporters"]}
+    if sqlNodes:
+        cluster["mysqlHost"] = ",".join(privateip for ip, privateip in sqlNodes.values())
+        cluster["remoteHost"] = cluster["mysqlHost"]
+        for role, (ip, privateip) in sqlNodes.items():
+            clusterNodes[role] = ip
+            cluster["sqlNodes"][role] = ip
+    return {
+        "standalone": {"ip": standaloneIp, "mysqlHost": "127.0.0.1", "engine": None, "nodes": {"standalone": standaloneIp}, "sqlNodes": {},
+                       "clients": dict(clients or {}), "remoteHost": privateIps.get("standalone") or standaloneIp,
+                       "mysqlClient": "mysql", "snapshots": ["status", "innodb"]},
+        "cluster": cluster,
+    }
+
+# status counters read on each SQL node around a run
+SQL_NODE_COUNTERS = ["Questions", "Com_commit", "Com_select", "Com_insert", "Com_update", "Com_delete"]
+
+def sqlNodeCounters(pool, ip):
+    """
+        Reads the query counters of the mysqld running on a SQL node
+
+        Returns
+        -------
+        dict{str, int}
+            counter name as key and value as value
+        """
+    query = "SHOW GLOBAL STATUS WHERE Variable_name IN (" + ", ".join("'" + name + "'" for name in SQL_NODE_COUNTERS) + ")"
+    result = pool.run(ip, MYSQL_CLIENT + " -uroot -h127.0.0.1 -N -B -e \"" + query + "\"", 60)
+    if result.exit_status != 0:
+        raise CommandError(ip + ": could not read the status counters: " + "\n".join(result.stderr[-5:]))
+    counters = {}
+    for line in result.stdout:
+        fields = line.split()
+        if len(fields) == 2:
+            counters[fields[0]] = int(fields[1])
+    return counters
+
+def sqlNodeThroughput(before, after, seconds):
+    """
+        Computes the throughput of each SQL node from two counter snapshots
+
+        Parameters
+        ----------
+        before : dict{str, dict}
+            role as key and counters before the run as value
+        after : dict{str, dict}
+            role as key and counters after the run as value
+        seconds : float
+            duration of the run
+
+        Returns
+        -------
+        dict{str, dict}
+            role as key, and as value the qps, the tps (commits per second) and the share of the queries
+        """
+    queries = {role: after[role]["Questions"] - before[role]["Questions"] for role in after}
+    total = sum(queries.values()) or 1
+    throughput = {}
+    for role in after:
+        throughput[role] = {
+            "qps": queries[role] / seconds,
+            "tps": (after[role]["Com_commit"] - before[role]["Com_commit"]) / seconds,
+            "share": queries[role] / total,
+        }
+    return throughput
+
+"""
+Server side snapshots taken on the mysqld of the target around every measured run
+Each source is a query whose rows become named numbers; the values before and after the run and their difference
+are stored next to the sysbench results: the counters give the work done (per data node for ndbinfo.counters),
+the gauges (ndbinfo.memoryusage) the memory pressure at the end of the run
+With dedicated SQL nodes sysbench only connects to them, so "status" is read on every SQL node and added up,
+the ndbinfo sources are the same from any mysqld of the cluster and are still read on the master
+"""
+# source: (query, key columns), every other numeric column of a row is a value
+# the ndbinfo columns differ between MySQL Cluster versions, so the whole rows are read
+SNAPSHOT_QUERIES = {
+    "status": ("SHOW GLOBAL STATUS", ["Variable_name"]),
+    "innodb": ("SELECT NAME, COUNT FROM information_schema.INNODB_METRICS WHERE STATUS = 'enabled'", ["NAME"]),
+    "ndb.counters": ("SELECT node_id, counter_name, SUM(val) AS val FROM ndbinfo.counters GROUP BY node_id, counter_name",
+                     ["node_id", "counter_name"]),
+    "ndb.memoryusage": ("SELECT * FROM ndbinfo.memoryusage", ["node_id", "memory_type"]),
+    "ndb.transporters": ("SELECT * FROM ndbinfo.transporters", ["node_id", "remote_node_id"]),
+}
+
+def snapshotCommand(target, sources=None, client=None):
+    """
+        Returns the shell command printing the result of every snapshot query of a target, each after a "### source" line
+        A failing query prints "### failed" instead of rows
+
+        Parameters
+        ----------
+        target : dict
+            target as returned by getTargets
+        sources : list[str]
+            sources to read, target["snapshots"] by default
+        client : str
+            mysql client command line, the mysql client of the target with the benchmark credentials by default
+        """
+    client = client or " ".join([target.get("mysqlClient", MYSQL_CLIENT), "-B", "-h127.0.0.1", shlex.quote("-u" + MYSQL_USER),
+                                 shlex.quote("-p" + MYSQL_PASSWORD)])
+    commands = []
+    for source in target.get("snapshots", []) if sources is None else sources:
+        query, _ = SNAPSHOT_QUERIES[source]
+        commands.append("echo '### " + source + "'; " + client + " -e " + shlex.quote(query) + " 2>/dev/null || echo '### failed'")
+    return "; ".join(commands)
+
+def parseSnapshot(lines):
+    """
+        Parses the output of snapshotCommand
+
+        Parameters
+        ----------
+        lines : list[str]
+            stdout lines, tab separated rows preceded by their header
+
+        Returns
+        -------
+        dict{str, dict{str, float}}
+            source as key, and as value the name (key columns, and the value column when a row has several, joined by "/")
+            and value of every number; the failed sources are missing
+        """
+    blocks = {}
+    source = None
+    for line in lines:
+        if line.startswith("### "):
+            if line == "### failed":
+                blocks.pop(source, None)
+                source = None
+            else:
+                source = line[4:]
+                blocks[source] = []
+        elif source is not None:
+            blocks[source].append(line.split("\t"))
+
+    snapshot = {}
+    for source, rows in blocks.items():
+        if not rows:
+            continue
+        header, keyColumns = rows[0], SNAPSHOT_QUERIES[source][1]
+        keys = [header.index(column) for column in keyColumns if column in header]
+        values = {}
+        for row in rows[1:]:
+            numbers = {}
+            for i, field in enumerate(row):
+                if i in keys or i >= len(header):
+                    continue
+                try:
+                    numbers[header[i]] = float(field)
+                except ValueError:
+                    pass
+            prefix = "/".join(row[i] for i in keys)
+            for column, value in numbers.items():
+                values[prefix if len(numbers) == 1 else prefix + "/" + column] = value
+        snapshot[source] = values
+    return snapshot
+
+def takeSnapshot(pool, target):
+    """
+        Reads the snapshot sources of a target in one round trip per host, see parseSnapshot
+        With dedicated SQL nodes, "status" is read on each of them and their values are added up
+        """
+    sqlNodes = target.get("sqlNodes") or {}
+    sources = target.get("snapshots", [])
+    if not sqlNodes or "status" not in sources:
+        with TRACER.span("snapshot", host=target["ip"]):
+            result = pool.run(target["ip"], snapshotCommand(target), 60)
+        snapshot = parseSnapshot(result.stdout)
+    else:
+        # the SQL nodes only have the passwordless root@127.0.0.1 of mysql_install_db, see sqlNodeCounters
+        client = MYSQL_CLIENT + " -B -uroot -h127.0.0.1"
+        commands = {target["ip"]: snapshotCommand(target, [source for source in sources if source != "status"])}
+        for ip in sqlNodes.values():
+            commands[ip] = snapshotCommand(target, ["status"], client)
+        parent = TRACER.current()
+
+        def read(ip):
+            with TRACER.span("snapshot", parent, host=ip):
+                return parseSnapshot(pool.run(ip, commands[ip], 60).stdout)
+
+        with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+            snapshots = dict(zip(commands, executor.map(read, commands)))
+        snapshot = snapshots.pop(target["ip"])
+        statuses = [values["status"] for values in snapshots.values() if "status" in values]
+        if len(statuses) == len(sqlNodes):
+            snapshot["status"] = {}
+            for values in statuses:
+                for name, value in values.items():
+                    snapshot["status"][name] = snapshot["status"].get(name, 0.0) + value
+    missing = [source for source in target.get("snapshots", []) if source not in snapshot]
+    if missing:
+        print(target["ip"] + ": could not read", ", ".join(missing))
+    return snapshot
+
+def snapshotDeltas(before, after):
+    """
+        Pairs two snapshots of the same target
+
+        Returns
+        -------
+        list[tuple(str, str, float, float, float)]
+            (source, name, value before, value after, difference) for every name present after the run,
+            before and difference are None for a name that only appeared during the run
+        """
+    rows = []
+    for source, values in after.items():
+        previous = before.get(source, {})
+        for name, value in sorted(values.items()):
+            old = previous.get(name)
+            rows.append((source, name, old, value, None if old is None else value - old))
+    return rows
+
+def snapshotSummary(rows, metrics):
+    """
+        Derives the figures explaining a run from its snapshot deltas
+
+        Parameters
+        ----------
+        rows : list[tuple]
+            rows returned by snapshotDeltas
+        metrics : dict
+            sysbench metrics of the run
+
+        Returns
+        -------
+        dict
+            operations (data node id to operations), skew (busiest over least busy data node),
+            round_trips_per_trx (NDB API waits per transaction), data_memory_percent (fullest data node),
+            buffer_pool_reads_per_trx (InnoDB reads missing the buffer pool per transaction), missing figures are left out
+        """
+    delta = {(source, name): change for source, name, _, _, change in rows}
+    after = {(source, name): value for source, name, _, value, _ in rows}
+    transactions = metrics.get("transactions") or 0
+    summary = {}
+
+    operations = {name.split("/")[0]: change for (source, name), change in delta.items()
+                  if source == "ndb.counters" and name.endswith("/OPERATIONS") and change is not None}
+    if operations:
+        summary["operations"] = operations
+        if min(operations.values()) > 0:
+            summary["skew"] = max(operations.values()) / min(operations.values())
+    waits = delta.get(("status", "Ndb_api_wait_exec_complete_count"))
+    if waits is not None and transactions:
+        summary["round_trips_per_trx"] = waits / transactions
+    used = {name[:-len("/used")]: value for (source, name), value in after.items()
+            if source == "ndb.memoryusage" and name.endswith("/Data memory/used")}
+    percents = [100.0 * value / after[("ndb.memoryusage", node + "/total")] for node, value in used.items()
+                if after.get(("ndb.memoryusage", node + "/total"))]
+    if percents:
+        summary["data_memory_percent"] = max(percents)
+    reads = delta.get(("status", "Innodb_buffer_pool_reads"))
+    if reads is not None and transactions:
+        summary["buffer_pool_reads_per_trx"] = reads / transactions
+    return summary
+
+def sysbenchCommand(workload, action, target, threads=1, tables=1, tableSize=1000000, duration=None, extra=()):
+    """
+        Builds a sysbench command line
+
+        Parameters
+        ----------
+        workload : str
+            sysbench test, for example oltp_read_write, or SAKILA_WORKLOAD for sakila.lua
+        action : str
+            prepare, run or cleanup
+        target : dict
+            target as returned by getTargets
+        threads : int
+            number of client threads
+        tables : int
+            number of sbtest tables
+        tableSize : int
+            number of rows per table
+        duration : int
+            seconds the run lasts, None to use the sysbench default
+        extra : list[str]
+            additional sysbench options
+
+        Returns
+        -------
+        str
+            the command
+        """
+    options = ["--mysql-host=" + target["mysqlHost"], "--mysql-db=" + MYSQL_DB, "--mysql-user=" + MYSQL_USER,
+               "--mysql-password=" + MYSQL_PASSWORD, "--threads=" + str(threads), "--tables=" + str(tables),
+               "--table-size=" + str(tableSize)]
+    if target.get("engine"):
+        options.append("--mysql-storage-engine=" + target["engine"])
+    if duration is not None:
+        options += ["--time=" + str(duration), "--events=0"]
+    if workload == SAKILA_WORKLOAD:
+        workload = "./" + SAKILA_SCRIPT
+    return " ".join(["sysbench", workload] + [shlex.quote(option) for option in options + list(extra)] + [action])
+
+def expandMatrix(matrix):
+    """
+        Lists the combinations of a sweep matrix
+        The dataset (tables, table size) varies slowest so that it is prepared once for all the runs using it
+        The Sakila workload does not use the sbtest tables, its combinations come first, with 0 tables and rows
+
+        Parameters
+        ----------
+        matrix : dict{str, list}
+            lists of values for "workloads", "threads", "tables", "table_sizes" and "durations",
+            with "rows" (an int) the table size is rows / tables instead, the same dataset split over the tables,
+            "mix" (a str) is the transaction mix of the Sakila workload, SAKILA_MIX by default
+
+        Returns
+        -------
+        list[dict]
+            one dict of parameters per combination
+        """
+    datasets = [(tables, tableSize) for tables in matrix["tables"]
+                for tableSize in ([matrix["rows"] // tables] if matrix.get("rows") else matrix["table_sizes"])]
+    combinations = []
+    if SAKILA_WORKLOAD in matrix["workloads"]:
+        for threads, duration in itertools.product(matrix["threads"], matrix["durations"]):
+            combinations.append({"workload": SAKILA_WORKLOAD, "threads": threads, "tables": 0, "table_size": 0,
+                                 "duration": duration, "mix": matrix.get("mix") or SAKILA_MIX})
+    workloads = [workload for workload in matrix["workloads"] if workload != SAKILA_WORKLOAD]
+    for (tables, tableSize), workload, threads, duration in itertools.product(
+            datasets, workloads, matrix["threads"], matrix["durations"]):
+        combinations.append({"workload": workload, "threads": threads, "tables": tables,
+                             "table_size": tableSize, "duration": duration})
+    return combinations
+
+def runSysbench(pool, target, action, params, extra=(), timeout=None):
+    """
+        Runs sysbench on a target and returns the CommandResult
+        The result holds the whole stdout, the latency histogram can be longer than the tail kept by runCommand
+
+        Errors
+        -------
+        CommandError if sysbench exits with a non zero status
+        """
+    command = sysbenchCommand(params["workload"], action, target, params["threads"], params["tables"],
+                              params["table_size"], params.get("duration") if action == "run" else None,
+                              workloadOptions(params) + list(extra))
+    lines = []
+    with TRACER.span("sysbench:" + action, host=target["ip"], workload=params["workload"], threads=params["threads"]):
+        result = pool.run(target["ip"], command, timeout, lambda stream, line: lines.append(line) if stream == "stdout" else None)
+    if result.exit_status != 0:
+        raise CommandError(target["ip"] + ": " + command + " exited with " + str(result.exit_status) + ": " + "\n".join(result.stderr[-10:]))
+    return result._replace(stdout=lines)
+
+"""
+Runs spread over client instances
+Every client runs its share of the threads against the target, all of them starting at the same epoch,
+and reports the CPU it used from /proc/stat so that a saturated load generator can be told apart
+"""
+# client CPU use above which the run is reported as possibly limited by the load generator
+CLIENT_CPU_LIMIT = 90.0
+# seconds between sending the commands and the common start, covers the SSH round trips
+CLIENT_START_DELAY = 5.0
+
+# metrics added up over the clients, the other ones are combined in mergeSysbenchMetrics
+SUMMED_METRICS = ["threads", "reads", "writes", "other", "queries_total", "transactions", "tps", "queries", "qps",
+                  "errors", "reconnects", "events"]
+
+def splitThreads(threads, count):
+    """
+        Splits a thread count over count clients, the first clients get one thread more when it does not divide
+        """
+    return [threads // count + (1 if i < threads % count else 0) for i in range(count)]
+
+def clientCommand(command, startAt):
+    """
+        Wraps a sysbench command so that it starts at the epoch startAt, between two reads of the CPU counters
+        """
+    return ("while [ $(date +%s%N) -lt " + str(int(startAt * 1e9)) + " ]; do sleep 0.01; done; "
+            "echo CPU_BEFORE $(head -1 /proc/stat); " + command + "; status=$?; "
+            "echo CPU_AFTER $(head -1 /proc/stat); exit $status")
+
+def clientCpuPercent(lines):
+    """
+        Returns the CPU use of a client during the run from the counters printed by clientCommand, None if missing
+        """
+    counters = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) >= 10 and fields[0] in ("CPU_BEFORE", "CPU_AFTER"):
+            # user nice system idle iowait irq softirq steal
+            counters[fields[0]] = [int(field) for field in fields[2:10]]
+    if len(counters) != 2:
+        return None
+    deltas = [after - before for after, before in zip(counters["CPU_AFTER"], counters["CPU_BEFORE"])]
+    total = sum(deltas) or 1
+    return 100.0 * (total - deltas[3] - deltas[4]) / total
+
+def mergeSysbenchMetrics(results, histogram=None):
+    """
+        Merges the metrics of sysbench runs made at the same time against the same target
+        Counts and rates are added up, the duration and the maximum latency are the largest ones,
+        the average latency is weighted by the events; the percentiles can not be merged from the
+        summaries, they are computed from the merged histogram, without it the largest one is kept as an upper bound
+
+        Parameters
+        ----------
+        results : list[dict]
+            metrics returned by parseSysbenchOutput
+        histogram : dict{float, int}
+            merged latency histogram of the runs, see mergeHistograms
+
+        Returns
+        -------
+        dict{str, number}
+            merged metrics, with the same names
+        """
+    merged = {}
+    for name in RESULT_METRICS:
+        values = [metrics[name] for metrics in results if metrics.get(name) is not None]
+        if not values:
+            merged[name] = None
+        elif name in SUMMED_METRICS:
+            merged[name] = sum(values)
+        elif name == "latency_min":
+            merged[name] = min(values)
+        elif name == "latency_avg" and all(metrics.get("events") for metrics in results):
+            merged[name] = sum(metrics["latency_avg"] * metrics["events"] for metrics in results) / sum(metrics["events"] for metrics in results)
+        elif name == "latency_avg":
+            merged[name] = sum(values) / len(values)
+        else:
+            merged[name] = max(values)
+    if histogram:
+        merged["latency_p95"] = histogramPercentile(histogram, 95.0)
+        for name, percentile in HISTOGRAM_PERCENTILES:
+            merged[name] = histogramPercentile(histogram, percentile)
+    return merged
+
+def runClients(pool, target, params, extra=(), timeout=None):
+    """
+        Runs sysbench on every client instance of a target in lockstep and merges their results
+        The threads of the combination are split over the clients, so the total concurrency is the same as
+        with sysbench running on the target
+
+        Parameters
+        ----------
+        pool : SSHConnectionPool
+            pool holding the connections to the instances
+        target : dict
+            target as returned by getTargets, with clients
+        params : dict
+            benchmark parameters, see expandMatrix
+        extra : list[str]
+            additional sysbench options
+        timeout : float
+            seconds after which a client run is stopped, counted from the common start
+
+        Returns
+        -------
+        tuple(dict, dict{str, dict}, dict{float, int})
+            merged metrics, client role as key and its threads, tps, latency_p95, cpu_percent and output (the text
+            printed by sysbench) as value, and the merged latency histogram
+
+        Errors
+        -------
+        CommandError if sysbench fails on a client
+        """
+    remote = dict(target, mysqlHost=target["remoteHost"])
+    shares = {role: threads for role, threads in zip(target["clients"], splitThreads(params["threads"], len(target["clients"])))
+              if threads > 0}
+    startAt = time.time() + CLIENT_START_DELAY
+    parent = TRACER.current()
+
+    def run(role):
+        ip = target["clients"][role]
+        command = clientCommand(sysbenchCommand(params["workload"], "run", remote, shares[role], params["tables"],
+                                                params["table_size"], params.get("duration"),
+                                                workloadOptions(params) + list(extra)), startAt)
+        lines = []
+        with TRACER.span("sysbench:" + role, parent, host=ip, threads=shares[role]):
+            result = pool.run(ip, command, timeout and timeout + CLIENT_START_DELAY,
+                              lambda stream, line: lines.append(line) if stream == "stdout" else None)
+        if result.exit_status != 0:
+            raise CommandError(ip + ": sysbench exited with " + str(result.exit_status) + ": " + "\n".join(result.stderr[-10:]))
+        # the whole stdout, see runSysbench
+        return result._replace(stdout=lines)
+
+    with TRACER.span("sysbench:clients", clients=len(shares), workload=params["workload"], threads=params["threads"]):
+        with ThreadPoolExecutor(max_workers=len(shares)) as executor:
+            results = dict(zip(shares, executor.map(run, shares)))
+
+    perClient = {}
+    histograms = []
+    for role, result in results.items():
+        text = "\n".join(result.stdout)
+        metrics = parseSysbenchOutput(text)
+        histograms.append(parseHistogram(text))
+        perClient[role] = {"metrics": metrics, "threads": shares[role], "tps": metrics["tps"],
+                           "latency_p95": metrics["latency_p95"], "cpu_percent": clientCpuPercent(result.stdout),
+                           "output": text}
+    histogram = mergeHistograms(histograms)
+    missing = [role for role, values in zip(results, histograms) if not values]
+    if "--histogram" in extra and missing:
+        print("no latency histogram in the sysbench output of", ", ".join(missing))
+    merged = mergeSysbenchMetrics([values.pop("metrics") for values in perClient.values()], histogram)
+    return merged, perClient, histogram
+
+"""
+Sakila workload
+sakila.lua is a sysbench script running a weighted mix of transactions on the Sakila tables instead of sbtest:
+rental checkout and return, payment inserts, film/actor joins and inventory lookups
+Every transaction type is timed on its own, each sysbench thread prints one line per type when it is done
+SAKILA <type> <transactions> <errors> <latency sum ms> <bucket ms>:<count>,...
+with the bucket layout of sysbench's latency histogram (1024 logarithmic buckets from 0.001 to 100000 ms, about 1.8%
+wide), so the per type histograms merge with the latency_histograms ones and their percentiles are as coarse as
+sysbench's own 95th percentile
+"""
+SAKILA_WORKLOAD = "sakila"
+SAKILA_SCRIPT = "sakila.lua"
+# transaction type=weight, the weights do not need to add up to 100
+SAKILA_MIX = "checkout=30,return=20,payment=15,film_actor=20,inventory=15"
+
+SAKILA_LUA = r"""-- Sakila workload for sysbench, see script.py
+local ffi = require("ffi")
+ffi.cdef[[
+typedef struct { long tv_sec; long tv_nsec; } sakila_timespec;
+int clock_gettime(int clk_id, sakila_timespec *tp);
+]]
+local CLOCK_MONOTONIC = 1
+local clock = ffi.new("sakila_timespec")
+
+local function now_ms()
+   ffi.C.clock_gettime(CLOCK_MONOTONIC, clock)
+   return tonumber(clock.tv_sec) * 1000 + tonumber(clock.tv_nsec) / 1e6
+end
+
+-- latency buckets of sysbench's histogram (sb_histogram.c), printed as their value in ms
+local HISTOGRAM_SIZE = 1024
+local HISTOGRAM_DEDUCT = math.log(0.001)
+local HISTOGRAM_MULT = (HISTOGRAM_SIZE - 1) / (math.log(100000) - HISTOGRAM_DEDUCT)
+
+local function bucket(ms)
+   if ms <= 0 then
+      return 0
+   end
+   local i = math.floor((math.log(ms) - HISTOGRAM_DEDUCT) * HISTOGRAM_MULT + 0.5)
+   return math.max(0, math.min(HISTOGRAM_SIZE - 1, i))
+end
+
+local function bucket_value(i)
+   return math.exp(i / HISTOGRAM_MULT + HISTOGRAM_DEDUCT)
+end
+
+sysbench.cmdline.options = {
+   mix = {"Transaction mix, comma separated type=weight", '""" + SAKILA_MIX + r"""'},
+   -- the engine the tables are converted to by prepare, passed for the cluster as to the sbtest workloads
+   mysql_storage_engine = {"Storage engine", "innodb"},
+   -- accepted so that the sweep passes the same options as to the sbtest workloads
+   tables = {"Ignored", 0},
+   table_size = {"Ignored", 0},
+}
+
+-- tables used by the transactions, converted to the storage engine by prepare
+local SAKILA_TABLES = {"actor", "category", "customer", "film", "film_actor", "film_category", "inventory",
+                       "payment", "rental", "staff", "store"}
+
+-- converts the tables to --mysql-storage-engine (ndbcluster on the cluster), nothing to do for InnoDB
+-- NDB 7.2 has no foreign keys, they are dropped first and their indexes stay
+function cmd_prepare()
+   local engine = sysbench.opt.mysql_storage_engine
+   if engine:lower() == "innodb" then
+      return
+   end
+   local drv = sysbench.sql.driver()
+   local con = drv:connect()
+   local rs = con:query("SELECT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS " ..
+                        "WHERE CONSTRAINT_SCHEMA = DATABASE()")
+   local constraints = {}
+   for i = 1, rs.nrows do
+      table.insert(constraints, rs:fetch_row())
+   end
+   for _, row in ipairs(constraints) do
+      con:query(string.format("ALTER TABLE %s DROP FOREIGN KEY %s", row[1], row[2]))
+   end
+   for _, name in ipairs(SAKILA_TABLES) do
+      print("converting " .. name .. " to " .. engine)
+      con:query(string.format("ALTER TABLE %s ENGINE = %s", name, engine))
+   end
+   con:disconnect()
+end
+
+sysbench.cmdline.commands = {
+   prepare = {cmd_prepare},
+}
+
+local transactions = {}
+
+-- rents a copy of a random film in stock at a random store and takes the payment
+transactions.checkout = function()
+   local customer = sysbench.rand.uniform(1, 599)
+   local store = sysbench.rand.uniform(1, 2)
+   con:query("BEGIN")
+   local rs = con:query(string.format([[
+      SELECT i.inventory_id, f.rental_rate FROM inventory i JOIN film f ON f.film_id = i.film_id
+      WHERE i.film_id = %d AND i.store_id = %d
+        AND NOT EXISTS (SELECT 1 FROM rental r WHERE r.inventory_id = i.inventory_id AND r.return_date IS NULL)
+      LIMIT 1 FOR UPDATE]], sysbench.rand.uniform(1, 1000), store))
+   local row = rs:fetch_row()
+   if row then
+      -- store N is run by staff N
+      con:query(string.format("INSERT INTO rental (rental_date, inventory_id, customer_id, staff_id) " ..
+                              "VALUES (NOW(), %s, %d, %d)", row[1], customer, store))
+      con:query(string.format("INSERT INTO payment (customer_id, staff_id, rental_id, amount, payment_date) " ..
+                              "VALUES (%d, %d, LAST_INSERT_ID(), %s, NOW())", customer, store, row[2]))
+   end
+   con:query("COMMIT")
+end
+
+-- returns the oldest open rental of a random customer
+transactions["return"] = function()
+   con:query("BEGIN")
+   local rs = con:query(string.format("SELECT rental_id FROM rental WHERE customer_id = %d AND return_date IS NULL " ..
+                                      "ORDER BY rental_date LIMIT 1 FOR UPDATE", sysbench.rand.uniform(1, 599)))
+   local row = rs:fetch_row()
+   if row then
+      con:query("UPDATE rental SET return_date = NOW() WHERE rental_id = " .. row[1])
+   end
+   con:query("COMMIT")
+end
+
+-- charges a late fee on the last rental of a random customer
+transactions.payment = function()
+   local customer = sysbench.rand.uniform(1, 599)
+   con:query(string.format("INSERT INTO payment (customer_id, staff_id, rental_id, amount, payment_date) " ..
+                           "SELECT %d, %d, MAX(rental_id), 1.99, NOW() FROM rental WHERE customer_id = %d",
+                           customer, sysbench.rand.uniform(1, 2), customer))
+end
+
+-- lists the films of a random actor with their category and cast size
+transactions.film_actor = function()
+   con:query(string.format([[
+      SELECT f.film_id, f.title, c.name, COUNT(fa2.actor_id)
+      FROM film_actor fa JOIN film f ON f.film_id = fa.film_id
+      JOIN film_category fc ON fc.film_id = f.film_id JOIN category c ON c.category_id = fc.category_id
+      JOIN film_actor fa2 ON fa2.film_id = f.film_id
+      WHERE fa.actor_id = %d GROUP BY f.film_id, f.title, c.name]], sysbench.rand.uniform(1, 200)))
+end
+
+-- counts the copies of a random film in stock per store
+transactions.inventory = function()
+   con:query(string.format([[
+      SELECT i.store_id, COUNT(*) FROM inventory i
+      LEFT JOIN rental r ON r.inventory_id = i.inventory_id AND r.return_date IS NULL
+      WHERE i.film_id = %d AND r.rental_id IS NULL GROUP BY i.store_id]], sysbench.rand.uniform(1, 1000)))
+end
+
+-- cumulative weights of the mix
+local mix = {}
+local total_weight = 0
+
+function thread_init()
+   drv = sysbench.sql.driver()
+   con = drv:connect()
+   stats = {}
+   for name, weight in string.gmatch(sysbench.opt.mix, "([%w_]+)=(%d+)") do
+      if not transactions[name] then
+         error("unknown Sakila transaction " .. name)
+      end
+      total_weight = total_weight + tonumber(weight)
+      table.insert(mix, {name = name, upto = total_weight})
+      stats[name] = {count = 0, errors = 0, sum = 0, buckets = {}}
+   end
+end
+
+function event()
+   local r = sysbench.rand.uniform(1, total_weight)
+   local name
+   for _, entry in ipairs(mix) do
+      if r <= entry.upto then
+         name = entry.name
+         break
+      end
+   end
+   local s = stats[name]
+   local start = now_ms()
+   if pcall(transactions[name]) then
+      local elapsed = now_ms() - start
+      local b = bucket(elapsed)
+      s.count = s.count + 1
+      s.sum = s.sum + elapsed
+      s.buckets[b] = (s.buckets[b] or 0) + 1
+   else
+      s.errors = s.errors + 1
+      pcall(con.query, con, "ROLLBACK")
+   end
+end
+
+function thread_done()
+   for name, s in pairs(stats) do
+      local parts = {}
+      for b, count in pairs(s.buckets) do
+         table.insert(parts, string.format("%.3f:%d", bucket_value(b), count))
+      end
+      io.write(string.format("SAKILA %s %d %d %.3f %s\n", name, s.count, s.errors, s.sum, table.concat(parts, ",")))
+   end
+   io.flush()
+   con:disconnect()
+end
+"""
+
+# "SAKILA <type> <transactions> <errors> <latency sum ms> <histogram>", printed by sakila.lua
+SAKILA_LINE = re.compile(r"^SAKILA (\w+) (\d+) (\d+) ([\d.]+) ?(\S*)\s*$", re.M)
+
+def workloadOptions(params):
+    """
+        Returns the sysbench options specific to the workload of a combination, the mix of the Sakila workload
+        """
+    if params["workload"] == SAKILA_WORKLOAD:
+        return ["--mix=" + params.get("mix", SAKILA_MIX)]
+    return []
+
+def parseSakilaOutput(text):
+    """
+        Parses the per transaction type lines printed by sakila.lua, adding up the threads
+
+        Returns
+        -------
+        dict{str, dict}
+            transaction type as key and threads (number of lines), transactions, errors, latency_sum (ms)
+            and histogram as value, empty if the output has no such line
+        """
+    stats = {}
+    for name, transactions, errors, latencySum, buckets in SAKILA_LINE.findall(text):
+        entry = stats.setdefault(name, {"threads": 0, "transactions": 0, "errors": 0, "latency_sum": 0.0, "histogram": {}})
+        entry["threads"] += 1
+        entry["transactions"] += int(transactions)
+        entry["errors"] += int(errors)
+        entry["latency_sum"] += float(latencySum)
+        for pair in filter(None, buckets.split(",")):
+            value, count = pair.split(":")
+            entry["histogram"][float(value)] = entry["histogram"].get(float(value), 0) + int(count)
+    return stats
+
+def mergeSakilaStats(stats):
+    """
+        Adds up the per transaction type stats of runs made at the same time, see parseSakilaOutput
+        """
+    merged = {}
+    for entries in stats:
+        for name, entry in entries.items():
+            total = merged.setdefault(name, {"threads": 0, "transactions": 0, "errors": 0, "latency_sum": 0.0, "histogram": {}})
+            total["threads"] += entry["threads"]
+            total["transactions"] += entry["transactions"]
+            total["errors"] += entry["errors"]
+            total["latency_sum"] += entry["latency_sum"]
+            total["histogram"] = mergeHistograms([total["histogram"], entry["histogram"]])
+    return merged
+
+def checkSakilaStats(stats, params):
+    """
+        Checks that every thread of a Sakila run reported every transaction type of the mix
+
+        Errors
+        -------
+        CommandError if a type is missing or reported by fewer threads than the run had
+        """
+    types = {pair.split("=")[0] for pair in params.get("mix", SAKILA_MIX).split(",")}
+    incomplete = sorted(name for name in types if stats.get(name, {}).get("threads", 0) != params["threads"])
+    if incomplete:
+        raise CommandError("Sakila run with " + str(params["threads"]) + " threads: " + ", ".join(
+            name + " reported by " + str(stats.get(name, {}).get("threads", 0)) for name in incomplete))
+
+def sakilaMetrics(stats, seconds):
+    """
+        Turns the per transaction type stats of a run into throughput and latency metrics
+
+        Parameters
+        ----------
+        stats : dict{str, dict}
+            stats returned by parseSakilaOutput or mergeSakilaStats
+        seconds : float
+            duration of the run
+
+        Returns
+        -------
+        dict{str, dict}
+            transaction type as key and transactions, errors, tps, latency_avg, latency_p95, latency_p99 (ms)
+            and histogram as value
+        """
+    metrics = {}
+    for name, entry in sorted(stats.items()):
+        count = entry["transactions"]
+        metrics[name] = {"transactions": count, "errors": entry["errors"], "tps": count / seconds if seconds else None,
+                         "latency_avg": entry["latency_sum"] / count if count else None,
+                         "latency_p95": histogramPercentile(entry["histogram"], 95.0),
+                         "latency_p99": histogramPercentile(entry["histogram"], 99.0), "histogram": entry["histogram"]}
+    return metrics
+
+def prepareSakila(pool, target):
+    """
+        Stages sakila.lua on the target and its clients, then converts the Sakila tables to the engine of the target
+        The Sakila tables are loaded on the mysqld of the target instance; the dedicated SQL nodes have the sakila
+        database from sql_setup.sh, so they see the converted ndbcluster tables
+
+        Errors
+        -------
+        CommandError if the conversion fails
+        """
+    for ip in [target["ip"]] + list((target.get("clients") or {}).values()):
+        stageFiles(ip, pool, {SAKILA_SCRIPT: SAKILA_LUA}, 0o644)
+    params = {"workload": SAKILA_WORKLOAD, "threads": 1, "tables": 0, "table_size": 0}
+    with TRACER.span("prepareSakila", host=target["ip"], engine=target.get("engine") or "innodb"):
+        runSysbench(pool, dict(target, mysqlHost="127.0.0.1"), "prepare", params)
+
+def loadDataset(pool, db, runId, name, target, params, loadThreads=8, partitions=0):
+    """
+        Creates and fills the sbtest tables of a dataset and stores the load throughput
+        sysbench prepare fills the tables in parallel, one table per thread, so up to min(loadThreads, tables)
+        threads are used; on NDB the tables can be split into a given number of partitions by primary key
+
+        Parameters
+        ----------
+        pool : SSHConnectionPool
+            pool holding the connections to the instances
+        db : sqlite3.Connection
+            connection returned by openResultsStore
+        runId : str
+            id under which the result is stored
+        name : str
+            name of the target
+        target : dict
+            target as returned by getTargets
+        params : dict
+            combination whose tables and table_size are loaded
+        loadThreads : int
+            maximum number of loader threads
+        partitions : int
+            number of NDB partitions per table, 0 for the default of the cluster
+
+        Returns
+        -------
+        float
+            rows loaded per second
+        """
+    threads = max(1, min(loadThreads, params["tables"]))
+    if partitions and target.get("engine") == "ndbcluster":
+        # sysbench puts the engine into "/*! ENGINE = ... */" of CREATE TABLE, the partitioning clause can follow it
+        target = dict(target, engine="ndbcluster PARTITION BY KEY (id) PARTITIONS " + str(partitions))
+    load = {"tables": params["tables"], "table_size": params["table_size"], "threads": threads, "partitions": partitions}
+    with TRACER.span("load:" + name, **load):
+        result = runSysbench(pool, target, "prepare", dict(params, workload="oltp_read_write", threads=threads))
+    rows = params["tables"] * params["table_size"]
+    rowsPerSecond = rows / result.seconds
+    storeLoadResult(db, runId, name, load, rows, result.seconds)
+    print(name, "loaded", rows, "rows in", params["tables"], "tables with", threads, "threads:",
+          round(result.seconds, 1), "s,", round(rowsPerSecond), "rows/s")
+    return rowsPerSecond
+
+def sweepTarget(pool, db, runId, name, target, combinations, warmup=10, repetitions=3, cooldown=10, timeseries=False,
+                loadThreads=8, partitions=0):
+    """
+        Runs every combination against one target, one after the other
+        For each dataset the tables are prepared once and cleaned up after the last run using them,
+        each combination gets a warmup run, then the measured repetitions, then a cooldown pause
+        With timeseries, every measured repetition is run through runWithTimeSeries
+        When the target has dedicated SQL nodes, their throughput is measured around every measured repetition
+        When the target has client instances, the warmup and measured runs are made by runClients
+        The snapshot sources of the target are read before and after every measured repetition
+        The measured runs print their latency histogram, stored next to their metrics
+        The datasets are loaded by loadDataset with loadThreads and partitions
+        The Sakila combinations run on the Sakila tables, converted once by prepareSakila, and store the
+        throughput and latency of every transaction type
+
+        Returns
+        -------
+        list[dict]
+            the stored metrics, with their parameters
+        """
+    records = []
+    prepared = None
+    clients = target.get("clients") or {}
+    if timeseries and clients:
+        raise ValueError("time series are only captured with sysbench running on the target")
+    for ip in [target["ip"]] + list(clients.values()):
+        ensure = pool.run(ip, "command -v sysbench || (sudo apt-get update && sudo apt-get -y install sysbench)")
+        if ensure.exit_status != 0:
+            raise CommandError(ip + ": sysbench could not be installed")
+    if any(params["workload"] == SAKILA_WORKLOAD for params in combinations):
+        prepareSakila(pool, target)
+
+    for params in combinations:
+        dataset = (params["tables"], params["table_size"])
+        if params["workload"] != SAKILA_WORKLOAD and dataset != prepared:
+            if prepared is not None:
+                runSysbench(pool, target, "cleanup", dict(params, workload="oltp_read_write", tables=prepared[0], table_size=prepared[1]))
+            print(name, "preparing", params["tables"], "tables of", params["table_size"], "rows")
+            loadDataset(pool, db, runId, name, target, params, loadThreads, partitions)
+            prepared = dataset
+
+        if warmup and clients:
+            runClients(pool, target, dict(params, duration=warmup), timeout=warmup * 3 + 120)
+        elif warmup:
+            runSysbench(pool, target, "run", dict(params, duration=warmup))
+        for repetition in range(repetitions):
+            stored = dict(params, repetition=repetition)
+            sqlNodes = target.get("sqlNodes") or {}
+            before = {role: sqlNodeCounters(pool, ip) for role, ip in sqlNodes.items()}
+            snapshot = takeSnapshot(pool, target)
+            perClient = None
+            if timeseries:
+                result, path = runWithTimeSeries(pool, runId, name, target, stored)
+                stored["timeseries"] = path.name
+            elif clients:
+                metrics, perClient, histogram = runClients(pool, target, params, ["--histogram"], params["duration"] * 3 + 120)
+            else:
+                result = runSysbench(pool, target, "run", params, ["--histogram"], params["duration"] * 3 + 120)
+            if not clients or timeseries:
+                text = "\n".join(result.stdout)
+                metrics, histogram = parseSysbenchOutput(text), parseHistogram(text)
+                sakila = parseSakilaOutput(text)
+            else:
+                sakila = mergeSakilaStats([parseSakilaOutput(values.pop("output")) for values in perClient.values()])
+            if not histogram:
+                print(name + ": no latency histogram in the sysbench output of", params["workload"], params["threads"], "threads")
+            snapshot = snapshotDeltas(snapshot, takeSnapshot(pool, target))
+            storeResult(db, runId, name, stored, metrics)
+            storeHistogram(db, runId, name, stored, histogram)
+            storeSnapshots(db, runId, name, stored, snapshot)
+            records.append(dict(metrics, params=stored))
+            print(name, params["workload"], params["threads"], "threads, repetition", repetition, ":", metrics["tps"], "tps")
+            if params["workload"] == SAKILA_WORKLOAD:
+                checkSakilaStats(sakila, params)
+            if sakila:
+                perType = sakilaMetrics(sakila, metrics["total_time"] or params["duration"])
+                storeSakilaResults(db, runId, name, stored, perType)
+                for kind, values in perType.items():
+                    latencies = ["?" if values[key] is None else "%.2f" % values[key] for key in ("latency_avg", "latency_p95", "latency_p99")]
+                    print("    %-10s %8.1f tps, avg %s ms, p95 %s ms, p99 %s ms, %d errors" % (
+                        kind, values["tps"] or 0, latencies[0], latencies[1], latencies[2], values["errors"]))
+            summary = snapshotSummary(snapshot, metrics)
+            if "operations" in summary:
+                print("    operations per data node: " + ", ".join(node + ": %.0f" % value for node, value in sorted(summary["operations"].items()))
+                      + (" (skew %.2f)" % summary["skew"] if "skew" in summary else ""))
+            for key, label in (("round_trips_per_trx", "NDB round trips per transaction"), ("data_memory_percent", "data memory used (fullest node) %"),
+                               ("buffer_pool_reads_per_trx", "buffer pool reads per transaction")):
+                if key in summary:
+                    print("    %s: %.2f" % (label, summary[key]))
+            if perClient:
+                storeClientResults(db, runId, name, stored, perClient)
+                for role, values in perClient.items():
+                    cpu = values["cpu_percent"]
+                    print("    " + role + ": %d threads, %.1f tps, client cpu %s" % (
+                        values["threads"], values["tps"] or 0, "?" if cpu is None else "%.0f%%" % cpu)
+                          + (" (load generator saturated)" if cpu is not None and cpu >= CLIENT_CPU_LIMIT else ""))
+            if sqlNodes:
+                after = {role: sqlNodeCounters(pool, ip) for role, ip in sqlNodes.items()}
+                throughput = sqlNodeThroughput(before, after, metrics["total_time"] or params["duration"])
+                storeSqlNodeResults(db, runId, name, stored, throughput)
+                for role, values in throughput.items():
+                    print("    " + role + ": %.1f qps, %.1f tps, %.0f%% of the queries" % (values["qps"], values["tps"], 100 * values["share"]))
+        time.sleep(cooldown)
+
+    if prepared is not None:
+        runSysbench(pool, target, "cleanup", dict(combinations[-1], workload="oltp_read_write", tables=prepared[0], table_size=prepared[1]))
+    return records
+
+def runSweep(pool, db, runId, targets, matrix, warmup=10, repetitions=3, cooldown=10, timeseries=False,
+             loadThreads=8, partitions=0):
     """
+        Runs the sweep matrix against all the targets concurrently and stores every measured repetition
+        The targets driven by client instances are run one after the other
+
+        Parameters
+        ----------
+        pool : SSHConnectionPool
+            pool holding the connections to the instances
+        db : sqlite3.Connection
+            connection returned by openResultsStore
+        runId : str
+            id under which the results are stored
+        targets : dict{str, dict}
+            targets as returned by getTargets
+        matrix : dict{str, list}
+            sweep matrix, see expandMatrix
+        warmup : int
+            seconds of the unmeasured run before each combination, 0 to disable
+        repetitions : int
+            measured runs per combination
+        cooldown : int
+            seconds of pause after each combination
+        timeseries : bool
+            capture the interval reports and host metrics of every measured repetition
+        loadThreads : int
+            maximum number of threads loading the tables of a dataset
+        partitions : int
+            number of NDB partitions per cluster table, 0 for the default
 
+        Returns
+        -------
+        dict{str, list[dict]}
+            target as key and stored records as value
+        """
+    combinations = expandMatrix(matrix)
+    print(len(combinations), "combinations x", repetitions, "repetitions on", ", ".join(targets))
+    steps = TaskGraph()
+    records = {}
+    previous = []
+    for name, target in targets.items():
+        def sweep(name=name, target=target):
+            records[name] = sweepTarget(pool, db, runId, name, target, combinations, warmup, repetitions, cooldown, timeseries,
+                                        loadThreads, partitions)
+        # the targets share the client instances, they are then swept one after the other
+        steps.add("sweep:" + name, sweep, previous)
+        if target.get("clients"):
+            previous = ["sweep:" + name]
     try:
-        client.connect(hostname=ip, username="ubuntu", pkey=accesKey)
-    except:
-        print("could not connect to client")
+        steps.run()
+    finally:
+        steps.report()
+    return records
 
-    command = """/bin/bash """ + filename
+"""
+Time series captured during a benchmark run
+sysbench reports every interval while a sampler reads /proc on every node of the target,
+all the series are written to one CSV file on a common timeline (seconds since the start of sysbench)
+"""
+TIMESERIES_DIR = get_project_root() / "timeseries"
 
-    configSetup = send_command(client, command)
+# one line per interval: epoch, cpu jiffies (user nice system idle iowait irq softirq steal), MemTotal and
+# MemAvailable in kB, sectors read and written on the block devices, bytes received and sent on the network
+HOST_SAMPLER = r"""end=$(( $(date +%s) + DURATION ))
+while [ $(date +%s) -lt $end ]; do
+  echo "SAMPLE $(date +%s.%N)" \
+    "$(awk '/^cpu / {print $2, $3, $4, $5, $6, $7, $8, $9}' /proc/stat)" \
+    "$(awk '/^MemTotal:|^MemAvailable:/ {printf "%s ", $2}' /proc/meminfo)" \
+    "$(awk '$3 ~ /^(xvd[a-z]+|nvme[0-9]+n[0-9]+|sd[a-z]+)$/ {r += $6; w += $10} END {print r + 0, w + 0}' /proc/diskstats)" \
+    "$(awk -F'[: ]+' 'NR > 2 && $2 != "lo" {rx += $3; tx += $11} END {print rx + 0, tx + 0}' /proc/net/dev)"
+  sleep INTERVAL
+done"""
 
-    client.close()
+INTERVAL_REPORT = re.compile(r"\[\s*(\d+)s\s*\]\s*thds:\s*(\d+)\s*tps:\s*([\d.]+)\s*qps:\s*([\d.]+).*?"
+                             r"lat \(ms,95%\):\s*([\d.]+)\s*err/s:\s*([\d.]+)\s*reconn/s:\s*([\d.]+)")
 
-def main():
+def hostSamplerCommand(duration, interval=1):
     """
-        main function for performing the application
+        Returns the shell command sampling the host metrics every interval seconds for duration seconds
+        """
+    return HOST_SAMPLER.replace("DURATION", str(int(duration))).replace("INTERVAL", str(interval))
+
+def hostMetrics(lines):
+    """
+        Turns the raw sampler lines of one host into metrics, computed between two consecutive samples
+
+        Parameters
+        ----------
+        lines : list[str]
+            stdout lines of the sampler
+
+        Returns
+        -------
+        list[tuple(float, str, float)]
+            (epoch, metric, value) for cpu_percent, iowait_percent, mem_used_mb, disk_read_bps, disk_write_bps,
+            net_rx_bps and net_tx_bps
+        """
+    samples = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) != 16 or fields[0] != "SAMPLE":
+            continue
+        values = [float(field) for field in fields[1:]]
+        samples.append((values[0], values[1:9], values[9:11], values[11:13], values[13:15]))
+
+    points = []
+    for previous, current in zip(samples, samples[1:]):
+        t, cpu, mem, disk, net = current
+        elapsed = t - previous[0]
+        deltas = [now - before for now, before in zip(cpu, previous[1])]
+        total = sum(deltas) or 1
+        points += [
+            (t, "cpu_percent", 100.0 * (total - deltas[3] - deltas[4]) / total),
+            (t, "iowait_percent", 100.0 * deltas[4] / total),
+            (t, "mem_used_mb", (mem[0] - mem[1]) / 1024),
+            (t, "disk_read_bps", (disk[0] - previous[3][0]) * 512 / elapsed),
+            (t, "disk_write_bps", (disk[1] - previous[3][1]) * 512 / elapsed),
+            (t, "net_rx_bps", (net[0] - previous[4][0]) / elapsed),
+            (t, "net_tx_bps", (net[1] - previous[4][1]) / elapsed),
+        ]
+    return points
+
+def sysbenchIntervalMetrics(lines):
+    """
+        Turns the interval reports of a sysbench run into metrics
+        The run must be preceded by a "START <epoch>" line, the reports only carry the seconds since the start
+
+        Returns
+        -------
+        list[tuple(float, str, float)]
+            (epoch, metric, value) for threads, tps, qps, latency_p95, errors_per_sec and reconnects_per_sec
+        """
+    start = None
+    points = []
+    for line in lines:
+        if line.startswith("START "):
+            start = float(line.split()[1])
+            continue
+        match = INTERVAL_REPORT.search(line)
+        if match and start is not None:
+            t = start + int(match.group(1))
+            for name, value in zip(["threads", "tps", "qps", "latency_p95", "errors_per_sec", "reconnects_per_sec"], match.groups()[1:]):
+                points.append((t, name, float(value)))
+    return points
+
+def writeTimeSeries(path, series, origin):
+    """
+        Writes all the series into one CSV file sorted on the common timeline
+
+        Parameters
+        ----------
+        path : Path
+            CSV file to write
+        series : dict{str, list[tuple(float, str, float)]}
+            source (sysbench or the role of a host) as key and its points as value
+        origin : float
+            epoch used as time 0
+        """
+    rows = []
+    for source, points in series.items():
+        for t, metric, value in points:
+            rows.append((round(t - origin, 3), t, source, metric, value))
+    rows.sort()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="") as csvFile:
+        writer = csv.writer(csvFile)
+        writer.writerow(["t", "epoch", "source", "metric", "value"])
+        writer.writerows(rows)
+
+def runWithTimeSeries(pool, runId, name, target, params, interval=1):
+    """
+        Runs sysbench with interval reporting while sampling the host metrics of every node of the target
+        The samplers start one interval before sysbench and stop a few intervals after it
+
+        Parameters
+        ----------
+        pool : SSHConnectionPool
+            pool holding the connections to the instances
+        runId : str
+            id of the run, used in the file name
+        name : str
+            name of the target
+        target : dict
+            target as returned by getTargets, target["nodes"] maps the roles to sample to their ip
+        params : dict
+            benchmark parameters, see expandMatrix
+        interval : int
+            seconds between two reports and two samples
+
+        Returns
+        -------
+        tuple(CommandResult, Path)
+            result of the sysbench run and path of the CSV file
+        """
+    nodes = target.get("nodes") or {name: target["ip"]}
+    samplerDuration = params["duration"] + 5 * interval
+    hostLines = {role: [] for role in nodes}
+    sysbenchLines = []
+
+    def sample(role, ip):
+        pool.run(ip, hostSamplerCommand(samplerDuration, interval), samplerDuration + 60,
+                 lambda stream, line: hostLines[role].append(line) if stream == "stdout" else None)
+
+    command = "echo START $(date +%s.%N); stdbuf -oL " + sysbenchCommand(
+        params["workload"], "run", target, params["threads"], params["tables"], params["table_size"],
+        params["duration"], workloadOptions(params) + ["--report-interval=" + str(interval), "--histogram"])
+
+    with ThreadPoolExecutor(max_workers=len(nodes)) as executor:
+        samplers = [executor.submit(sample, role, ip) for role, ip in nodes.items()]
+        time.sleep(interval)
+        result = pool.run(target["ip"], command, params["duration"] * 3 + 120,
+                          lambda stream, line: sysbenchLines.append(line) if stream == "stdout" else None)
+        for sampler in samplers:
+            sampler.result()
+    if result.exit_status != 0:
+        raise CommandError(target["ip"] + ": sysbench exited with " + str(result.exit_status) + ": " + "\n".join(result.stderr[-10:]))
+
+    series = {"sysbench": sysbenchIntervalMetrics(sysbenchLines)}
+    for role, lines in hostLines.items():
+        series[role] = hostMetrics(lines)
+    origin = float(sysbenchLines[0].split()[1])
+    path = TIMESERIES_DIR / (runId + "-" + name + "-" + params["workload"] + "-" + str(params["threads"]) + "t-"
+                             + str(params.get("repetition", 0)) + ".csv")
+    writeTimeSeries(path, series, origin)
+    return result, path
+
+"""
+Artifact cache
+The large downloads of the user data are fetched once by the controller, stored by their sha256 and served
+to the instances, either by a small HTTP server on the controller or from an S3 bucket
+"""
+CACHE_DIR = get_project_root() / "cache"
+
+# sha256 is the expected checksum of the download; fetchAll refuses an artifact without one unless its digest
+# is given with --artifact-sha256 NAME=DIGEST or trust on first use (--trust-on-first-use) is asked for
+ARTIFACTS = {
+    "mysql-cluster": {"url": "http://dev.mysql.com/get/Downloads/MySQL-Cluster-7.2/mysql-cluster-gpl-7.2.1-linux2.6-x86_64.tar.gz", "sha256": None},
+    "sakila": {"url": "http://downloads.mysql.com/docs/sakila-db.zip", "sha256": None},
+}
+
+class ChecksumError(Exception):
+    """
+        Raised when a downloaded artifact does not have the expected sha256
+        """
+
+class ArtifactCache:
+    """
+        Content-addressed store of the artifacts
+        Files are kept as <directory>/sha256/<hash>, index.json maps each upstream url to its hash, size
+        and the time the upstream download took
+
+        Parameters
+        ----------
+        directory : Path
+            directory of the cache
+        """
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = Path(directory)
+        self.indexPath = self.directory / "index.json"
+        self.index = json.loads(self.indexPath.read_text()) if self.indexPath.exists() else {}
+        self.served = {}
+        # checksums downloaded by this controller during this run, their download is not a saving
+        self.fetched = set()
+        self.lock = threading.Lock()
+
+    def blobPath(self, sha256):
+        return self.directory / "sha256" / sha256
+
+    def saveIndex(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = self.indexPath.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.index, indent=2, sort_keys=True))
+        os.replace(temporary, self.indexPath)
+
+    def fetch(self, url, sha256=None):
+        """
+            Returns the cached artifact of an url, downloading it first if it is not in the cache
+
+            Parameters
+            ----------
+            url : str
+                upstream url
+            sha256 : str
+                expected checksum, None to accept and record the checksum of the first download
+
+            Returns
+            -------
+            dict
+                index entry of the artifact: sha256, size, name, fetchSeconds
+
+            Errors
+            -------
+            ChecksumError if the download does not match the expected or previously recorded checksum
+            """
+        entry = self.index.get(url)
+        expected = sha256 or (entry or {}).get("sha256")
+        if entry and self.blobPath(entry["sha256"]).exists() and (sha256 is None or sha256 == entry["sha256"]):
+            return entry
+
+        blobs = self.directory / "sha256"
+        blobs.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        start = time.perf_counter()
+        temporary = blobs / ("download-" + str(os.getpid()) + "-" + str(threading.get_ident()))
+        with urllib.request.urlopen(url, timeout=60) as response, open(temporary, "wb") as blob:
+            while True:
+                chunk = response.read(1024 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                blob.write(chunk)
+                size += len(chunk)
+        seconds = time.perf_counter() - start
+
+        if expected and digest.hexdigest() != expected:
+            temporary.unlink()
+            raise ChecksumError(url + " has sha256 " + digest.hexdigest() + ", expected " + expected)
+        os.replace(temporary, self.blobPath(digest.hexdigest()))
+
+        entry = {"sha256": digest.hexdigest(), "size": size, "name": url.rstrip("/").split("/")[-1], "fetchSeconds": seconds}
+        with self.lock:
+            self.index[url] = entry
+            self.fetched.add(entry["sha256"])
+            self.saveIndex()
+        print("cached", entry["name"], size, "bytes in", round(seconds, 1), "s")
+        return entry
+
+    def fetchAll(self, artifacts=ARTIFACTS, pins=None, trustOnFirstUse=False):
+        """
+            Fetches every artifact, returns the index entries by upstream url
+
+            Parameters
+            ----------
+            artifacts : dict{str, dict}
+                artifact name as key and url and sha256 as value, see ARTIFACTS
+            pins : dict{str, str}
+                artifact name as key and expected sha256 as value, overriding the one of artifacts
+            trustOnFirstUse : bool
+                accept an artifact without an expected sha256, recording the checksum of its first download
+
+            Errors
+            -------
+            ChecksumError if an artifact has no expected sha256 and trustOnFirstUse is False,
+            or if a download does not match its checksum
+            """
+        pins = pins or {}
+        entries = {}
+        for name, artifact in artifacts.items():
+            sha256 = pins.get(name) or artifact["sha256"]
+            if sha256 is None and not trustOnFirstUse:
+                raise ChecksumError("no sha256 pinned for " + name + ", pass --artifact-sha256 " + name + "=DIGEST "
+                                    "or --trust-on-first-use")
+            entries[artifact["url"]] = self.fetch(artifact["url"], sha256)
+        return entries
+
+    def recordServed(self, sha256, size, seconds):
+        with self.lock:
+            count, total, spent = self.served.get(sha256, (0, 0, 0.0))
+            self.served[sha256] = (count + 1, total + size, spent + seconds)
+
+    def report(self):
+        """
+            Prints, per artifact, how often it was served and the upstream bytes and seconds this saved
+            The seconds saved are estimated from the duration of the upstream download of the controller,
+            when the controller downloaded the artifact during this run, that download is deducted
+
+            Returns
+            -------
+            tuple(int, float)
+                total bytes and seconds saved
+            """
+        totalBytes, totalSeconds = 0, 0.0
+        print("%-48s %10s %7s %12s %10s" % ("artifact", "size", "served", "bytes saved", "s saved"))
+        for url, entry in sorted(self.index.items()):
+            count, size, spent = self.served.get(entry["sha256"], (0, 0, 0.0))
+            fetched = entry["sha256"] in self.fetched
+            savedBytes = max(0, size - (entry["size"] if fetched else 0))
+            saved = max(0.0, (count - (1 if fetched else 0)) * entry["fetchSeconds"] - spent)
+            totalBytes += savedBytes
+            totalSeconds += saved
+            print("%-48s %10d %7d %12d %10.1f" % (entry["name"][:48], entry["size"], count, savedBytes, saved))
+        return totalBytes, totalSeconds
+
+class ArtifactRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+        Serves GET /<sha256>/<name> from the cache of the server
+        """
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        path = self.server.cache.blobPath(parts[0]) if parts and re.fullmatch(r"[0-9a-f]{64}", parts[0]) else None
+        if path is None or not path.exists():
+            self.send_error(404)
+            return
+        start = time.perf_counter()
+        size = path.stat().st_size
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        with open(path, "rb") as blob:
+            shutil.copyfileobj(blob, self.wfile, 1024 * 1024)
+        self.server.cache.recordServed(parts[0], size, time.perf_counter() - start)
+
+    def log_message(self, format, *args):
+        pass
+
+class ArtifactServer(http.server.ThreadingHTTPServer):
+    """
+        HTTP server exposing an ArtifactCache to the instances, it runs in a background thread
+
+        Parameters
+        ----------
+        cache : ArtifactCache
+            cache to serve
+        port : int
+            port to listen on, all interfaces
+        """
+    daemon_threads = True
+
+    def __init__(self, cache, port=8000):
+        super().__init__(("0.0.0.0", port), ArtifactRequestHandler)
+        self.cache = cache
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def mirrorUrls(entries, baseUrl):
+    """
+        Maps each upstream url to its url on the artifact server
+
+        Parameters
+        ----------
+        entries : dict{str, dict}
+            index entries by upstream url, as returned by ArtifactCache.fetchAll
+        baseUrl : str
+            url of the artifact server as seen from the instances, for example http://203.0.113.10:8000
+
+        Returns
+        -------
+        dict{str, str}
+            upstream url as key and mirror url as value
+        """
+    return {url: baseUrl.rstrip("/") + "/" + entry["sha256"] + "/" + entry["name"] for url, entry in entries.items()}
+
+def publishToBucket(cache, entries, s3_client, bucket, expires=6 * 3600):
+    """
+        Uploads the artifacts to an S3 bucket, skipping the ones already there, and returns presigned urls
+
+        Returns
+        -------
+        dict{str, str}
+            upstream url as key and presigned url as value
+        """
+    mirrors = {}
+    for url, entry in entries.items():
+        key = "artifacts/" + entry["sha256"] + "/" + entry["name"]
+        try:
+            s3_client.head_object(Bucket=bucket, Key=key)
+        except Exception:
+            s3_client.upload_file(str(cache.blobPath(entry["sha256"])), bucket, key)
+        mirrors[url] = s3_client.generate_presigned_url("get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expires)
+    return mirrors
+
+def applyMirrors(text, mirrors):
+    """
+        Rewrites the wget downloads of a script to use the mirror urls
+        The file keeps its upstream name (wget -O), so the rest of the script is unchanged
+
+        Parameters
+        ----------
+        text : str
+            user data or setup file
+        mirrors : dict{str, str}
+            upstream url as key and mirror url as value, None or empty to leave the text unchanged
+
+        Returns
+        -------
+        str
+            the rewritten text
+        """
+    for url, mirror in (mirrors or {}).items():
+        text = text.replace("wget " + url, "wget -O " + url.rstrip("/").split("/")[-1] + " '" + mirror + "'")
+    return text
+
+"""
+Run state
+provision records the security group, the instances and the completed setup steps in STATE_FILE,
+a second run reuses them and resumes at the first step that did not complete
+"""
+STATE_FILE = get_project_root() / "state.json"
+
+class RunState:
+    """
+        JSON file with the resources and completed steps of the current deployment
+        Every change is written immediately (write to a temporary file, then rename), so an interrupted run
+        leaves a consistent file behind
+
+        Parameters
+        ----------
+        path : Path
+            path of the state file
+        """
+    def __init__(self, path=STATE_FILE):
+        self.path = Path(path)
+        self.data = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self.lock = threading.Lock()
+
+    def save(self):
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.data, indent=2, sort_keys=True))
+        os.replace(temporary, self.path)
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def update(self, **values):
+        with self.lock:
+            self.data.update(values)
+            self.save()
+
+    def completed(self):
+        """
+            Returns the names of the completed setup steps
+            """
+        with self.lock:
+            return set(self.data.get("steps", []))
+
+    def markDone(self, step):
+        with self.lock:
+            self.data.setdefault("steps", []).append(step)
+            self.save()
+
+    def address(self, role):
+        """
+            Returns the public ip of a role, None if the state has no instance for it
+            """
+        instance = self.get("instances", {}).get(role)
+        return instance[1] if instance else None
+
+    def privateAddress(self, role):
+        """
+            Returns the private ip of a role, None if the state has no instance for it
+            """
+        instance = self.get("instances", {}).get(role)
+        return instance[2] if instance else None
+
+def provision(args, ec2_client=None, pool=None, sts_client=None):
+    """
+        Provisions the stand-alone instance and the cluster, then sets up the cluster
 
         Conncets to the boto3 clients
         calls the required functions
+        the clients and pool default to boto3 and to SSH connections with labsuser.pem, the offline harness passes its fakes
 
     """
+    topology = {"dataNodes": args.data_nodes, "replicas": args.replicas, "sqlNodes": args.sql_nodes,
+                "instanceType": args.instance_type, "multithreaded": args.multithreaded, "clients": args.clients,
+                "roleTypes": parseRoleTypes(args.role_types)}
+    validateTopology(topology)
+    started = time.time()
+
     """------------Get necesarry clients from boto3------------------------"""
-    ec2_client = boto3.client("ec2")
-    ec2 = boto3.resource('ec2')
+    if ec2_client is None:
+        ec2_client = boto3.client("ec2")
+        sts_client = boto3.client("sts")
 
     """------------Create Paramiko Client------------------------------"""
-    paramiko_client, accesKey = getParamikoClient()
+    if pool is None:
+        paramiko_client, accesKey = getParamikoClient()
+        pool = SSHConnectionPool(accesKey)
+
+    state = RunState(args.state)
+    if args.fresh:
+        state.update(steps=[])
+
+    """-------------------Look up the VPC, subnets and image--------------------------"""
+    metadata = getAwsMetadata(ec2_client, sts_client, args.metadata_cache, refresh=args.refresh_metadata)
+    print("image: ", metadata["imageId"])
 
     """-------------------Create security group--------------------------"""
-    SECURITY_GROUP, vpc_id = createSecurityGroup(ec2_client)
+    SECURITY_GROUP, vpc_id = createSecurityGroup(ec2_client, metadata["vpcId"])
+    state.update(securityGroup=SECURITY_GROUP, vpcId=vpc_id)
     print("security_group: ", SECURITY_GROUP)
     print("vpc_id: ", str(vpc_id), "\n")
 
     """-------------------Get availability Zones--------------------------"""
-    availabilityZones = getAvailabilityZones(ec2_client)
+    availabilityZones = metadata["availabilityZones"]
     print("Availability zones:")
     print("Zone 1a: ", availabilityZones.get('us-east-1a'), "\n")
 
-    """-------------------Create the stand-alone instance--------------------------"""
-    ins_standalone = createInstances(ec2_client, ec2, SECURITY_GROUP, availabilityZones, userdata_standalone)
-    print("Instance ids: \n", str(ins_standalone[0]), "\n")
-    print("Instance ip: \n", str(ins_standalone[1]), "\n")
-
-    """-------------------Create the cluster instances--------------------------"""
-    ins_cluster1 = createInstances(ec2_client, ec2, SECURITY_GROUP, availabilityZones, userdata_masternode)
-    print("Instance ids: \n", str(ins_cluster1), "\n")
-    print("Instance ip - master: \n", str(ins_cluster1), "\n")
-    ins_cluster2 = createInstances(ec2_client, ec2, SECURITY_GROUP, availabilityZones, userdata_nodes)
-    print("Instance ids: \n", str(ins_cluster2), "\n")
-    print("Instance ip - node1: \n", str(ins_cluster2), "\n")
-    ins_cluster3 = createInstances(ec2_client, ec2, SECURITY_GROUP, availabilityZones, userdata_nodes)
-    print("Instance ids: \n", str(ins_cluster3), "\n")
-    print("Instance ip - node2: \n", str(ins_cluster3), "\n")
-    ins_cluster4 = createInstances(ec2_client, ec2, SECURITY_GROUP, availabilityZones, userdata_nodes)
-    print("Instance ids: \n", str(ins_cluster4), "\n")
-    print("Instance ip - node3: \n", str(ins_cluster4), "\n")
+    """-------------------Fill the artifact cache--------------------------"""
+    mirrors, artifactServer, cache = None, None, None
+    if args.artifact_mirror or args.artifact_bucket:
+        cache = ArtifactCache()
+        pins = dict(pair.split("=", 1) for pair in args.artifact_sha256)
+        entries = cache.fetchAll(pins=pins, trustOnFirstUse=args.trust_on_first_use)
+        if args.artifact_bucket:
+            mirrors = publishToBucket(cache, entries, boto3.client("s3"), args.artifact_bucket)
+        else:
+            artifactServer = ArtifactServer(cache, urllib.parse.urlparse(args.artifact_mirror).port or 80)
+            mirrors = mirrorUrls(entries, args.artifact_mirror)
+        print("artifacts served from", args.artifact_bucket or args.artifact_mirror, "\n")
+
+    """-------------------Create the stand-alone and cluster instances--------------------------"""
+    roles = [(role, applyMirrors(userdata, mirrors)) for role, userdata in getClusterRoles(topology["dataNodes"], topology["sqlNodes"], topology["clients"])]
+    instanceTypes = {role: roleInstanceType(topology, role) for role, _ in roles}
+    existing = findTaggedInstances(ec2_client, instanceTypes=instanceTypes)
+    existing = {role: instance for role, instance in existing.items() if role in dict(roles)}
+    instances = provisionCluster(ec2_client, SECURITY_GROUP, availabilityZones, roles, topology["instanceType"], existing,
+                                 metadata["imageId"], instanceTypes)
+    for role, (instance_id, ip, privateip) in instances.items():
+        print("Instance " + role + ": ", instance_id, ip, privateip)
+    print()
+    # the setup files embed every private ip and the topology, a replaced instance or a new topology means setting up again
+    recorded = {role: list(instance) for role, instance in instances.items()}
+    if state.get("instances") != recorded or state.get("topology") != topology:
+        state.update(steps=[])
+    state.update(instances=recorded, topology=topology)
+    ins_standalone = instances["standalone"]
+    ins_cluster1 = instances["master"]
+    dataNodes = {role: instance for role, instance in instances.items() if roleKind(role) == "node"}
+    sqlNodes = {role: instance for role, instance in instances.items() if roleKind(role) == "sql"}
+    clients = {role: instance for role, instance in instances.items() if roleKind(role) == "client"}
 
     """-------------------Create setup files and execute them--------------------------"""
+    # every host moves on as soon as its own user data has finished, the data nodes only wait
+    # for the management node to be up (mysql_setup.sh starts ndb_mgmd) before connecting to it
+    print("-------------------Wait for installations and setup the cluster-------------------")
+    master = ins_cluster1[1]
+    dataNodeIps = [str(instance[2]) for instance in dataNodes.values()]
+    sqlNodeIps = [str(instance[2]) for instance in sqlNodes.values()]
 
-    print("-------------------Wait installation 4 min-------------------")
-    time.sleep(240)
-    print("-------------------Setup file creation-------------------")
-    createMasterFiles(ins_cluster1[1], paramiko_client, accesKey, str(ins_cluster1[2]), str(ins_cluster2[2]), str(ins_cluster3[2]), str(ins_cluster4[2]))
-    createNodeFile(ins_cluster2[1], paramiko_client, accesKey, str(ins_cluster1[2]))
-    createNodeFile(ins_cluster3[1], paramiko_client, accesKey, str(ins_cluster1[2]))
-    createNodeFile(ins_cluster4[1], paramiko_client, accesKey, str(ins_cluster1[2]))
-    print("-------------------files created - execute master setup-------------------")
-    executeFiles(ins_cluster1[1], paramiko_client, accesKey, "write_config.sh")
-    executeFiles(ins_cluster1[1], paramiko_client, accesKey, "mysql_setup.sh")
-    print("-------------------node connections-------------------")
-    executeFiles(ins_cluster2[1], paramiko_client, accesKey, "connection.sh")
-    executeFiles(ins_cluster3[1], paramiko_client, accesKey, "connection.sh")
-    executeFiles(ins_cluster4[1], paramiko_client, accesKey, "connection.sh")
-    print("-------------------Connect to the cluster " + ins_cluster1[1] + " and run commands on mysql connection, sakila and sysbench manually-------------------")
-    print("/bin/bash mysql_execution.sh")
-    print("/bin/bash mysql_execution2.sh")
+    steps = TaskGraph()
+    steps.add("ready:standalone", lambda: waitUntilReady(ins_standalone[1], pool, "standalone"))
+    steps.add("ready:master", lambda: waitUntilReady(master, pool, "master"))
+    steps.add("stage:master", lambda: createMasterFiles(master, pool, str(ins_cluster1[2]), dataNodeIps, topology, sqlNodeIps, mirrors), ["ready:master"])
+    steps.add("write_config.sh", lambda: executeFiles(master, pool, "write_config.sh"), ["stage:master"])
+    steps.add("mysql_setup.sh", lambda: executeFiles(master, pool, "mysql_setup.sh"), ["write_config.sh"])
+    for role, instance in dataNodes.items():
+        ip = instance[1]
+        steps.add("ready:" + role, lambda ip=ip, role=role: waitUntilReady(ip, pool, role))
+        steps.add("stage:" + role, lambda ip=ip: createNodeFile(ip, pool, str(ins_cluster1[2]), topology["multithreaded"]), ["ready:" + role])
+        steps.add("connection.sh:" + role, lambda ip=ip: executeFiles(ip, pool, "connection.sh"), ["stage:" + role, "mysql_setup.sh"])
+
+    # the mysqld of the master and of the SQL nodes start as soon as ndb_mgm reports every data node as started
+    metrics = {}
+
+    def clusterStarted():
+        metrics["data_nodes_started_s"] = waitForDataNodes(pool, master, len(dataNodes))
+        metrics["time_to_cluster_s"] = time.time() - started
+
+    def mysqldStarted():
+        executeFiles(master, pool, "mysql_execution.sh")
+        metrics["time_to_mysqld_s"] = time.time() - started
+
+    steps.add("cluster:started", clusterStarted, ["connection.sh:" + node for node in dataNodes])
+    steps.add("mysql_execution.sh", mysqldStarted, ["cluster:started"])
+    def sakilaLoaded(name, output):
+        match = SAKILA_LOAD_REPORT.search("\n".join(output))
+        if match:
+            rows, seconds = int(match.group(1)), float(match.group(2))
+            metrics["sakila_rows_per_s:" + name] = rows / max(seconds, 0.001)
+            print(name, "loaded sakila,", rows, "rows in", round(seconds, 1), "s")
+
+    # the stand-alone loads sakila in its user data, the report is in the cloud-init log
+    steps.add("sakila:standalone", lambda: sakilaLoaded("standalone", pool.run(
+        ins_standalone[1], "grep 'sakila load:' /var/log/cloud-init-output.log").stdout), ["ready:standalone"])
+    steps.add("mysql_execution2.sh", lambda: sakilaLoaded("cluster", executeFiles(master, pool, "mysql_execution2.sh").stdout),
+              ["mysql_execution.sh"])
+    for role, instance in sqlNodes.items():
+        ip = instance[1]
+        steps.add("ready:" + role, lambda ip=ip, role=role: waitUntilReady(ip, pool, role))
+        steps.add("stage:" + role, lambda ip=ip: stageFiles(ip, pool, renderSqlNodeFiles(str(ins_cluster1[2]))), ["ready:" + role])
+        steps.add("sql_setup.sh:" + role, lambda ip=ip: executeFiles(ip, pool, "sql_setup.sh"), ["stage:" + role, "cluster:started"])
+    # the client instances only need sysbench, installed by their user data
+    for role, instance in clients.items():
+        steps.add("ready:" + role, lambda ip=instance[1], role=role: waitUntilReady(ip, pool, role))
+
+    completed = state.completed()
+    if completed:
+        print("resuming,", len(completed), "steps already done")
+    try:
+        steps.run(completed=completed, onDone=state.markDone)
+    finally:
+        print("-------------------Setup steps-------------------")
+        steps.report()
+        # the master downloads sakila in mysql_execution2.sh, the last step
+        if artifactServer:
+            artifactServer.stop()
+    metrics["time_to_setup_s"] = time.time() - started
+    print("-------------------SSH connections-------------------")
+    pool.report()
+    pool.closeAll()
+    if cache:
+        cache.report()
+
+    # a resumed run skips the steps measuring the cluster start, only a complete setup is recorded
+    if "time_to_mysqld_s" in metrics:
+        runId = newRunId()
+        storeProvisionMetrics(openResultsStore(args.results_db), runId, topology, metrics)
+        state.update(metrics=metrics)
+        print("-------------------Time to ready (stored as run " + runId + ")-------------------")
+        for metric, value in metrics.items():
+            print("%-24s %8.1f s" % (metric, value))
+    print("-------------------Connect to the cluster " + ins_cluster1[1] + " and run sysbench manually-------------------")
     print("/bin/bash sysbench.sh")
     print("cat results.txt")
     print("-------------------Connect to the stand-alone  " + ins_standalone[1] + " and run command to get the results-------------------")
     print("cat results.txt")
+    print("-------------------Or collect and compare both results files once sysbench.sh has run-------------------")
+    print("python3 script.py collect --standalone " + ins_standalone[1] + " --master " + ins_cluster1[1])
+    if clients:
+        print("-------------------Sweep driven by the " + str(len(clients)) + " client instances (from the state file)-------------------")
+        print("python3 script.py sweep")
+    if sqlNodes:
+        print("-------------------Sweep spreading the cluster connections over the SQL nodes-------------------")
+        print("python3 script.py sweep --standalone " + ins_standalone[1] + " --master " + ins_cluster1[1]
+              + " --sql-nodes " + ",".join(instance[1] + "=" + instance[2] for instance in sqlNodes.values()))
+
+def collect(args):
+    """
+        Fetches the results.txt files of the stand-alone and master instances,
+        stores them in the results file and prints them side by side
+    """
+    fillFromState(args)
+    paramiko_client, accesKey = getParamikoClient()
+    pool = SSHConnectionPool(accesKey)
+    db = openResultsStore(args.results_db)
+    runId = args.run_id or newRunId()
+    params = {"workload": "oltp_read_write", "table_size": 1000000}
+
+    sources = {"standalone": (args.standalone, "results.txt"), "cluster": (args.master, "results.txt")}
+    collected = collectResults(pool, db, runId, sources, params)
+    pool.closeAll()
+
+    print("-------------------Results of run " + runId + "-------------------")
+    printComparison(collected)
+
+def sweep(args):
+    """
+        Runs a benchmark sweep against the stand-alone instance and the cluster
+    """
+    fillFromState(args)
+    paramiko_client, accesKey = getParamikoClient()
+    pool = SSHConnectionPool(accesKey)
+    db = openResultsStore(args.results_db)
+    runId = args.run_id or newRunId()
+    matrix = {
+        "workloads": args.workloads.split(","),
+        "threads": [int(value) for value in args.threads.split(",")],
+        "tables": [int(value) for value in args.tables.split(",")],
+        "table_sizes": [int(value) for value in args.table_sizes.split(",")],
+        "durations": [int(value) for value in args.durations.split(",")],
+        "rows": args.rows,
+        "mix": args.sakila_mix,
+    }
+    try:
+        sqlNodes = {}
+        for i, pair in enumerate(args.sql_nodes.split(",") if args.sql_nodes else []):
+            ip, privateip = pair.split("=")
+            sqlNodes["sql" + str(i + 1)] = (ip, privateip)
+        clients = {}
+        if args.clients and not args.local:
+            clients = {"client" + str(i + 1): ip for i, ip in enumerate(args.clients.split(","))}
+            if args.timeseries:
+                raise SystemExit("--timeseries samples sysbench on the targets, add --local to run without the client instances")
+        # the clients connect over the private network when the targets are the provisioned instances
+        state = RunState(args.state)
+        privateIps = {role: state.privateAddress(role) for role in ("standalone", "master")
+                      if state.address(role) == getattr(args, role)}
+        targets = getTargets(args.standalone, args.master, args.data_nodes.split(",") if args.data_nodes else (), sqlNodes,
+                             clients, privateIps)
+        if clients:
+            print("sysbench runs on", len(clients), "client instances:", ", ".join(clients.values()))
+        # the price/performance report needs the instance types the results were measured on
+        if state.get("topology") and state.address("master") == args.master and state.address("standalone") == args.standalone:
+            storeRunTopology(db, runId, state.get("topology"))
+        runSweep(pool, db, runId, targets, matrix, args.warmup, args.repetitions, args.cooldown, args.timeseries,
+                 args.load_threads, args.ndb_partitions)
+    finally:
+        pool.closeAll()
+    print("-------------------Sweep stored as run " + runId + "-------------------")
+    printStatistics(compareResults(loadResults(db, runId, "standalone"), loadResults(db, runId, "cluster")))
+
+def parseSelection(selection):
+    """
+        Splits a RUN_ID[:TARGET] selection of the compare command, the target defaults to the cluster
+    """
+    runId, _, target = selection.partition(":")
+    return runId, target or "cluster"
+
+def compare(args):
+    """
+        Compares the stored results of two runs or targets, combination by combination,
+        and flags the significant regressions of the candidate
+    """
+    db = openResultsStore(args.results_db)
+    selected = []
+    for selection in (args.baseline, args.candidate):
+        runId, target = parseSelection(selection)
+        records = loadResults(db, runId, target)
+        if not records:
+            raise SystemExit("no results for run " + runId + " and target " + target + " in " + str(args.results_db))
+        selected.append(records)
+    unknown = set(args.metrics.split(",")) - set(COMPARED_METRICS)
+    if unknown:
+        raise SystemExit("unknown metrics " + ", ".join(sorted(unknown)) + ", choose from " + ", ".join(COMPARED_METRICS))
+    metrics = {name: COMPARED_METRICS[name] for name in args.metrics.split(",")}
+
+    rows = compareResults(selected[0], selected[1], metrics, args.confidence, args.alpha)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"baseline": args.baseline, "candidate": args.candidate, "alpha": args.alpha,
+                                               "confidence": args.confidence, "rows": rows}, indent=2))
+    print("-------------------" + args.baseline + " (baseline) vs " + args.candidate + " (candidate)-------------------")
+    printStatistics(rows)
+    regressions = [row for row in rows if row["verdict"] == "regression"]
+    print(len(regressions), "significant regressions out of", len(rows), "comparisons (alpha " + str(args.alpha) + ")")
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+# stops the management node, data node and mysqld of a reused cluster instance and empties their data directories,
+# the brackets keep pkill and pgrep from matching the shell running the command
+CLUSTER_PROCESSES = "'[n]db_mgmd|[n]dbmtd|[n]dbd|[m]ysqld'"
+RESET_CLUSTER_HOST = ("sudo pkill -f " + CLUSTER_PROCESSES + "; "
+                      "for i in $(seq 30); do pgrep -f " + CLUSTER_PROCESSES + " > /dev/null || break; sleep 2; done; "
+                      "! pgrep -f " + CLUSTER_PROCESSES + " > /dev/null && "
+                      "sudo rm -rf /opt/mysqlcluster/deploy/ndb_data/* /opt/mysqlcluster/deploy/mysqld_data/*")
+
+def resetClusterHosts(pool, ips):
+    """
+        Stops the cluster processes of reused instances, so that the next provision sets up a new cluster on them
+        instead of running into the management node, data nodes and mysqld of the previous one
+
+        Errors
+        -------
+        CommandError if a process does not stop
+        """
+    def reset(ip):
+        result = pool.run(ip, RESET_CLUSTER_HOST, 120)
+        if result.exit_status != 0:
+            raise CommandError(ip + ": the cluster processes did not stop: " + "\n".join(result.stderr[-5:]))
+
+    with TRACER.span("resetClusterHosts", hosts=len(ips)):
+        with ThreadPoolExecutor(max_workers=max(1, len(ips))) as executor:
+            list(executor.map(reset, ips))
+
+def shapes(args):
+    """
+        Provisions and sweeps every shape (instance type per role kind) one after the other, then prints the price report
+        The instances of the roles whose type changes are terminated before the next shape is provisioned,
+        the others are reused; when a cluster instance is replaced, the reused ones are reset by resetClusterHosts
+    """
+    baseRunId = args.run_id or newRunId()
+    runIds = []
+    ec2_client = boto3.client("ec2")
+    paramiko_client, accesKey = getParamikoClient()
+    pool = SSHConnectionPool(accesKey)
+    for i, shape in enumerate(args.shape):
+        state = RunState(args.state)
+        topology = state.get("topology")
+        instances = state.get("instances", {})
+        replaced = []
+        if topology:
+            nextTopology = dict(topology, roleTypes=parseRoleTypes(shape), instanceType=args.instance_type)
+            replaced = [role for role in instances if roleInstanceType(topology, role) != roleInstanceType(nextTopology, role)]
+        if replaced:
+            print("terminating", len(replaced), "instances of another type:", ", ".join(instances[role][0] for role in replaced))
+            with TRACER.span("terminate_instances", instances=len(replaced)):
+                ec2_client.terminate_instances(InstanceIds=[instances[role][0] for role in replaced])
+        # the new instances join a new cluster, config.ini and the data node memory change with them
+        if any(roleKind(role) in ("master", "node", "sql") for role in replaced):
+            reused = [instance[1] for role, instance in instances.items()
+                      if roleKind(role) in ("master", "node", "sql") and role not in replaced]
+            if reused:
+                print("resetting the cluster processes of", len(reused), "reused instances")
+                resetClusterHosts(pool, reused)
+
+        print("-------------------Shape " + str(i + 1) + "/" + str(len(args.shape)) + ": " + (shape or args.instance_type) + "-------------------")
+        with TRACER.span("shape", shape=shape):
+            provision(argparse.Namespace(**dict(vars(args), role_types=shape)))
+            runId = baseRunId + "-" + str(i + 1)
+            sweep(argparse.Namespace(**dict(vars(args), run_id=runId, standalone=None, master=None, data_nodes=None,
+                                            sql_nodes=None, clients=None)))
+        runIds.append(runId)
+    pool.closeAll()
+
+    print("-------------------Price/performance (pricing: " + str(args.pricing) + ")-------------------")
+    printPriceReport(priceReport(openResultsStore(args.results_db), loadPricing(args.pricing), runIds))
+
+def report(args):
+    """
+        Prints the price/performance of the stored configurations, offline from the results file
+    """
+    rows = priceReport(openResultsStore(args.results_db), loadPricing(args.pricing), args.runs.split(",") if args.runs else None)
+    if not rows:
+        raise SystemExit("no results with a recorded topology in " + str(args.results_db) + ", the sweep command records it")
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2))
+    printPriceReport(rows)
+
+def histograms(args):
+    """
+        Merges the stored latency histograms of each selection and combination over their repetitions,
+        prints their percentiles and exports the distributions to a CSV file for plotting
+    """
+    db = openResultsStore(args.results_db)
+    series = {}
+    for selection in args.selections:
+        runId, _, target = selection.partition(":")
+        for record in loadHistograms(db, runId, target or None):
+            key = (record["run_id"] + ":" + record["target"], combinationKey(record["params"]))
+            series.setdefault(key, []).append(record["histogram"])
+    if not series:
+        raise SystemExit("no histograms for " + ", ".join(args.selections) + " in " + str(args.results_db))
+
+    print("%-28s %-34s %8s %9s %9s %9s %9s" % ("series", "combination", "events", "p50 ms", "p95 ms", "p99 ms", "p99.9 ms"))
+    rows = []
+    for (name, key), parts in sorted(series.items()):
+        histogram = mergeHistograms(parts)
+        params = json.loads(key)
+        combination = "%s %dthr %dx%d" % (params.get("workload", "?"), params.get("threads", 0), params.get("tables", 0), params.get("table_size", 0))
+        total = sum(histogram.values())
+        print("%-28s %-34s %8d %9.3f %9.3f %9.3f %9.3f" % ((name[:28], combination[:34], total)
+              + tuple(histogramPercentile(histogram, percentile) for percentile in (50.0, 95.0, 99.0, 99.9))))
+        seen = 0
+        for value in sorted(histogram):
+            seen += histogram[value]
+            rows.append([name, combination, value, histogram[value], histogram[value] / total, seen / total])
+
+    with open(args.csv, "w", newline="") as csvFile:
+        writer = csv.writer(csvFile)
+        writer.writerow(["series", "combination", "latency_ms", "count", "fraction", "cumulative"])
+        writer.writerows(rows)
+    print("distributions written to", args.csv)
+
+def teardown(args):
+    """
+        Terminates the instances and deletes the security group of the deployment, then forgets the state
+    """
+    state = RunState(args.state)
+    ec2_client = boto3.client("ec2")
+    recorded = [instance[0] for instance in state.get("instances", {}).values()]
+    groupId = (state.get("securityGroup") or [None])[0]
+
+    start = time.perf_counter()
+    ids, groupId = destroyResources(ec2_client, recorded, groupId, args.dry_run)
+    if args.dry_run:
+        return
+    if state.path.exists():
+        state.path.unlink()
+    print("-------------------Teardown of " + str(len(ids)) + " instances done in " + str(round(time.perf_counter() - start, 1)) + " s-------------------")
+
+def fillFromState(args):
+    """
+        Fills the instance addresses missing from the command line with the ones of the state file
+    """
+    state = RunState(args.state)
+    instances = state.get("instances", {})
+    args.standalone = args.standalone or state.address("standalone")
+    args.master = args.master or state.address("master")
+    if not (args.standalone and args.master):
+        raise SystemExit("--standalone and --master are required, no provisioned instances in " + str(state.path))
+    if hasattr(args, "data_nodes") and args.data_nodes is None:
+        nodeRoles = sorted((role for role in instances if roleKind(role) == "node"), key=lambda role: int(role[4:]))
+        args.data_nodes = ",".join(instances[role][1] for role in nodeRoles) or None
+    if hasattr(args, "sql_nodes") and args.sql_nodes is None:
+        sqlRoles = sorted((role for role in instances if roleKind(role) == "sql"), key=lambda role: int(role[3:]))
+        args.sql_nodes = ",".join(instances[role][1] + "=" + instances[role][2] for role in sqlRoles) or None
+    if hasattr(args, "clients") and args.clients is None:
+        clientRoles = sorted((role for role in instances if roleKind(role) == "client"), key=lambda role: int(role[6:]))
+        args.clients = ",".join(instances[role][1] for role in clientRoles) or None
+
+def addTopologyArguments(parser):
+    """
+        Adds the cluster topology options to a command line parser
+    """
+    parser.add_argument("--data-nodes", type=int, default=DEFAULT_TOPOLOGY["dataNodes"], help="number of data nodes")
+    parser.add_argument("--replicas", type=int, default=DEFAULT_TOPOLOGY["replicas"], help="NDB replica count (NoOfReplicas)")
+    parser.add_argument("--sql-nodes", type=int, default=DEFAULT_TOPOLOGY["sqlNodes"], help="number of dedicated SQL node instances")
+    parser.add_argument("--instance-type", default=DEFAULT_TOPOLOGY["instanceType"], choices=sorted(INSTANCE_TYPES),
+                        help="instance type of every role, used to size the data node memory")
+    parser.add_argument("--multithreaded", action="store_true", help="run ndbmtd instead of ndbd on the data nodes")
+    parser.add_argument("--clients", type=int, default=DEFAULT_TOPOLOGY["clients"],
+                        help="number of instances running sysbench, 0 to run it on the benchmarked instances")
+    parser.add_argument("--role-types", default="", help="instance type per role kind overriding --instance-type, "
+                        "for example master=t2.micro,node=m5.large (kinds: standalone, master, node, sql, client)")
+
+def addSweepArguments(parser):
+    """
+        Adds the sweep matrix and pacing options to a command line parser
+    """
+    parser.add_argument("--workloads", default=",".join(SWEEP_WORKLOADS),
+                        help="comma separated sysbench tests, " + SAKILA_WORKLOAD + " for the Sakila transaction mix")
+    parser.add_argument("--sakila-mix", default=SAKILA_MIX, help="type=weight list of the Sakila transactions "
+                        "(checkout, return, payment, film_actor, inventory)")
+    parser.add_argument("--threads", default="1,4,16", help="comma separated thread counts")
+    parser.add_argument("--tables", default="1", help="comma separated table counts")
+    parser.add_argument("--table-sizes", default="100000", help="comma separated rows per table")
+    parser.add_argument("--rows", type=int, help="total rows split over the tables, replaces --table-sizes")
+    parser.add_argument("--load-threads", type=int, default=8, help="threads loading the tables, one table per thread")
+    parser.add_argument("--ndb-partitions", type=int, default=0, help="NDB partitions per cluster table (default: cluster default)")
+    parser.add_argument("--durations", default="60", help="comma separated run durations in seconds")
+    parser.add_argument("--warmup", type=int, default=10, help="seconds of warmup before each combination")
+    parser.add_argument("--repetitions", type=int, default=3, help="measured runs per combination")
+    parser.add_argument("--cooldown", type=int, default=10, help="seconds of pause after each combination")
+    parser.add_argument("--timeseries", action="store_true", help="capture interval reports and host metrics into timeseries/")
+    parser.add_argument("--run-id", help="id under which the results are stored (default: current time)")
+
+def main():
+    """
+        main function for performing the application
+        parses the command line and calls the command, provision when no command is given
+
+    """
+    parser = argparse.ArgumentParser(description="MySQL stand-alone vs MySQL Cluster benchmark on AWS")
+    commands = parser.add_subparsers(dest="command")
+
+    provisionParser = commands.add_parser("provision", help="create the instances and setup the cluster (default)")
+    addTopologyArguments(provisionParser)
+    provisionParser.add_argument("--artifact-mirror", help="serve the cached artifacts from this controller, "
+                                 "url reachable by the instances, for example http://PUBLIC_IP:8000")
+    provisionParser.add_argument("--artifact-bucket", help="serve the cached artifacts from this S3 bucket")
+    provisionParser.add_argument("--artifact-sha256", action="append", default=[], metavar="NAME=DIGEST",
+                                 help="expected sha256 of an artifact (" + ", ".join(ARTIFACTS) + ")")
+    provisionParser.add_argument("--trust-on-first-use", action="store_true",
+                                 help="accept artifacts without an expected sha256, recording the checksum of the first download")
+    provisionParser.add_argument("--fresh", action="store_true", help="run every setup step again, the instances are still reused")
+    provisionParser.add_argument("--refresh-metadata", action="store_true", help="look up the VPC, subnets and image again")
+    provisionParser.add_argument("--metadata-cache", default=METADATA_FILE, help="cache file of the VPC, subnets and image lookups")
+
+    collectParser = commands.add_parser("collect", help="fetch, store and compare the sysbench results")
+    collectParser.add_argument("--standalone", help="public ip of the stand-alone instance (default: from the state file)")
+    collectParser.add_argument("--master", help="public ip of the master instance (default: from the state file)")
+    collectParser.add_argument("--run-id", help="id under which the results are stored (default: current time)")
+
+    sweepParser = commands.add_parser("sweep", help="run a sysbench sweep against the stand-alone instance and the cluster")
+    sweepParser.add_argument("--standalone", help="public ip of the stand-alone instance (default: from the state file)")
+    sweepParser.add_argument("--master", help="public ip of the master instance (default: from the state file)")
+    sweepParser.add_argument("--data-nodes", help="comma separated public ips of the data nodes, sampled with --timeseries "
+                             "(default: from the state file)")
+    sweepParser.add_argument("--sql-nodes", help="comma separated PUBLIC_IP=PRIVATE_IP of the dedicated SQL nodes "
+                             "(default: from the state file)")
+    sweepParser.add_argument("--clients", help="comma separated public ips of the client instances running sysbench "
+                             "(default: from the state file)")
+    sweepParser.add_argument("--local", action="store_true", help="run sysbench on the targets even with client instances")
+    addSweepArguments(sweepParser)
+
+    shapesParser = commands.add_parser("shapes", help="provision and sweep several instance type shapes, then report the price/performance")
+    addTopologyArguments(shapesParser)
+    addSweepArguments(shapesParser)
+    shapesParser.add_argument("--shape", action="append", required=True,
+                              help="instance type per role kind, like --role-types, repeat the option for every shape")
+    shapesParser.add_argument("--pricing", default=PRICING_FILE, help="pricing table (default: pricing.json)")
+    shapesParser.set_defaults(artifact_mirror=None, artifact_bucket=None, artifact_sha256=[], trust_on_first_use=False,
+                              fresh=False, refresh_metadata=False, metadata_cache=METADATA_FILE, local=False)
+
+    histogramsParser = commands.add_parser("histograms", help="export the stored latency distributions for plotting")
+    histogramsParser.add_argument("selections", nargs="+", help="RUN_ID[:TARGET] to export, every target of the run without TARGET")
+    histogramsParser.add_argument("--csv", default="latency.csv", help="CSV file of the distributions (default: latency.csv)")
+
+    reportParser = commands.add_parser("report", help="price/performance of the stored results, offline")
+    reportParser.add_argument("--pricing", default=PRICING_FILE, help="pricing table (default: pricing.json)")
+    reportParser.add_argument("--runs", help="comma separated run ids (default: every run with a recorded topology)")
+    reportParser.add_argument("--json", help="also write the report to this JSON file")
+
+    compareParser = commands.add_parser("compare", help="compare the stored results of two runs or targets")
+    compareParser.add_argument("baseline", help="RUN_ID[:TARGET] of the reference results, the target defaults to cluster")
+    compareParser.add_argument("candidate", help="RUN_ID[:TARGET] of the compared results, for example RUN_ID:standalone")
+    compareParser.add_argument("--metrics", default=",".join(COMPARED_METRICS), help="comma separated metrics to compare")
+    compareParser.add_argument("--confidence", type=float, default=0.95, help="level of the confidence intervals")
+    compareParser.add_argument("--alpha", type=float, default=0.05, help="significance level of the Welch t-test")
+    compareParser.add_argument("--json", help="also write the comparison to this JSON file")
+    compareParser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 if a regression is flagged")
+
+    teardownParser = commands.add_parser("teardown", help="terminate the instances and delete the security group")
+    teardownParser.add_argument("--dry-run", action="store_true", help="only list the resources that would be deleted")
+
+    for subparser in (provisionParser, collectParser, sweepParser, shapesParser, compareParser, histogramsParser, reportParser,
+                      teardownParser):
+        subparser.add_argument("--state", default=STATE_FILE, help="state file of the deployment (default: state.json)")
+        subparser.add_argument("--results-db", default=RESULTS_DB, help="SQLite results file (default: results.db)")
+
+    args = parser.parse_args()
+    if args.command is None:
+        args = parser.parse_args(["provision"] + sys.argv[1:])
+    command = {"collect": collect, "sweep": sweep, "shapes": shapes, "compare": compare, "histograms": histograms,
+               "report": report, "teardown": teardown}.get(args.command, provision)
+    try:
+        with TRACER.span(args.command):
+            command(args)
+    finally:
+        tracePath = TRACE_DIR / (newRunId() + "-" + args.command + ".json")
+        TRACER.write(tracePath)
+        print("-------------------Where the time went (trace: " + str(tracePath) + ")-------------------")
+        TRACER.summary()
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()